@@ -0,0 +1,154 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import random
+
+TREES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'compiler', 'trees')
+
+
+def _couple(coupling_map, a, b):
+    # Adds a directed coupling between a and b, alternating direction so that
+    # synthetic maps need inverse cnot gates just like real devices do
+    if (a + b) % 2 == 0:
+        coupling_map[min(a, b)].append(max(a, b))
+    else:
+        coupling_map[max(a, b)].append(min(a, b))
+
+
+def bundled(backend_name):
+    """Loads the coupling map stored with a bundled spanning tree
+
+    Parameters:
+        backend_name (str): backend name, e.g. 'ibmqx4'
+
+    Returns:
+        coupling_map (dict): backend coupling map
+    """
+    with open(os.path.join(TREES, backend_name + '.p'), 'rb') as pickle_file:
+        return pickle.load(pickle_file)['coupling_map']
+
+
+def line(n_qubits):
+    """Creates a linear nearest-neighbour coupling map
+
+    Parameters:
+        n_qubits (int): number of qubits
+
+    Returns:
+        coupling_map (dict): synthetic coupling map
+    """
+    coupling_map = {n: [] for n in range(n_qubits)}
+    for n in range(n_qubits - 1):
+        _couple(coupling_map, n, n + 1)
+    return coupling_map
+
+
+def ring(n_qubits):
+    """Creates a ring coupling map, a line whose ends are coupled too
+
+    Parameters:
+        n_qubits (int): number of qubits, at least 3
+
+    Returns:
+        coupling_map (dict): synthetic coupling map
+    """
+    coupling_map = line(n_qubits)
+    _couple(coupling_map, n_qubits - 1, 0)
+    return coupling_map
+
+
+def random_digraph(n_qubits, degree=3, seed=0):
+    """Creates a random connected coupling map with random coupling directions
+
+    A random tree connects all qubits, then random couplings are added until the
+    average number of couplings per qubit is about degree / 2.
+
+    Parameters:
+        n_qubits (int): number of qubits
+        degree (float): average number of qubits coupled to each qubit
+        seed (int): random seed
+
+    Returns:
+        coupling_map (dict): synthetic coupling map
+    """
+    generator = random.Random(seed)
+    coupling_map = {n: [] for n in range(n_qubits)}
+    edges = set()
+
+    def add(a, b):
+        if a != b and (a, b) not in edges and (b, a) not in edges:
+            edges.add((a, b))
+            coupling_map[a].append(b)
+
+    for n in range(1, n_qubits):
+        other = generator.randrange(n)
+        add(*((n, other) if generator.random() < 0.5 else (other, n)))
+    extra = int(n_qubits * degree / 2) - (n_qubits - 1)
+    attempts = 0
+    while extra > 0 and attempts < 10 * n_qubits:
+        attempts += 1
+        size = len(edges)
+        add(generator.randrange(n_qubits), generator.randrange(n_qubits))
+        extra -= len(edges) - size
+    return coupling_map
+
+
+def grid(rows, cols):
+    """Creates a rows x cols nearest-neighbour grid coupling map
+
+    Parameters:
+        rows (int): number of rows
+        cols (int): number of columns
+
+    Returns:
+        coupling_map (dict): synthetic coupling map
+    """
+    coupling_map = {n: [] for n in range(rows * cols)}
+    for r in range(rows):
+        for c in range(cols):
+            n = r * cols + c
+            if c + 1 < cols:
+                _couple(coupling_map, n, n + 1)
+            if r + 1 < rows:
+                _couple(coupling_map, n, n + cols)
+    return coupling_map
+
+
+def heavy_hex(rows, cols):
+    """Creates a heavy-hex coupling map
+
+    Rows of cols qubits are coupled as lines, consecutive rows are joined by bridge qubits
+    placed every 4 columns, with the bridge offset alternating between rows.
+
+    Parameters:
+        rows (int): number of qubit rows
+        cols (int): qubits per row
+
+    Returns:
+        coupling_map (dict): synthetic coupling map
+    """
+    coupling_map = {n: [] for n in range(rows * cols)}
+    for r in range(rows):
+        for c in range(cols - 1):
+            _couple(coupling_map, r * cols + c, r * cols + c + 1)
+    bridge = rows * cols
+    for r in range(rows - 1):
+        for c in range(0 if r % 2 == 0 else 2, cols, 4):
+            coupling_map[bridge] = []
+            _couple(coupling_map, r * cols + c, bridge)
+            _couple(coupling_map, bridge, (r + 1) * cols + c)
+            bridge += 1
+    return coupling_map
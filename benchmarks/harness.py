@@ -0,0 +1,222 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import importlib.util
+from timeit import default_timer
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.coupling_maps import grid, heavy_hex, line, random_digraph, ring
+from benchmarks.order_results import synthetic_robj
+from compiler.backends import local_sim
+from compiler.compiler import Compiler
+from compiler.topology import spanning_tree
+from compiler.utility import _order_results
+
+FAMILIES = ('line', 'ring', 'grid', 'heavy_hex', 'random')
+
+STAGES = ('ranks', 'spanning_tree', 'template', 'compile', 'optimize_h', 'order_results')
+
+# Stages going through qiskit, skipped if it is not installed
+QISKIT_STAGES = ('compile', 'optimize_h')
+
+# Stages going through qiskit are only timed up to this many qubits
+QISKIT_MAX_QUBITS = 1000
+
+# Outcomes of the synthetic results of order_results
+OUTCOMES = 4096
+
+# Stages faster than this are too noisy to be compared with a baseline
+MIN_SECONDS = 1e-4
+
+
+def make_map(family, n_qubits, seed=0):
+    """Creates a synthetic coupling map of about n_qubits qubits
+
+    Parameters:
+        family (str): one of FAMILIES
+        n_qubits (int): approximate number of qubits, grids and heavy-hex maps are rounded to whole rows
+        seed (int): random seed of random maps
+
+    Returns:
+        coupling_map (dict): synthetic coupling map
+    """
+    if family == 'line':
+        return line(n_qubits)
+    if family == 'ring':
+        return ring(max(3, n_qubits))
+    if family == 'grid':
+        rows = max(1, int(math.sqrt(n_qubits)))
+        return grid(rows, max(1, n_qubits // rows))
+    if family == 'heavy_hex':
+        rows = max(2, int(math.sqrt(n_qubits / 2.5)))
+        return heavy_hex(rows, max(5, int(n_qubits / (1.25 * rows))))
+    return random_digraph(n_qubits, seed=seed)
+
+
+def _prepare(coupling_map):
+    # Topology inputs of the stages, computed as Compiler._build_tree does
+    inverse_map = dict()
+    Compiler._invert_graph(coupling_map, inverse_map)
+    ranks = dict()
+    Compiler._start_explore(coupling_map, ranks)
+    ordered = sorted(ranks.items(), key=lambda rank: rank[1], reverse=True)
+    return inverse_map, ordered, Compiler._find_max(ranks)[0]
+
+
+def stage_calls(coupling_map, cache_dir, stages=STAGES):
+    """Builds the call of every selected stage on a coupling map
+
+    Parameters:
+        coupling_map (dict): coupling map
+        cache_dir (str): spanning tree cache directory of the Compiler
+        stages (iterable): stages to build, only these are prepared, e.g. qiskit is only used by QISKIT_STAGES
+
+    Returns:
+        calls (dict): stage: function without arguments
+    """
+    n_qubits = len(coupling_map)
+    calls = dict()
+    if 'ranks' in stages:
+        calls['ranks'] = lambda: Compiler._start_explore(coupling_map, dict())
+    if 'spanning_tree' in stages:
+        inverse_map, ordered, start = _prepare(coupling_map)
+        calls['spanning_tree'] = lambda: spanning_tree(start, coupling_map, inverse_map, ordered)
+    compiled = [stage for stage in QISKIT_STAGES if stage in stages] if n_qubits <= QISKIT_MAX_QUBITS else []
+    if 'template' in stages or compiled:
+        compiler = Compiler({'coupling_map': coupling_map}, cache_dir=cache_dir)
+        # Templates are memoized, the memo is cleared so that every call builds the circuit
+        calls['template'] = lambda: (compiler._clear_templates(), compiler.template(n_qubits, local_sim))
+    if 'compile' in compiled:
+        calls['compile'] = lambda: (compiler._clear_templates(), compiler.compile(n_qubits, local_sim))
+    if 'optimize_h' in compiled:
+        # The circuit is compiled once, so that the stage only times optimize_h
+        circuit = compiler.compile(n_qubits, local_sim)['circuit']
+        calls['optimize_h'] = lambda: Compiler.optimize_h(circuit)
+    if 'order_results' in stages:
+        robj = synthetic_robj('ghz', min(n_qubits, 512), n_qubits, OUTCOMES)
+        calls['order_results'] = lambda: _order_results(robj)
+    return calls
+
+
+def measure(call, repeat):
+    """Times a call and measures its memory peak
+
+    The memory peak is measured on an extra call, tracemalloc slows down the timed ones otherwise.
+
+    Parameters:
+        call (callable): function without arguments
+        repeat (int): number of timed calls
+
+    Returns:
+        measurement (dict): best and mean seconds, peak_bytes allocated by the call
+    """
+    times = []
+    for _ in range(repeat):
+        start = default_timer()
+        call()
+        times.append(default_timer() - start)
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'peak_bytes': peak}
+
+
+def run(families, sizes, stages, repeat, seed=0):
+    """Runs every stage on every coupling map
+
+    Returns:
+        results (list): dictionaries with stage, family, size, qubits and the measurement of the stage
+    """
+    skipped = [stage for stage in stages if stage in QISKIT_STAGES]
+    if skipped and importlib.util.find_spec('qiskit') is None:
+        print('qiskit is not installed, skipping stages {}'.format(', '.join(skipped)), file=sys.stderr)
+        stages = [stage for stage in stages if stage not in QISKIT_STAGES]
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for family in families:
+            for size in sizes:
+                coupling_map = make_map(family, size, seed=seed)
+                calls = stage_calls(coupling_map, cache_dir, stages)
+                for stage in stages:
+                    if stage not in calls:
+                        continue
+                    result = {'stage': stage, 'family': family, 'size': size, 'qubits': len(coupling_map)}
+                    result.update(measure(calls[stage], repeat))
+                    results.append(result)
+                    print('{:<15}{:<11}{:>7}{:>14.6f}{:>14}'.format(stage, family, len(coupling_map),
+                                                                    result['seconds'], result['peak_bytes']))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compares results with a baseline run
+
+    Parameters:
+        results (list): results of run()
+        baseline (list): results of a previous run
+        threshold (float): relative slowdown above which a stage is a regression, e.g. 0.25 for 25%
+
+    Returns:
+        regressions (list): (result, baseline seconds) pairs of the regressed stages
+    """
+    previous = {(old['stage'], old['family'], old['size']): old for old in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result['stage'], result['family'], result['size']))
+        if old is None or old['seconds'] < MIN_SECONDS:
+            continue
+        if result['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append((result, old['seconds']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times topology analysis, compile and post-processing stages')
+    parser.add_argument('--families', nargs='+', choices=FAMILIES, default=list(FAMILIES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[16, 128, 1024, 4096])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls of every stage, the best is kept')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random maps')
+    parser.add_argument('--output', help='JSON file where results are saved')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25, help='relative slowdown failing the comparison')
+    args = parser.parse_args()
+
+    print('{:<15}{:<11}{:>7}{:>14}{:>14}'.format('stage', 'family', 'qubits', 'time [s]', 'peak [B]'))
+    results = run(args.families, args.sizes, args.stages, args.repeat, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'time': time.time(),
+                       'results': results}, output, indent=1)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)['results'], args.threshold)
+        for result, seconds in regressions:
+            print('Regression: {} on {} with {} qubits takes {:.6f} s, baseline {:.6f} s'.format(
+                result['stage'], result['family'], result['qubits'], result['seconds'], seconds))
+        if regressions:
+            sys.exit(1)
+        print('No regression above {:.0%} over the baseline'.format(args.threshold))
@@ -0,0 +1,57 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = ['compiler', 'compiler.templates', 'compiler.stabilizer', 'compiler.compiler']
+
+# Online clients that importing the compile path must not load
+ONLINE = ('IBMQuantumExperience', 'requests', 'urllib3', 'qiskit.backends.ibmq')
+
+REPEAT = 5
+
+# Imports a module in a fresh interpreter, prints seconds and the online modules it loaded
+_PROBE = '''
+import sys, json
+from timeit import default_timer
+start = default_timer()
+import {module}
+elapsed = default_timer() - start
+print(json.dumps([elapsed, sorted(m for m in sys.modules if m.startswith({online}))]))
+'''
+
+
+def import_time(module):
+    # Median import time of module over REPEAT fresh interpreters, and the online modules it loaded
+    times = []
+    online = []
+    for _ in range(REPEAT):
+        output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, online=ONLINE)], cwd=ROOT,
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        elapsed, online = json.loads(output.strip().splitlines()[-1])
+        times.append(elapsed)
+    return statistics.median(times), online
+
+
+if __name__ == '__main__':
+    print('{:<24}{:>14}  {}'.format('module', 'import [s]', 'online modules'))
+    for module in MODULES:
+        elapsed, online = import_time(module)
+        print('{:<24}{:>14.4f}  {}'.format(module, elapsed, ', '.join(online) or '-'))
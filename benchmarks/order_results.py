@@ -0,0 +1,108 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import random
+from timeit import default_timer
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from compiler.utility import _order_results
+
+
+def legacy_order_results(robj):
+    # Character by character implementation previously used by utility._order_results
+    stop = robj['n_qubits'] // 2
+    results = dict()
+    counts = robj['counts']
+    connected = robj['connected']
+    for count in counts:
+        reverse = count[0][::-1]
+        if robj['algo'] != 'parity':
+            sorted_v = []
+            for n in range(robj['n_qubits'] - stop):
+                sorted_v.append(reverse[connected[n + stop]])
+            for n in range(stop):
+                sorted_v.append(reverse[connected[n]])
+        else:
+            sorted_v = [reverse[connected[0]]]
+            one = 1
+            zero = robj['n_qubits'] - 1
+            for q in robj['oracle']:
+                if q == '1':
+                    sorted_v.append(reverse[connected[one]])
+                    one += 1
+                else:
+                    sorted_v.append(reverse[connected[zero]])
+                    zero -= 1
+        value = ''.join(str(v) for v in sorted_v)
+        results.update({value: count[1]})
+    return results
+
+
+def synthetic_robj(algo, n_qubits, size, outcomes, seed=0):
+    """Creates a ran object with random, distinct outcomes on the connected qubits
+
+    Parameters:
+        algo (str): 'ghz', 'envariance' or 'parity'
+        n_qubits (int): number of qubits used in circuit, including the parity ancilla
+        size (int): register size
+        outcomes (int): number of distinct outcomes
+        seed (int): random seed
+
+    Returns:
+        robj (dict): ran object with counts, connected, oracle, n_qubits and algo
+    """
+    generator = random.Random(seed)
+    connected = generator.sample(range(size), n_qubits)
+    outcomes = min(outcomes, 2 ** n_qubits)
+    values = set()
+    while len(values) < outcomes:
+        values.add(generator.getrandbits(n_qubits))
+    counts = []
+    for value in values:
+        bits = ['0'] * size
+        for i, qubit in enumerate(connected):
+            if value >> i & 1:
+                bits[size - 1 - qubit] = '1'
+        counts.append((''.join(bits), generator.randint(1, 100)))
+    counts.sort(key=lambda count: count[1], reverse=True)
+    oracle = ''.join(generator.choice('01') for _ in range(n_qubits - 1))
+    return {'algo': algo, 'n_qubits': n_qubits, 'connected': connected, 'oracle': oracle, 'counts': counts}
+
+
+def timed(function, robj, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = default_timer()
+        results = function(robj)
+        best = min(best, default_timer() - start)
+    return results, best
+
+
+if __name__ == '__main__':
+    cases = [('ghz', 5, 5, 32), ('ghz', 16, 16, 8192), ('parity', 16, 16, 8192), ('envariance', 16, 16, 8192),
+             ('ghz', 64, 128, 8192), ('parity', 128, 128, 65536)]
+    print('{:<12}{:>8}{:>10}{:>14}{:>14}{:>14}{:>8}'.format('algo', 'qubits', 'outcomes', 'legacy [s]',
+                                                            'new [s]', 'packed [s]', 'match'))
+    for algo, n_qubits, size, outcomes in cases:
+        robj = synthetic_robj(algo, n_qubits, size, outcomes)
+        legacy, legacy_elapsed = timed(legacy_order_results, robj)
+        results, elapsed = timed(_order_results, robj)
+        packed, packed_elapsed = timed(lambda r: _order_results(r, packed=True), robj)
+        match = list(legacy.items()) == list(results.items()) and \
+            list(packed.items()) == [(int(value, 2), count) for value, count in legacy.items()]
+        print('{:<12}{:>8}{:>10}{:>14.6f}{:>14.6f}{:>14.6f}{:>8}'.format(algo, n_qubits, len(robj['counts']),
+                                                                         legacy_elapsed, elapsed, packed_elapsed,
+                                                                         str(match)))
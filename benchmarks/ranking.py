@@ -0,0 +1,74 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+from timeit import default_timer
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.coupling_maps import bundled, grid, heavy_hex
+from compiler.topology import reachability_ranks
+
+# The recursive engine is O(V*E*V), don't wait for it on the largest maps
+LEGACY_MAX_NODES = 1000
+
+
+def legacy_ranks(graph):
+    # Recursive ranking engine previously used by Compiler._start_explore
+    def explore(source, visiting):
+        for next in graph[visiting]:
+            if next not in visited[source]:
+                visited[source].append(next)
+                ranks[next] = ranks[next] + 1
+                explore(source, next)
+
+    visited = dict()
+    ranks = dict()
+    for node in range(len(graph)):
+        ranks[node] = 0
+    for source in graph:
+        visited.update({source: []})
+        explore(source, source)
+    return ranks
+
+
+def timed(function, graph):
+    start = default_timer()
+    ranks = function(graph)
+    return ranks, default_timer() - start
+
+
+if __name__ == '__main__':
+    maps = [
+        ('ibmqx4', bundled('ibmqx4')),
+        ('ibmqx5', bundled('ibmqx5')),
+        ('grid 4x4', grid(4, 4)),
+        ('grid 10x10', grid(10, 10)),
+        ('grid 40x50', grid(40, 50)),
+        ('heavy-hex 5x11', heavy_hex(5, 11)),
+        ('heavy-hex 11x27', heavy_hex(11, 27)),
+        ('heavy-hex 40x80', heavy_hex(40, 80)),
+    ]
+
+    print('{:<18}{:>8}{:>14}{:>14}{:>10}'.format('map', 'qubits', 'legacy [s]', 'new [s]', 'match'))
+    for name, graph in maps:
+        ranks, elapsed = timed(reachability_ranks, graph)
+        legacy, legacy_elapsed, match = None, float('nan'), '-'
+        if len(graph) <= LEGACY_MAX_NODES:
+            try:
+                legacy, legacy_elapsed = timed(legacy_ranks, graph)
+                match = str(legacy == ranks)
+            except RecursionError:
+                match = 'recursion'
+        print('{:<18}{:>8}{:>14.6f}{:>14.6f}{:>10}'.format(name, len(graph), legacy_elapsed, elapsed, match))
@@ -0,0 +1,161 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import operator
+import random
+from timeit import default_timer
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.coupling_maps import bundled, grid, heavy_hex
+from compiler.topology import reachability_ranks, spanning_tree
+
+# The rescanning builder is quadratic or worse, don't wait for it on the largest maps
+LEGACY_MAX_NODES = 1000
+
+
+def invert(graph):
+    # Same inversion as Compiler._invert_graph
+    inverse_graph = {}
+    for end in graph:
+        for start in graph[end]:
+            inverse_graph.setdefault(start, []).append(end)
+    for node in graph:
+        inverse_graph.setdefault(node, [])
+    return inverse_graph
+
+
+def legacy_spanning_tree(start, coupling_map, inverse_map, ranks):
+    # Rescanning tree builder previously used by Compiler._spanning_tree
+    tree = dict()
+    ranks = dict(ranks)
+    tree.update({start: -1})
+    del ranks[start]
+    to_connect = [start]
+    count = len(coupling_map) - 1
+    visiting = 0
+    updated = True
+    while count > 0:
+        if updated is False:
+            for inv in ranks:
+                for node in inverse_map[inv]:
+                    if node in to_connect:
+                        to_connect.append(inv)
+                        del ranks[inv]
+                        tree.update({inv: node})
+                        updated = True
+                        count -= 1
+                        break
+                if updated is True:
+                    break
+        if count > 0:
+            for node in inverse_map[to_connect[visiting]]:
+                if node not in tree:
+                    tree.update({node: to_connect[visiting]})
+                    del ranks[node]
+                    count -= 1
+                    if node not in to_connect:
+                        to_connect.append(node)
+                    if count <= 0:
+                        break
+            visiting += 1
+            if visiting == len(to_connect):
+                updated = False
+    return tree
+
+
+def prepare(graph):
+    # Computes the spanning tree inputs the same way Compiler.__init__ does
+    ranks = reachability_ranks(graph)
+    start = max(ranks.items(), key=operator.itemgetter(1))[0]
+    return start, graph, invert(graph), sorted(ranks.items(), key=operator.itemgetter(1), reverse=True)
+
+
+def weakly_connected(graph):
+    # The legacy builder never terminates on disconnected maps
+    seen = {next(iter(graph))}
+    frontier = list(seen)
+    inverse_map = invert(graph)
+    while frontier:
+        node = frontier.pop()
+        for other in graph[node] + inverse_map[node]:
+            if other not in seen:
+                seen.add(other)
+                frontier.append(other)
+    return len(seen) == len(graph)
+
+
+def random_map(seed, n_nodes):
+    # Random directed coupling map with n_nodes nodes
+    generator = random.Random(seed)
+    graph = {n: [] for n in range(n_nodes)}
+    for _ in range(generator.randint(n_nodes - 1, 3 * n_nodes)):
+        a, b = generator.sample(range(n_nodes), 2)
+        if b not in graph[a] and a not in graph[b]:
+            graph[a].append(b)
+    return graph
+
+
+def timed(function, args):
+    start = default_timer()
+    tree = function(*args)
+    return tree, default_timer() - start
+
+
+def differential(n_maps=500):
+    """Checks that the new builder returns the legacy parent map, in the same order
+
+    Parameters:
+        n_maps (int): number of random coupling maps to check
+
+    Returns:
+        checked (int): number of connected random maps that were compared
+    """
+    for backend_name in ['ibmqx4', 'ibmqx5']:
+        args = prepare(bundled(backend_name))
+        tree = spanning_tree(*args)
+        assert list(tree.items()) == list(legacy_spanning_tree(*args).items()), backend_name
+    checked = 0
+    for seed in range(n_maps):
+        graph = random_map(seed, 2 + seed % 40)
+        if not weakly_connected(graph):
+            continue
+        args = prepare(graph)
+        assert list(spanning_tree(*args).items()) == list(legacy_spanning_tree(*args).items()), seed
+        checked += 1
+    return checked
+
+
+if __name__ == '__main__':
+    print('Differential check passed on ibmqx4, ibmqx5 and %d random maps' % differential())
+
+    maps = [
+        ('ibmqx4', bundled('ibmqx4')),
+        ('ibmqx5', bundled('ibmqx5')),
+        ('grid 10x10', grid(10, 10)),
+        ('grid 40x50', grid(40, 50)),
+        ('heavy-hex 11x27', heavy_hex(11, 27)),
+        ('heavy-hex 40x80', heavy_hex(40, 80)),
+    ]
+
+    print('{:<18}{:>8}{:>14}{:>14}{:>10}'.format('map', 'qubits', 'legacy [s]', 'new [s]', 'match'))
+    for name, graph in maps:
+        args = prepare(graph)
+        tree, elapsed = timed(spanning_tree, args)
+        legacy_elapsed, match = float('nan'), '-'
+        if len(graph) <= LEGACY_MAX_NODES:
+            legacy, legacy_elapsed = timed(legacy_spanning_tree, args)
+            match = str(list(legacy.items()) == list(tree.items()))
+        print('{:<18}{:>8}{:>14.6f}{:>14.6f}{:>10}'.format(name, len(graph), legacy_elapsed, elapsed, match))
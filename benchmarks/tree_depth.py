@@ -0,0 +1,73 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import tempfile
+from timeit import default_timer
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.coupling_maps import bundled, grid, heavy_hex
+from compiler.backends import local_sim
+from compiler.compiler import Compiler, TREE_MODES
+from compiler.stabilizer import parse
+
+
+def depth(qasm):
+    # Circuit depth, every gate starts as soon as all its qubits are free
+    qregs, _, operations = parse(qasm)
+    levels = dict()
+    for name, _, bits in operations:
+        if name == 'barrier':
+            continue
+        wires = bits[:1] if name == 'measure' else bits
+        level = max(levels.get(wire, 0) for wire in wires) + 1
+        for wire in wires:
+            levels[wire] = level
+    return max(levels.values(), default=0)
+
+
+def measure(coupling_map, tree_mode, sizes):
+    # Seconds to build the tree, then depth and seconds to build the circuit of every size
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = default_timer()
+        compiler = Compiler({'coupling_map': coupling_map}, cache_dir=cache_dir, tree_mode=tree_mode)
+        tree_elapsed = default_timer() - start
+        circuits = []
+        for n_qubits in sizes:
+            start = default_timer()
+            qasm = compiler.template(n_qubits, backend=local_sim)['qasm']
+            circuits.append((n_qubits, depth(qasm), default_timer() - start))
+    return tree_elapsed, circuits
+
+
+if __name__ == '__main__':
+    maps = [
+        ('ibmqx4', bundled('ibmqx4')),
+        ('ibmqx5', bundled('ibmqx5')),
+        ('grid 10x10', grid(10, 10)),
+        ('grid 20x25', grid(20, 25)),
+        ('heavy-hex 5x11', heavy_hex(5, 11)),
+        ('heavy-hex 11x27', heavy_hex(11, 27)),
+    ]
+
+    print('{:<18}{:>8}{:>8}{:>14}{:>8}{:>16}'.format('map', 'mode', 'qubits', 'tree [s]', 'depth',
+                                                     'circuit [s]'))
+    for name, graph in maps:
+        sizes = sorted({min(n, len(graph)) for n in (5, 12, 16, len(graph) // 2, len(graph))})
+        for tree_mode in TREE_MODES:
+            tree_elapsed, circuits = measure(graph, tree_mode, sizes)
+            for n_qubits, circuit_depth, elapsed in circuits:
+                print('{:<18}{:>8}{:>8}{:>14.6f}{:>8}{:>16.6f}'.format(name, tree_mode, n_qubits, tree_elapsed,
+                                                                       circuit_depth, elapsed))
@@ -11,26 +11,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import logging
-from logging.config import fileConfig
+
+import threading
 from os import path
-from time import sleep
-from requests.exceptions import HTTPError
+from logging.config import fileConfig
+
+_logging_lock = threading.Lock()
+_logging_configured = False
 
-from qiskit import register
-from IBMQuantumExperience.IBMQuantumExperience import ApiError
 
-from compiler import config
+def configure_logging(filename=None):
+    """Configures the loggers of the package, only the first call has effect
 
-logger = logging.getLogger(__name__)
-fileConfig(path.join(path.dirname(path.abspath(__file__)), 'logging.ini'))
+    Every module calls it when imported, so logging is set up once, by the first module that logs,
+    and levels set afterwards, e.g. logging.getLogger('compiler.compiler').setLevel(logging.DEBUG),
+    are not reset by modules imported later. Loggers of other packages are left enabled.
 
-# set the APIToken and API url
-while True:
-    try:
-        register(config.APItoken, config.URL)
-    except (HTTPError, ApiError):
-        logger.error('Authentication error')
-        sleep(60)
-        continue
-    break
+    Parameters:
+        filename (str): logging configuration file, compiler/logging.ini by default
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    with _logging_lock:
+        if not _logging_configured:
+            if filename is None:
+                filename = path.join(path.dirname(path.abspath(__file__)), 'logging.ini')
+            fileConfig(filename, disable_existing_loggers=False)
+            _logging_configured = True
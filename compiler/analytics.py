@@ -0,0 +1,284 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import logging
+
+import numpy as np
+
+from compiler import configure_logging
+from compiler.store import parse_text
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+METRICS = ('fidelity', 'success_rate', 'parity')
+
+
+def parity_mask(algo, n_qubits, oracle=None):
+    """Returns the qubits entangled by a circuit, as a bit string over the ordered results
+
+    GHZ and envariance circuits entangle every qubit. Parity circuits entangle the ancilla,
+    first in the ordered results, with the qubits whose oracle bit is 1, the others end in 0.
+
+    Parameters:
+        algo (str): 'ghz', 'envariance' or 'parity'
+        n_qubits (int): number of qubits of the ordered results, including the parity ancilla
+        oracle (str): explicit oracle of parity circuits
+
+    Returns:
+        mask (str): '1' for every entangled qubit
+    """
+    if algo == 'parity':
+        return '1' + oracle
+    return '1' * n_qubits
+
+
+def ideal_outcomes(mask):
+    """Returns the two outcomes of a noiseless run, all zeros and the entangled qubits all ones
+
+    Parameters:
+        mask (str): see parity_mask()
+
+    Returns:
+        outcomes (tuple): two bit strings
+    """
+    return '0' * len(mask), mask
+
+
+def tally(results, mask):
+    """Reduces the results of a run to the counts every metric depends on
+
+    Parameters:
+        results (dict): bit string: count, e.g. robj['results']
+        mask (str): see parity_mask()
+
+    Returns:
+        tally (numpy.ndarray): counts of the two ideal outcomes, counts with even parity over mask, shots
+    """
+    if not results:
+        return np.zeros(4, dtype=np.int64)
+    zeros, ones = ideal_outcomes(mask)
+    counts = np.fromiter(results.values(), dtype=np.int64, count=len(results))
+    bits = np.frombuffer(''.join(results).encode('ascii'), dtype=np.uint8).reshape(len(results), len(mask)) - ord('0')
+    odd = (bits @ (np.frombuffer(mask.encode('ascii'), dtype=np.uint8) - ord('0')).astype(np.int64)) & 1
+    return np.array([results.get(zeros, 0), results.get(ones, 0), counts[odd == 0].sum(), counts.sum()],
+                    dtype=np.int64)
+
+
+def tally_packed(values, counts, mask):
+    """Same as tally(), for values packed as in a ResultsStore run
+
+    Parameters:
+        values (numpy.ndarray): outcomes x words uint64 array
+        counts (numpy.ndarray): count of each outcome
+        mask (str): see parity_mask()
+
+    Returns:
+        tally (numpy.ndarray): see tally()
+    """
+    words = values.shape[1]
+    packed = int(mask, 2)
+    mask_words = np.array([(packed >> (64 * i)) & (2 ** 64 - 1) for i in range(words)], dtype='<u8')
+    counts = counts.astype(np.int64)
+    zeros = ~values.any(axis=1)
+    ones = (values == mask_words).all(axis=1)
+    masked = np.ascontiguousarray(values & mask_words).view(np.uint8)
+    odd = np.unpackbits(masked, axis=1).sum(axis=1) & 1
+    return np.array([counts[zeros].sum(), counts[ones].sum(), counts[odd == 0].sum(), counts.sum()],
+                    dtype=np.int64)
+
+
+def _fidelity(zeros, ones, even, shots):
+    # Classical fidelity with the ideal distribution, half all zeros and half all ones
+    return np.sqrt(zeros / (2 * shots)) + np.sqrt(ones / (2 * shots))
+
+
+def _success_rate(zeros, ones, even, shots):
+    # Probability of measuring one of the ideal outcomes
+    return (zeros + ones) / shots
+
+
+def _parity(zeros, ones, even, shots):
+    # Expectation value of Z on every entangled qubit
+    return (2 * even - shots) / shots
+
+
+_METRICS = {'fidelity': _fidelity, 'success_rate': _success_rate, 'parity': _parity}
+
+
+class Batch(object):
+    """Metrics of many runs at once
+
+    Every run is reduced by tally() to four counts, so metrics and bootstrap resamples are
+    computed with array operations over all runs instead of loops over result dictionaries.
+
+    Parameters:
+        tallies (numpy.ndarray): runs x 4 array, see tally()
+        labels (list): optional label of each run, e.g. rows of an archive query
+    """
+
+    def __init__(self, tallies, labels=None):
+        self.tallies = np.asarray(tallies, dtype=np.int64).reshape(-1, 4)
+        self.labels = labels if labels is not None else [None] * len(self.tallies)
+
+    def __len__(self):
+        return len(self.tallies)
+
+    @classmethod
+    def from_robjs(cls, robjs):
+        """Builds a batch from objects returned by compiler.run()
+
+        Parameters:
+            robjs (iterable): ran objects, with results, algo, n_qubits and oracle
+
+        Returns:
+            batch (Batch): one run per object
+        """
+        tallies = []
+        labels = []
+        for robj in robjs:
+            tallies.append(tally(robj['results'], parity_mask(robj['algo'], robj['n_qubits'], robj.get('oracle'))))
+            labels.append({key: robj.get(key) for key in ('backend', 'algo', 'n_qubits', 'oracle')})
+        return cls(tallies, labels)
+
+    @classmethod
+    def from_store(cls, runs):
+        """Builds a batch from the runs of a ResultsStore, without unpacking their values
+
+        Parameters:
+            runs (iterable): runs yielded by a ResultsStore, metadata without algo are considered GHZ
+
+        Returns:
+            batch (Batch): one run per stored run
+        """
+        tallies = []
+        labels = []
+        for run in runs:
+            metadata = run['metadata']
+            mask = parity_mask(metadata.get('algo', 'ghz'), metadata['width'], metadata.get('oracle'))
+            tallies.append(tally_packed(run['values'], run['counts'], mask))
+            labels.append(metadata)
+        return cls(tallies, labels)
+
+    @classmethod
+    def from_archive(cls, archive, processes=None, algo='ghz', **criteria):
+        """Builds a batch from the archived executions matching criteria, counts are parsed in parallel
+
+        Parameters:
+            archive (Archive): experimental data archive
+            processes (int): worker processes, 1 to parse in this process, None for one per CPU
+            algo (str): algorithm of the archived circuits
+            criteria: see Archive.query()
+
+        Returns:
+            batch (Batch): one run per execution, labels are rows of the executions table
+        """
+        rows = archive.query('executions', **criteria)
+        labels = [{column: values[i].item() for column, values in rows.items()} for i in range(len(rows['member']))]
+        jobs = [(row['member'], parity_mask(algo, row['n_qubits'])) for row in labels]
+        workers = min(processes or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            return cls(_tally_members(archive.filename, jobs), labels)
+        # Contiguous chunks, one per worker, so that results come back in order
+        step = -(-len(jobs) // workers)
+        chunks = [jobs[i:i + step] for i in range(0, len(jobs), step)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tallies = [row for part in executor.map(_tally_members, [archive.filename] * len(chunks), chunks)
+                       for row in part]
+        return cls(tallies, labels)
+
+    def metric(self, name):
+        """Computes a metric of every run
+
+        Parameters:
+            name (str): 'fidelity', 'success_rate' or 'parity'
+
+        Returns:
+            values (numpy.ndarray): one value per run
+        """
+        zeros, ones, even, shots = self.tallies.T.astype(np.float64)
+        return _METRICS[name](zeros, ones, even, shots)
+
+    def fidelity(self):
+        """Classical fidelity of every run with the ideal GHZ distribution, as in the archived data"""
+        return self.metric('fidelity')
+
+    def success_rate(self):
+        """Probability of the ideal outcomes in every run, the envariance success rate"""
+        return self.metric('success_rate')
+
+    def parity(self):
+        """Parity expectation of every run over its entangled qubits"""
+        return self.metric('parity')
+
+    def bootstrap(self, name, resamples=1000, confidence=0.95, seed=None):
+        """Bootstrap confidence intervals of a metric, all runs and resamples are drawn at once
+
+        Resampling the shots of a run only changes its tally, so tallies are drawn from
+        binomial distributions instead of resampling every outcome.
+
+        Parameters:
+            name (str): metric, see metric()
+            resamples (int): number of bootstrap resamples
+            confidence (float): confidence level of the intervals
+            seed (int): seed of the random generator
+
+        Returns:
+            low (numpy.ndarray): lower bound of every run
+            high (numpy.ndarray): upper bound of every run
+        """
+        generator = np.random.default_rng(seed)
+        zeros, ones, even, shots = self.tallies.T
+        total = np.maximum(shots, 1).astype(np.float64)
+        size = (resamples, len(self))
+        if name == 'parity':
+            even = generator.binomial(shots, even / total, size=size)
+            zeros = ones = np.zeros(size)
+        else:
+            # Outcomes are all zeros, all ones or anything else, drawn as two chained binomials
+            p_zeros = zeros / total
+            rest = 1 - p_zeros
+            p_ones = np.divide(ones / total, rest, out=np.zeros_like(rest), where=rest > 0)
+            zeros = generator.binomial(shots, p_zeros, size=size)
+            ones = generator.binomial(shots - zeros, np.clip(p_ones, 0, 1))
+            even = np.zeros(size)
+        values = _METRICS[name](zeros, ones, even, np.broadcast_to(total, size))
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.percentile(values, [tail, 100 - tail], axis=0)
+        return low, high
+
+    def summary(self, name, resamples=1000, confidence=0.95, seed=None):
+        """Metric of every run with its confidence interval
+
+        Returns:
+            rows (list): dictionaries with the run label, value, low and high
+        """
+        values = self.metric(name)
+        low, high = self.bootstrap(name, resamples=resamples, confidence=confidence, seed=seed)
+        return [{'label': label, 'value': value, 'low': l, 'high': h}
+                for label, value, l, h in zip(self.labels, values.tolist(), low.tolist(), high.tolist())]
+
+
+def _tally_members(filename, jobs):
+    # Tallies the counts of archive members, runs in worker processes
+    tallies = []
+    with zipfile.ZipFile(filename) as archive:
+        for member, mask in jobs:
+            with archive.open(member) as data:
+                tallies.append(tally(parse_text(io.TextIOWrapper(data, encoding='utf-8')), mask))
+    return tallies
@@ -0,0 +1,322 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import re
+import ast
+import json
+import hashlib
+import tempfile
+import zipfile
+from os import path
+import logging
+
+import numpy as np
+
+from compiler import configure_logging
+from compiler.cache import default_cache_dir
+from compiler.store import parse_text
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+DEFAULT_ARCHIVE = path.join(path.dirname(path.dirname(path.abspath(__file__))), 'experimental-data', 'ghz_data.zip')
+
+# Bumped whenever the layout of the index changes, so that stale indexes are rebuilt
+INDEX_VERSION = 1
+
+# Archive members, the "execution" in circuit file names is the index of the compiled circuit
+_MEMBERS = [
+    ('summary', re.compile(r'^(?P<method>qiskit-compiler)_ghz_depth/(?P<backend>\w+)/cirucits_stats/'
+                           r'summary_\w+_execution_(?P<circuit>\d+)_(?P<n_qubits>\d+)$')),
+    ('qasm', re.compile(r'^(?P<method>qiskit-compiler)_ghz_depth/(?P<backend>\w+)/qasm_circuits/'
+                        r'qams_\w+_execution_(?P<circuit>\d+)_(?P<n_qubits>\d+)$')),
+    ('summary', re.compile(r'^(?P<method>spanning-tree)_ghz_depth/(?P<backend>\w+)/circuits_stats/'
+                           r'summary_\w+_(?P<n_qubits>\d+)$')),
+    ('qasm', re.compile(r'^(?P<method>spanning-tree)_ghz_depth/(?P<backend>\w+)/qasm_circuits/'
+                        r'qasm_\w+_(?P<n_qubits>\d+)$')),
+    ('fidelity', re.compile(r'^(?P<method>qiskit-compiler)_ghz_fidelity/(?P<backend>\w+)/'
+                            r'qams_\w+_execution_(?P<circuit>\d+)_(?P<n_qubits>\d+)/'
+                            r'\w+?_(?P<shots>\d+)_\d+_qubits_ghz_fidelity\.txt$')),
+    ('counts', re.compile(r'^(?P<method>qiskit-compiler)_ghz_fidelity/(?P<backend>\w+)/'
+                          r'qams_\w+_execution_(?P<circuit>\d+)_(?P<n_qubits>\d+)/'
+                          r'execution_(?P<execution>\d+)\.txt$')),
+    ('fidelity', re.compile(r'^(?P<method>spanning-tree)_ghz_fidelity/(?P<backend>\w+)/\w+_(?P<n_qubits>\d+)/'
+                            r'\w+?_(?P<shots>\d+)_\d+_qubits_ghz_fidelity\.txt$')),
+    ('counts', re.compile(r'^(?P<method>spanning-tree)_ghz_fidelity/(?P<backend>\w+)/\w+_(?P<n_qubits>\d+)/'
+                          r'\d+_execution_(?P<execution>\d+)\.txt$')),
+]
+
+_SUMMARY_FIELDS = ('size', 'depth', 'width', 'bits', 'factors')
+
+
+def parse_summary(text):
+    """Parses a circuit summary written as a Python dictionary, without evaluating code
+
+    Parameters:
+        text (str): summary, e.g. "{'size': 44, 'depth': 10, ..., 'operations': {'cx': 11}}"
+
+    Returns:
+        summary (dict): parsed summary, None if text is not a dictionary
+    """
+    try:
+        summary = ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError):
+        return None
+    return summary if isinstance(summary, dict) else None
+
+
+def parse_fidelity(lines):
+    """Parses a fidelity table, an "Exec Fidelity" header followed by execution and fidelity columns
+
+    Parameters:
+        lines (iterable): lines of the file, as str
+
+    Returns:
+        fidelities (dict): execution: fidelity
+    """
+    fidelities = dict()
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 2 and fields[0].isdigit():
+            fidelities[int(fields[0])] = float(fields[1])
+    return fidelities
+
+
+def _columns(rows, names):
+    # Converts a list of row dictionaries to a dictionary of numpy columns
+    columns = dict()
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if all(isinstance(value, str) for value in values):
+            columns[name] = np.array(values, dtype=str)
+        elif all(isinstance(value, int) for value in values):
+            columns[name] = np.array(values, dtype=np.int64)
+        else:
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return columns
+
+
+def build_index(filename):
+    """Scans the archive and builds the circuits and executions tables
+
+    Only summaries and fidelity tables are read, QASM circuits and counts are referenced by member name.
+
+    Parameters:
+        filename (str): zip archive
+
+    Returns:
+        circuits (dict): column name: numpy array, one row per (method, backend, n_qubits, circuit)
+        executions (dict): column name: numpy array, one row per (method, backend, n_qubits, execution)
+    """
+    circuits = dict()
+    executions = dict()
+    fidelities = dict()
+    with zipfile.ZipFile(filename) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            for kind, pattern in _MEMBERS:
+                match = pattern.match(info.filename)
+                if match is not None:
+                    break
+            else:
+                logger.debug('Skipping archive member %s', info.filename)
+                continue
+            fields = match.groupdict()
+            circuit = (fields['method'], fields['backend'], int(fields['n_qubits']), int(fields.get('circuit') or 0))
+            if kind == 'counts':
+                key = circuit + (int(fields['execution']),)
+                executions[key] = {'member': info.filename}
+                continue
+            with archive.open(info) as member:
+                text = io.TextIOWrapper(member, encoding='utf-8')
+                if kind == 'summary':
+                    summary = parse_summary(text.read())
+                    if summary is None:
+                        logger.warning('Malformed summary %s', info.filename)
+                        continue
+                    row = circuits.setdefault(circuit, dict())
+                    row.update({field: summary.get(field) for field in _SUMMARY_FIELDS})
+                    row.update({'op_' + name: count for name, count in summary.get('operations', {}).items()})
+                    row['summary'] = info.filename
+                elif kind == 'qasm':
+                    circuits.setdefault(circuit, dict())['qasm'] = info.filename
+                else:
+                    fidelities[circuit] = (int(fields['shots']), parse_fidelity(text))
+    for key, row in executions.items():
+        shots, table = fidelities.get(key[:4], (0, dict()))
+        row.update({'shots': shots, 'fidelity': table.get(key[4])})
+    circuit_rows = [dict(zip(('method', 'backend', 'n_qubits', 'circuit'), key), **row)
+                    for key, row in sorted(circuits.items())]
+    for row in circuit_rows:
+        row.setdefault('summary', '')
+        row.setdefault('qasm', '')
+    operations = sorted({name for row in circuit_rows for name in row if name.startswith('op_')})
+    for row in circuit_rows:
+        for name in operations:
+            row.setdefault(name, 0)
+    execution_rows = [dict(zip(('method', 'backend', 'n_qubits', 'circuit', 'execution'), key), **row)
+                      for key, row in sorted(executions.items())]
+    circuit_names = ['method', 'backend', 'n_qubits', 'circuit'] + list(_SUMMARY_FIELDS) + operations + \
+                    ['summary', 'qasm']
+    execution_names = ['method', 'backend', 'n_qubits', 'circuit', 'execution', 'shots', 'fidelity', 'member']
+    return _columns(circuit_rows, circuit_names), _columns(execution_rows, execution_names)
+
+
+class Archive(object):
+    """Query index over the zipped experimental data, members are streamed from the zip without extracting it
+
+    The circuits and executions tables are stored as columns in a .npz file of the cache directory,
+    named after the archive path, size and modification time, so the archive is scanned once.
+
+    Parameters:
+        filename (str): zip archive, experimental-data/ghz_data.zip by default
+        cache_dir (str): directory of the index, see cache.default_cache_dir()
+    """
+
+    def __init__(self, filename=DEFAULT_ARCHIVE, cache_dir=None):
+        self.filename = filename
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self._tables = None
+        self._zip = None
+
+    def _index_file(self):
+        stat = os.stat(self.filename)
+        content = json.dumps([path.abspath(self.filename), stat.st_size, stat.st_mtime_ns, INDEX_VERSION])
+        return path.join(self.cache_dir, 'archive-%s.npz' % hashlib.sha256(content.encode('utf-8')).hexdigest())
+
+    def _load(self):
+        # Loads the index from the cache directory, building it if missing
+        if self._tables is not None:
+            return self._tables
+        index_file = self._index_file()
+        try:
+            with np.load(index_file) as data:
+                tables = {'circuits': dict(), 'executions': dict()}
+                for name in data.files:
+                    table, column = name.split('/', 1)
+                    tables[table][column] = data[name]
+            logger.info('Archive index loaded from %s', index_file)
+        except (OSError, ValueError, KeyError):
+            circuits, executions = build_index(self.filename)
+            tables = {'circuits': circuits, 'executions': executions}
+            arrays = {table + '/' + column: values for table, columns in tables.items()
+                      for column, values in columns.items()}
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                descriptor, temporary = tempfile.mkstemp(dir=self.cache_dir, suffix='.npz')
+                with os.fdopen(descriptor, 'wb') as temporary_file:
+                    np.savez(temporary_file, **arrays)
+                os.replace(temporary, index_file)
+                logger.info('Archive index written to %s', index_file)
+            except OSError:
+                logger.warning('Cannot write archive index to %s', index_file, exc_info=True)
+        self._tables = tables
+        return tables
+
+    @property
+    def circuits(self):
+        """Circuits table, column name: numpy array"""
+        return self._load()['circuits']
+
+    @property
+    def executions(self):
+        """Executions table, column name: numpy array"""
+        return self._load()['executions']
+
+    def query(self, table='executions', **criteria):
+        """Selects the rows of a table matching all criteria
+
+        Parameters:
+            table (str): 'circuits' or 'executions'
+            criteria: column=value, or column=list of accepted values, e.g. query(method='spanning-tree',
+                      n_qubits=[12, 16])
+
+        Returns:
+            columns (dict): column name: numpy array of the selected rows
+        """
+        columns = self._load()[table]
+        mask = np.ones(len(columns['method']), dtype=bool)
+        for column, value in criteria.items():
+            if isinstance(value, (list, tuple, set, np.ndarray)):
+                mask &= np.isin(columns[column], list(value))
+            else:
+                mask &= columns[column] == value
+        return {column: values[mask] for column, values in columns.items()}
+
+    def _read(self, member):
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.filename)
+        return self._zip.open(member)
+
+    def qasm(self, method, backend, n_qubits, circuit=0):
+        """Returns the QASM of an archived circuit, None if it was not archived"""
+        rows = self.query('circuits', method=method, backend=backend, n_qubits=n_qubits, circuit=circuit)
+        if not rows['qasm'].size or not rows['qasm'][0]:
+            return None
+        with self._read(str(rows['qasm'][0])) as member:
+            return member.read().decode('utf-8')
+
+    def counts(self, member):
+        """Reads the counts of an execution
+
+        Parameters:
+            member (str): member column of the executions table
+
+        Returns:
+            results (dict): binary string: count
+        """
+        with self._read(member) as data:
+            return parse_text(io.TextIOWrapper(data, encoding='utf-8'))
+
+    def iter_counts(self, **criteria):
+        """Streams the counts of the executions matching criteria, see query()
+
+        Returns:
+            executions (generator): (row, results) pairs, row is a dictionary of the executions columns
+        """
+        rows = self.query('executions', **criteria)
+        for i in range(len(rows['member'])):
+            row = {column: values[i].item() for column, values in rows.items()}
+            yield row, self.counts(row['member'])
+
+    def to_store(self, store, **criteria):
+        """Appends the counts of the executions matching criteria to a results store
+
+        Parameters:
+            store (ResultsStore): destination store
+            criteria: see query()
+
+        Returns:
+            runs (int): number of appended runs
+        """
+        runs = 0
+        for row, results in self.iter_counts(**criteria):
+            row['fidelity'] = None if np.isnan(row['fidelity']) else row['fidelity']
+            store.append(results, **row)
+            runs += 1
+        return runs
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -12,14 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from os import path
 import logging
-from logging.config import fileConfig
+import threading
+from time import sleep
 
-from qiskit import get_backend
+from compiler import config, configure_logging
 
 logger = logging.getLogger(__name__)
-fileConfig(path.join(path.dirname(path.abspath(__file__)), 'logging.ini'))
+configure_logging()
 
 qx2 = 'ibmqx2'
 
@@ -33,17 +33,82 @@ online_sim = 'ibmq_qasm_simulator'
 
 local_sim = 'local_qasm_simulator'
 
+stabilizer_sim = 'local_stabilizer_simulator'
 
-def get_coupling(backend):
-    """Get coupling map of the backend
+# Backends known without a coupling map of their own, registers are sized on the Compiler coupling map
+BACKENDS = (qx2, qx3, qx4, qx5, online_sim, local_sim, stabilizer_sim)
+
+# Simulator backends, their seeded runs are cached, see Compiler.result_cache
+SIMULATORS = (online_sim, local_sim, stabilizer_sim)
+
+# Backends implemented in this package, created on first use
+_local_backends = dict()
+
+# Set once the IBM Q account is registered, see authenticate()
+_registered = False
+_register_lock = threading.Lock()
+
+
+def authenticate(retry_interval=60):
+    """Registers the IBM Q account of config.py with qiskit, only the first call contacts the API
+
+    It is called when an online backend is first needed, so importing the package and compiling
+    never touch the network. Authentication errors are retried every retry_interval seconds.
+
+    Parameters:
+        retry_interval (float): seconds between authentication attempts
+    """
+    global _registered
+    if _registered:
+        return
+    with _register_lock:
+        if _registered:
+            return
+        from requests.exceptions import HTTPError
+        from qiskit import register
+        from IBMQuantumExperience.IBMQuantumExperience import ApiError
+        if config.APItoken is None:
+            raise Exception("Please set up your api access token. See config.py.")
+        while True:
+            try:
+                register(config.APItoken, config.URL)
+            except (HTTPError, ApiError):
+                logger.error('Authentication error')
+                sleep(retry_interval)
+                continue
+            break
+        _registered = True
+
+
+def get_backend(backend):
+    """Get backend object, either one of this package or a qiskit one, authenticating on first online backend
 
     Parameters:
         backend (str): backend name
 
     Returns:
-        coupling_map (dict): backend coupling map
+        backend: backend object
+    """
+    if backend == stabilizer_sim:
+        if backend not in _local_backends:
+            from compiler.stabilizer import StabilizerBackend
+            _local_backends[backend] = StabilizerBackend(backend)
+        return _local_backends[backend]
+    from qiskit import get_backend as qiskit_backend
+    if not backend.startswith('local_'):
+        authenticate()
+    return qiskit_backend(backend)
+
+
+def fetch_coupling(backend):
+    """Get coupling map of the backend from its online configuration
+
+    Parameters:
+        backend (str): backend name
+
+    Returns:
+        backend_info (dict): backend name and coupling map
     """
-    # register(config.APItoken, config.URL)
     configuration = get_backend(backend).configuration
     couplings = configuration['coupling_map']
     coupling_map = dict()
@@ -55,3 +120,19 @@ def get_coupling(backend):
         'backend_name': backend,
         'coupling_map': coupling_map
     }
+
+
+def get_coupling(backend, refresh=False):
+    """Get coupling map of the backend, from local snapshots unless refresh is set
+
+    Parameters:
+        backend (str): backend name
+        refresh (bool): set True to fetch the coupling map online and update its snapshot
+
+    Returns:
+        backend_info (dict): backend name and coupling map, see couplings.CouplingProvider
+    """
+    from compiler.couplings import default_provider
+    if refresh:
+        return default_provider().refresh(backend)
+    return default_provider().get(backend)
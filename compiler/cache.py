@@ -0,0 +1,285 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import glob
+import json
+import pickle
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from os import path
+import logging
+import pkg_resources
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from compiler import config, configure_logging
+from compiler.topology import VERSION
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+
+def default_cache_dir():
+    """Returns the directory where spanning trees are cached
+
+    The directory is, in order of preference, the GHZ_COMPILER_CACHE environment variable,
+    config.CACHE_DIR, or ghz-compiler inside the user cache directory.
+
+    Returns:
+        directory (str): cache directory
+    """
+    directory = os.environ.get('GHZ_COMPILER_CACHE') or getattr(config, 'CACHE_DIR', None)
+    if not directory:
+        directory = path.join(os.environ.get('XDG_CACHE_HOME') or path.join(path.expanduser('~'), '.cache'),
+                              'ghz-compiler')
+    return directory
+
+
+# Trees bundled in compiler/trees by backend name, see bundled_trees()
+_bundled_trees = None
+_bundled_lock = threading.Lock()
+
+
+def bundled_trees():
+    """Returns the spanning trees bundled in compiler/trees, read once per process
+
+    They are the seed tier of TreeCache and the last resort coupling maps of couplings.CouplingProvider.
+
+    Returns:
+        trees (dict): backend name: tree data, as built by Compiler with the default tree mode
+    """
+    global _bundled_trees
+    with _bundled_lock:
+        if _bundled_trees is None:
+            _bundled_trees = dict()
+            for tree_file in sorted(glob.glob(path.join(pkg_resources.resource_filename(__name__, 'trees'), '*.p'))):
+                try:
+                    with open(tree_file, 'rb') as pickle_file:
+                        data = pickle.load(pickle_file)
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    data = None
+                if not isinstance(data, dict) or 'coupling_map' not in data:
+                    logger.warning('Unreadable bundled tree %s', tree_file)
+                    continue
+                _bundled_trees[path.splitext(path.basename(tree_file))[0]] = data
+        return _bundled_trees
+
+
+def coupling_hash(coupling_map, **params):
+    """Hashes a coupling map together with the tree algorithm version and parameters
+
+    Parameters:
+        coupling_map (dict): backend coupling map
+        params: any parameter the cached data depends on
+
+    Returns:
+        key (str): hex digest
+    """
+    content = json.dumps({'coupling_map': [[node, list(targets)] for node, targets in coupling_map.items()],
+                          'version': VERSION,
+                          'params': params}, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class TreeCache(object):
+    """Content-addressed cache of spanning trees
+
+    Entries are pickles named after coupling_hash() in a user cache directory, written
+    atomically under a file lock and evicted least recently used first. Trees bundled in
+    compiler/trees are a read-only seed tier, looked up before the user directory.
+    """
+
+    def __init__(self, directory=None, max_entries=64):
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_entries = max_entries
+        self._seeds = None
+
+    def _path(self, key):
+        return path.join(self.directory, key + '.p')
+
+    def _load_seeds(self):
+        # Indexes bundled trees by hash, they were all built by the default algorithm
+        self._seeds = {coupling_hash(data['coupling_map']): data for data in bundled_trees().values()}
+
+    @contextmanager
+    def _lock(self):
+        # Serializes writers across processes, builds take milliseconds so one lock is enough
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path.join(self.directory, '.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get(self, key, seeds=True):
+        """Looks up a cached entry
+
+        Parameters:
+            key (str): entry key, see coupling_hash()
+            seeds (bool): whether bundled trees can satisfy the lookup
+
+        Returns:
+            data (dict): cached data, None if missing
+        """
+        if seeds:
+            if self._seeds is None:
+                self._load_seeds()
+            if key in self._seeds:
+                logger.debug('Using bundled spanning tree %s', key)
+                return self._seeds[key]
+        entry = self._path(key)
+        try:
+            with open(entry, 'rb') as pickle_file:
+                data = pickle.load(pickle_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError):
+            logger.warning('Discarding unreadable cache entry %s', entry)
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        logger.debug('Using cached spanning tree %s', key)
+        return data
+
+    def put(self, key, data):
+        """Stores an entry atomically, then evicts the least recently used ones
+
+        Parameters:
+            key (str): entry key, see coupling_hash()
+            data (dict): data to store
+        """
+        with self._lock():
+            self._write(key, data)
+
+    def _write(self, key, data):
+        # Must be called holding the lock
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as pickle_file:
+                pickle.dump(data, pickle_file)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self._evict()
+
+    def _evict(self):
+        # Removes least recently used entries above max_entries
+        entries = sorted(glob.glob(path.join(self.directory, '*.p')), key=path.getmtime)
+        for entry in entries[:max(0, len(entries) - self.max_entries)]:
+            logger.debug('Evicting cache entry %s', entry)
+            try:
+                os.unlink(entry)
+            except OSError:
+                pass
+
+    def get_or_create(self, coupling_map, create, **params):
+        """Returns the cached tree for a coupling map, building and storing it if missing
+
+        Only one process builds a missing entry, the others wait for the lock and read it.
+        If the cache directory is not writable the tree is built and returned uncached.
+
+        Parameters:
+            coupling_map (dict): backend coupling map
+            create (callable): builds the data to cache when missing
+            params: parameters the tree depends on, bundled trees are only used without them
+
+        Returns:
+            data (dict): cached or newly built data
+        """
+        key = coupling_hash(coupling_map, **params)
+        data = self.get(key, seeds=not params)
+        if data is not None:
+            return data
+        try:
+            with self._lock():
+                data = self.get(key, seeds=False)
+                if data is None:
+                    data = create()
+                    self._write(key, data)
+        except OSError:
+            logger.warning('Spanning tree cache %s is not writable', self.directory, exc_info=True)
+            if data is None:
+                data = create()
+        return data
+
+
+# Version of the ResultCache entries, bump it whenever their content changes so that old entries are not read
+RESULT_VERSION = 2
+
+
+def circuit_hash(qasm, backend, shots, seed):
+    """Hashes a run of a circuit, Qasm is normalized so that comments and spacing do not matter
+
+    Parameters:
+        qasm (str): circuit as Qasm
+        backend (str): backend name
+        shots (int): number of shots
+        seed (int): seed of the simulator
+
+    Returns:
+        key (str): hex digest
+    """
+    lines = (' '.join(line.split('//')[0].split()) for line in qasm.splitlines())
+    content = json.dumps({'qasm': '\n'.join(line for line in lines if line), 'backend': backend, 'shots': shots,
+                          'seed': seed, 'version': RESULT_VERSION}, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class CachedResult(object):
+    """Result of a run served from a ResultCache, exposing the parts of the qiskit Result used by Compiler
+
+    Parameters:
+        entry (dict): cached entry, with the name, counts and ran Qasm of the circuit
+    """
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    def get_names(self):
+        return [self._entry['name']]
+
+    def get_counts(self, name=None):
+        return self._entry['counts']
+
+    def get_ran_qasm(self, name):
+        return self._entry['ran_qasm']
+
+
+class ResultCache(TreeCache):
+    """Content-addressed cache of the outputs of seeded simulator runs
+
+    Entries are keyed by circuit_hash() and stored like spanning trees, in the results
+    directory of the spanning tree cache, evicted least recently used first. Only the counts
+    and the ran Qasm are stored: circuits with the same Qasm may differ in algorithm and
+    connected qubits, so ran objects are rebuilt from the cobj of every run, see CachedResult.
+    """
+
+    def __init__(self, directory=None, max_entries=256):
+        super(ResultCache, self).__init__(directory if directory is not None else
+                                          path.join(default_cache_dir(), 'results'), max_entries)
+
+    def get(self, key, seeds=False):
+        return super(ResultCache, self).get(key, seeds=False)
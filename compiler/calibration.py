@@ -0,0 +1,156 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import json
+import math
+import heapq
+import hashlib
+import logging
+
+from compiler import configure_logging
+from compiler.topology import adjacency
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Version of the noise-aware selection, bump it whenever selected trees change so that cached ones are rebuilt
+VERSION = 2
+
+# Number of single qubit gates every qubit of a circuit goes through, the Hadamard gates before and after the cnots
+SINGLE_GATES = 2
+
+
+def load_calibration(filename):
+    """Loads a calibration snapshot saved from backend.calibration
+
+    The file has the IBM Q format: a "qubits" list whose entries have "gateError" and "readoutError"
+    values, and a "multiQubitGates" list whose entries have "qubits" and "gateError". Qubits are
+    identified by the digits of their name, e.g. "Q3", or by their position in the list.
+
+    Parameters:
+        filename (str): JSON file
+
+    Returns:
+        calibration (dict): 'gate' and 'readout', qubit: error, 'cx', (qubit, qubit): error,
+                            and 'digest', the SHA-256 of the file content
+    """
+    with open(filename, 'rb') as calibration_file:
+        content = calibration_file.read()
+    data = json.loads(content.decode('utf-8'))
+    calibration = {'gate': dict(), 'readout': dict(), 'cx': dict(), 'digest': hashlib.sha256(content).hexdigest()}
+    for position, qubit in enumerate(data.get('qubits', [])):
+        digits = re.search(r'\d+', str(qubit.get('name', '')))
+        index = int(digits.group()) if digits else position
+        calibration['gate'][index] = qubit.get('gateError', {}).get('value', 0.0)
+        calibration['readout'][index] = qubit.get('readoutError', {}).get('value', 0.0)
+    for gate in data.get('multiQubitGates', []):
+        calibration['cx'][tuple(gate['qubits'])] = gate.get('gateError', {}).get('value', 0.0)
+    logger.info('Loaded calibration of %d qubits and %d couplings from %s', len(calibration['gate']),
+                len(calibration['cx']), filename)
+    return calibration
+
+
+def _log_success(error, times=1):
+    # Negative log of the probability that times operations with the given error all succeed
+    return -times * math.log(max(1.0 - error, 1e-12))
+
+
+def _weights(coupling_map, calibration):
+    # Negative log fidelity of every qubit, and of every edge indexed child first, edges[child][parent]
+    gate = calibration['gate']
+    node_cost = {node: _log_success(calibration['readout'].get(node, 0.0)) +
+                 _log_success(gate.get(node, 0.0), SINGLE_GATES) for node in coupling_map}
+    edges = dict()
+    for child, neighbours in adjacency(coupling_map).items():
+        edges[child] = dict()
+        for parent in neighbours:
+            # The new qubit is the control of the cnot connecting it, see Compiler._cx_layer
+            if parent in coupling_map[child]:
+                error = calibration['cx'].get((child, parent), calibration['cx'].get((parent, child), 0.0))
+                edges[child][parent] = _log_success(error)
+            else:
+                error = calibration['cx'].get((parent, child), calibration['cx'].get((child, parent), 0.0))
+                edges[child][parent] = _log_success(error) + _log_success(gate.get(parent, 0.0), 2) + \
+                    _log_success(gate.get(child, 0.0), 2)
+    return node_cost, edges
+
+
+def _costs(tree, node_cost, edges):
+    # Cumulative negative log fidelity of every prefix of a tree
+    costs = []
+    total = 0.0
+    for node, parent in tree.items():
+        total += node_cost[node] + (edges[node][parent] if parent != -1 else 0.0)
+        costs.append(total)
+    return costs
+
+
+def _grow(root, node_cost, edges):
+    # Grows a tree from root adding the qubit that fails least at each step, as Prim's algorithm,
+    # edges are indexed child first, every coupling has an edge in both directions so neighbours are edges[node]
+    tree = {root: -1}
+    frontier = [(node_cost[child] + edges[child][root], child, root) for child in edges.get(root, {})]
+    heapq.heapify(frontier)
+    while frontier:
+        cost, node, parent = heapq.heappop(frontier)
+        if node in tree:
+            continue
+        tree[node] = parent
+        for child in edges.get(node, {}):
+            if child not in tree:
+                heapq.heappush(frontier, (node_cost[child] + edges[child][node], child, node))
+    return tree
+
+
+def noise_aware_trees(coupling_map, calibration, trees=(), candidates=32):
+    """Selects, for every number of qubits, the root and connected qubits with the highest estimated fidelity
+
+    The estimated fidelity of a tree is the probability that none of its gates and readouts fail.
+    Trees are grown like Prim's algorithm from every candidate root: the next qubit is the one
+    whose readout, single qubit gates and connecting cnot, inverse cnots pay four more Hadamard
+    gates, fail least. Every prefix of a grown tree is the tree selected for that root and size,
+    so one growth per root covers all sizes.
+
+    Parameters:
+        coupling_map (dict): backend coupling map
+        calibration (dict): calibration loaded by load_calibration()
+        trees (iterable): other trees to compare, e.g. the topological spanning tree
+        candidates (int): number of roots tried, the qubits with the lowest errors, None tries every qubit
+
+    Returns:
+        selection (dict): 'trees', list of (root, tree) with trees as node: parent, the root has parent -1,
+                          'best', n_qubits: index of the best tree, and 'fidelity', n_qubits: estimated fidelity
+    """
+    node_cost, edges = _weights(coupling_map, calibration)
+    roots = sorted(coupling_map, key=lambda node: (node_cost[node], node))
+    if candidates is not None:
+        roots = roots[:candidates]
+    grown = [_grow(root, node_cost, edges) for root in roots] + [tree for tree in trees if tree]
+    costs = [_costs(tree, node_cost, edges) for tree in grown]
+    selection = {'trees': [], 'best': dict(), 'fidelity': dict()}
+    indexes = dict()
+    for n_qubits in range(1, len(coupling_map) + 1):
+        reaching = [i for i in range(len(grown)) if len(costs[i]) >= n_qubits]
+        if not reaching:
+            break
+        best = min(reaching, key=lambda i: costs[i][n_qubits - 1])
+        if best not in indexes:
+            indexes[best] = len(selection['trees'])
+            selection['trees'].append((next(iter(grown[best])), grown[best]))
+        selection['best'][n_qubits] = indexes[best]
+        selection['fidelity'][n_qubits] = math.exp(-costs[best][n_qubits - 1])
+    logger.debug('Noise-aware roots: %s', {n_qubits: selection['trees'][index][0]
+                                           for n_qubits, index in selection['best'].items()})
+    return selection
@@ -13,29 +13,96 @@
 # limitations under the License.
 
 import os
-import operator
-from time import sleep
 import pickle
-from concurrent.futures import CancelledError, TimeoutError
-from requests.exceptions import ConnectionError, HTTPError
-from urllib3.exceptions import MaxRetryError, NewConnectionError
+import asyncio
+import logging
+import operator
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, TimeoutError, ProcessPoolExecutor, ThreadPoolExecutor, \
+    FIRST_COMPLETED, wait, as_completed
 from socket import gaierror
-import pkg_resources
 from sympy import pi
 
-from IBMQuantumExperience import IBMQuantumExperience
-from IBMQuantumExperience.IBMQuantumExperience import ApiError
-from qiskit import QuantumRegister, ClassicalRegister, QuantumCircuit, compile, QISKitError
-from qiskit.backends import JobStatus
-from qiskit.backends.ibmq.ibmqjob import IBMQJobError
-from qiskit.dagcircuit import DAGCircuit
-from qiskit.wrapper import load_qasm_string
-
+from compiler import config, configure_logging, utility
 from compiler.backends import *
-from compiler import config, utility
+from compiler.cache import CachedResult, ResultCache, TreeCache, circuit_hash, coupling_hash
+from compiler import calibration as noise
+from compiler.metrics import NULL_RECORD
+from compiler.passes import PASSES, run_passes
+from compiler.journal import circuit_key
+from compiler.runner import JobRunner, RunError
+from compiler.templates import GateList, TEMPLATE_CACHE_SIZE
+from compiler.topology import broadcast_tree, changed_prefix, diff_couplings, pack_subtrees, reachability_ranks, \
+    repair_tree, schedule_layers, spanning_tree
 
 logger = logging.getLogger(__name__)
-fileConfig(path.join(path.dirname(path.abspath(__file__)), 'logging.ini'))
+configure_logging()
+
+# Spanning tree construction modes: 'bfs' grows the tree breadth first from the highest ranked node,
+# 'depth' builds a broadcast tree minimizing the cnot rounds, see topology.broadcast_tree
+TREE_MODES = ('bfs', 'depth')
+
+# Extra rounds of an inverse cnot in 'depth' mode, for the Hadamard gates around it
+REVERSE_COST = 2
+
+# Default limits of a batch job, used when the backend configuration does not state them, see Compiler.run_batch
+MAX_EXPERIMENTS = 20
+MAX_SHOTS = 8192
+
+# Errors after which a job is resubmitted, see retry_errors()
+_retry_errors = None
+
+
+def retry_errors():
+    """Returns the errors after which a job is resubmitted
+
+    Online clients and qiskit are only imported here, when the first job runs, so compiling never imports them.
+
+    Returns:
+        errors (tuple): exception classes
+    """
+    global _retry_errors
+    if _retry_errors is None:
+        from qiskit import QISKitError
+        from requests.exceptions import ConnectionError, HTTPError
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+        from IBMQuantumExperience.IBMQuantumExperience import ApiError
+        from qiskit.backends.ibmq.ibmqjob import IBMQJobError
+        _retry_errors = (QISKitError, IBMQJobError, TimeoutError, CancelledError, LookupError, ConnectionError,
+                         NewConnectionError, MaxRetryError, HTTPError, ApiError, gaierror)
+    return _retry_errors
+
+
+def _run_sync(coroutine):
+    # Runs the coroutine of a blocking method to completion,
+    # on a worker thread with its own event loop if one is already running in this thread, e.g. in Jupyter
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+# Compiler of a compile_many worker process
+_worker_compiler = None
+
+
+def _init_worker(backend_info, tree_data, tree_mode='bfs', selection=None):
+    # Builds the worker Compiler from the backend, spanning tree and noise-aware selection of the parent process
+    global _worker_compiler
+    _worker_compiler = Compiler(backend_info, tree_data=tree_data, tree_mode=tree_mode)
+    if selection is not None:
+        _worker_compiler._use_selection(selection)
+
+
+def _compile_spec(spec, compiler=None):
+    # Compiles a single (algo, n_qubits, oracle, backend) spec
+    if compiler is None:
+        compiler = _worker_compiler
+    algo, n_qubits, oracle, backend = spec
+    return spec, compiler.compile(n_qubits, backend=backend, algo=algo, oracle=oracle)
 
 
 class Compiler(object):
@@ -43,61 +110,206 @@ class Compiler(object):
     TODO More detailed class description
     """
 
-    def __init__(self, backend_info):
-        # Class constructor
+    def __init__(self, backend_info, cache_dir=None, tree_data=None, metrics=None, tree_mode='bfs',
+                 calibration=None, journal=None):
+        # Class constructor,
+        # tree_data can be a precomputed Compiler.tree_data to skip the tree cache,
+        # metrics is a metrics.Metrics collecting timers and counters of compile() and run(),
+        # tree_mode is one of TREE_MODES, 'depth' gives lower depth circuits,
+        # calibration is a calibration JSON file, qubits are then selected by estimated fidelity,
+        # journal is a journal.Journal recording jobs of run(), so that a crashed sweep resumes where it stopped
         self._coupling_map = backend_info['coupling_map'].copy()
+        self._backend_name = backend_info.get('backend_name')
         self._inverse_coupling_map = dict()
         self._tree = dict()
         self._n_qubits = 0
         self._ranks = dict()
         self._connected = dict()
         self._most_connected = []
-        self.__pickle_data = None
+        self._inverted_cx = 0
+        self._selection = None
+        self._calibration = None
+        self.metrics = metrics
+        self.journal = journal
+        if tree_mode not in TREE_MODES:
+            logger.critical('Tree mode %s not recognized, it must be one of %s', tree_mode, ', '.join(TREE_MODES))
+            exit(8)
+        self._tree_mode = tree_mode
+        # Templates memoized by _template(), least recently used first, the generation changes whenever
+        # templates are evicted, so that templates whose build started before are not stored
+        self._templates = OrderedDict()
+        self._templates_lock = threading.Lock()
+        self._templates_generation = 0
+        self._template_lock = threading.Lock()
+        self._runner = None
+        self._api = None
+        # Runs of every circuit key made by run_async() without execution, so that repetitions are journaled apart
+        self._repetitions = dict()
+        self._repetitions_lock = threading.Lock()
+        self._cache = TreeCache(cache_dir)
+        self.result_cache = ResultCache(os.path.join(self._cache.directory, 'results'))
         if backend_info['coupling_map']:
-            if os.path.isfile(pkg_resources.resource_filename(__name__, 'trees/' + backend_info['backend_name'] + '.p')):
-                pickle_file = open(pkg_resources.resource_filename(__name__, 'trees/' + backend_info['backend_name'] + '.p'), 'rb')
-                self.__pickle_data = pickle.load(pickle_file)
-                pickle_file.close()
-            if self.__pickle_data is None or backend_info['coupling_map'] != self.__pickle_data['coupling_map']:
-                self._invert_graph(backend_info['coupling_map'], self._inverse_coupling_map)
-                self._start_explore(self._coupling_map, self._ranks)
-                self._most_connected = self._find_max(self._ranks)
-                self._spanning_tree(self._most_connected[0], inverse_map=self._inverse_coupling_map,
-                                    ranks=sorted(self._ranks.items(), key=operator.itemgetter(1), reverse=True))
-                pickle_file = open(pkg_resources.resource_filename(__name__, 'trees/' + backend_info['backend_name'] + '.p'), 'wb')
-                pickle.dump({'coupling_map': self._coupling_map,
-                             'inverse_coupling_map': self._inverse_coupling_map,
-                             'path': self._tree,
-                             'ranks': self._ranks,
-                             'most_connected': self._most_connected}, pickle_file)
-                pickle_file.close()
-            else:
-                logger.debug("Using saved spanning tree")
-                self._inverse_coupling_map = self.__pickle_data['inverse_coupling_map']
-                self._tree = self.__pickle_data['path']
-                self._ranks = self.__pickle_data['ranks']
-                self._most_connected = self.__pickle_data['most_connected']
+            if tree_data is None:
+                record = self._record('tree')
+                with record.timer('tree'):
+                    tree_data = self._cache.get_or_create(self._coupling_map, self._build_tree, **self._tree_params())
+                if record.enabled:
+                    record.count('tree_built', int(bool(self._ranks)))
+                    self.metrics.emit(record)
+            self._inverse_coupling_map = tree_data['inverse_coupling_map']
+            self._tree = tree_data['path']
+            self._ranks = tree_data['ranks']
+            self._most_connected = tree_data['most_connected']
         else:
             logger.critical('Missing coupling map')
             exit(1)
+        if calibration is not None:
+            self.set_calibration(calibration)
+
+    @property
+    def calibration(self):
+        """Calibration file qubits are selected with, None if they are selected by topology"""
+        return self._calibration
+
+    def set_calibration(self, filename):
+        """Selects the root and connected qubits of circuits by estimated fidelity, see calibration.noise_aware_trees
+
+        Selections are cached per calibration snapshot, so loading the same snapshot again is immediate.
+
+        Parameters:
+            filename (str): calibration JSON file saved from backend.calibration, None selects qubits by topology
+        """
+        self._calibration = filename
+        if filename is None:
+            self._use_selection(None)
+            return
+        snapshot = noise.load_calibration(filename)
 
-    def _explore(self, source, visiting, visited, ranks):
-        # Recursively explores the graph, avoiding already visited nodes
-        for next in self._coupling_map[visiting]:
-            if next not in visited[source]:
-                visited[source].append(next)
-                ranks[next] = ranks[next] + 1
-                self._explore(source, next, visited, ranks)
+        def create():
+            return noise.noise_aware_trees(self._coupling_map, snapshot, trees=[self._tree])
 
-    def _start_explore(self, graph, ranks):
-        # Starts exploring the graph assign a rank to nodes,
+        selection = self._cache.get_or_create(self._coupling_map, create, calibration=snapshot['digest'],
+                                              selection_version=noise.VERSION, **self._tree_params())
+        self._use_selection(selection)
+
+    def update_coupling(self, coupling_map):
+        """Updates the topology after the coupling map of the backend changed, e.g. a coupler was disabled
+
+        The spanning tree is repaired instead of rebuilt, see topology.repair_tree, so circuits only change
+        where the tree does. It is rebuilt only if its root was removed or lost all its couplings.
+        Memoized circuits that are still valid are kept, and the tree is stored in the spanning tree cache
+        under the new coupling map.
+
+        Parameters:
+            coupling_map (dict): new backend coupling map
+
+        Returns:
+            update (dict): removed and added couplings, as (control, target) sets, and valid, the number of
+                           qubits up to which circuits built before the change are still valid
+        """
+        removed, added = diff_couplings(self._coupling_map, coupling_map)
+        if not removed and not added and len(coupling_map) == len(self._coupling_map):
+            return {'removed': removed, 'added': added, 'valid': len(self._tree)}
+        old_map, old_tree = self._coupling_map, self._tree
+        tree = repair_tree(old_tree, coupling_map)
+        with self._template_lock:
+            # Attributes are replaced, not updated, since their old values may be shared with other Compilers
+            self._coupling_map = coupling_map.copy()
+            self._inverse_coupling_map = dict()
+            self._ranks = dict()
+            self._tree = dict()
+            if tree is None:
+                logger.warning('Root %d of the spanning tree was decoupled, rebuilding it', self._most_connected[0])
+                self._build_tree()
+            else:
+                self._invert_graph(self._coupling_map, self._inverse_coupling_map)
+                self._start_explore(self._coupling_map, self._ranks)
+                self._tree = tree
+                self._most_connected = [self._most_connected[0], self._ranks[self._most_connected[0]]]
+            valid = changed_prefix(old_tree, old_map, self._tree, self._coupling_map) \
+                if len(coupling_map) == len(old_map) else 0
+            self._clear_templates(valid)
+        try:
+            self._cache.put(coupling_hash(self._coupling_map, **self._tree_params()), self.tree_data)
+        except OSError:
+            logger.warning('Spanning tree cache %s is not writable', self._cache.directory, exc_info=True)
+        if self._calibration is not None:
+            self.set_calibration(self._calibration)
+        logger.info('Coupling map changed, %d couplings removed and %d added, circuits up to %d qubits still valid',
+                    len(removed), len(added), valid)
+        return {'removed': removed, 'added': added, 'valid': valid}
+
+    def _use_selection(self, selection):
+        # Sets the noise-aware selection, templates built with the previous one are discarded
+        self._selection = selection
+        self._clear_templates()
+
+    def _clear_templates(self, valid=0):
+        # Evicts memoized templates with more than valid qubits, every template by default
+        with self._templates_lock:
+            for key in [key for key in self._templates if key[2] > valid]:
+                del self._templates[key]
+            self._templates_generation += 1
+
+    def _template(self, size, algo, n_qubits, oracle, custom_mode):
+        # Returns the template of _build_template, memoized, and whether it was memoized already
+        key = (size, algo, n_qubits, oracle, custom_mode)
+        with self._templates_lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template, True
+            generation = self._templates_generation
+        template = self._build_template(*key)
+        with self._templates_lock:
+            if generation == self._templates_generation:
+                self._templates[key] = template
+                if len(self._templates) > TEMPLATE_CACHE_SIZE:
+                    self._templates.popitem(last=False)
+        return template, False
+
+    def _select(self, n_qubits):
+        # Returns the tree and root of circuits with n_qubits qubits
+        if self._selection is None or n_qubits not in self._selection['best']:
+            return self._tree, self._most_connected[0]
+        root, tree = self._selection['trees'][self._selection['best'][n_qubits]]
+        return tree, root
+
+    @property
+    def tree_data(self):
+        """Topology data of the backend, can be passed to another Compiler to skip building the tree"""
+        return {'coupling_map': self._coupling_map,
+                'inverse_coupling_map': self._inverse_coupling_map,
+                'path': self._tree,
+                'ranks': self._ranks,
+                'most_connected': self._most_connected}
+
+    def _tree_params(self):
+        # Parameters the cached tree depends on, none for the default mode so that bundled trees are used
+        if self._tree_mode == 'bfs':
+            return dict()
+        return {'tree_mode': self._tree_mode, 'reverse_cost': REVERSE_COST}
+
+    def _build_tree(self):
+        # Analyses the coupling map and builds the spanning tree, returns data to be cached
+        logger.debug('Building spanning tree for coupling map: %s', self._coupling_map)
+        self._invert_graph(self._coupling_map, self._inverse_coupling_map)
+        self._start_explore(self._coupling_map, self._ranks)
+        ranks = sorted(self._ranks.items(), key=operator.itemgetter(1), reverse=True)
+        if self._tree_mode == 'depth':
+            start, tree = broadcast_tree(self._coupling_map, ranks, reverse_cost=REVERSE_COST)
+            self._most_connected = [start, self._ranks[start]]
+            self._tree.update(tree)
+        else:
+            self._most_connected = self._find_max(self._ranks)
+            self._spanning_tree(self._most_connected[0], inverse_map=self._inverse_coupling_map, ranks=ranks)
+        return self.tree_data
+
+    @staticmethod
+    def _start_explore(graph, ranks):
+        # Assigns a rank to nodes,
         # node rank is based on how many other nodes can reach the node
-        visited = dict()
-        for node in range(len(graph)):
-            ranks[node] = 0
-        for source in graph:
-            visited.update({source: []})
-            self._explore(source, source, visited, ranks)
+        ranks.update(reachability_ranks(graph))
 
     @staticmethod
     def _invert_graph(graph, inverse_graph=None):
@@ -113,7 +325,7 @@ class Compiler(object):
         for node in graph:
             if node not in inverse_graph:
                 inverse_graph.update({node: []})
-        logger.debug('inverse coupling map: %s', str(inverse_graph))
+        logger.debug('inverse coupling map: %s', inverse_graph)
 
     @staticmethod
     def _find_max(ranks):
@@ -125,92 +337,57 @@ class Compiler(object):
 
     def _spanning_tree(self, start, inverse_map, ranks):
         # Creates a list of edges to follow when compiling a circuit
-        ranks = dict(ranks)
-        self._tree.update({start: -1})
-        del ranks[start]
-        to_connect = [start]
-        max = len(self._coupling_map)
-        count = max - 1
-        visiting = 0
-        updated = True
-        while count > 0:
-            if updated is False:
-                for inv in ranks:
-                    for node in inverse_map[inv]:
-                        if node in to_connect:
-                            to_connect.append(inv)
-                            logger.debug('Found inverse path to node %d', inv)
-                            logger.debug('to connect: %s', str(to_connect))
-                            del ranks[inv]
-                            self._tree.update({inv: node})
-                            logger.debug('path: %s', str(self._tree))
-                            updated = True
-                            count -= 1
-                            break
-                    if updated is True:
-                        break
-            if count > 0:
-                for node in inverse_map[to_connect[visiting]]:
-                    if node not in self._tree:
-                        self._tree.update({node: to_connect[visiting]})
-                        logger.debug('path: %s', str(self._tree))
-                        del ranks[node]
-                        count -= 1
-                        if node not in to_connect:
-                            to_connect.append(node)
-                            logger.debug('to connect: %s', str(to_connect))
-                        if count <= 0:
-                            break
-                visiting += 1
-                if visiting == len(to_connect):
-                    updated = False
-                    logger.debug('No more direct paths to explore, searching an inverse one')
-
-    def _cx(self, circuit, control_qubit, target_qubit, control, target):
-        # Places a cnot gate between the control and target qubit,
-        # inverts it to sastisfy couplings if needed
-        if target in self._coupling_map[control]:
-            circuit.cx(control_qubit, target_qubit)
-            logger.debug('Connected qubit %d to qubit %d with cnot gate', control, target)
-        elif control in self._coupling_map[target]:
-            circuit.u2(0, pi, control_qubit)
-            circuit.u2(0, pi, target_qubit)
-            circuit.cx(target_qubit, control_qubit)
-            circuit.u2(0, pi, control_qubit)
-            circuit.u2(0, pi, target_qubit)
-            logger.debug('Connected qubit %d to qubit %d with inverse cnot gate', control, target)
-        else:
-            exit(3)
-
-    def _place_cx(self, circuit, quantum_r, stop, oracle='11'):
-        # Places all needed cnot gates fro the specified oracle
-        if not oracle == '00':
-            for qubit in self._connected:
-                if self._connected[qubit] != -1:
-                    if oracle == '11':
-                        self._cx(circuit, quantum_r[qubit], quantum_r[self._connected[qubit]], qubit,
-                                 self._connected[qubit])
-                    elif oracle == '10':
-                        if stop > 0:
-                            self._cx(circuit, quantum_r[qubit], quantum_r[self._connected[qubit]], qubit,
-                                     self._connected[qubit])
-                            stop -= 1
-                        else:
-                            break
-
-    def _place_h(self, circuit, start, quantum_r, initial=True, x=True):
+        self._tree.update(spanning_tree(start, self._coupling_map, inverse_map, ranks))
+
+    def _cx_layer(self, circuit, layer):
+        # Places a layer of cnot gates on disjoint qubits,
+        # inverts them to satisfy couplings if needed, inverse cnots share the Hadamard gates around them
+        inverse = []
+        for control, target in layer:
+            if target not in self._coupling_map[control]:
+                if control not in self._coupling_map[target]:
+                    logger.critical('Qubits %d and %d are not coupled', control, target)
+                    exit(3)
+                inverse.append((control, target))
+        for control, target in inverse:
+            circuit.u2(0, pi, control)
+            circuit.u2(0, pi, target)
+        for control, target in layer:
+            if (control, target) in inverse:
+                circuit.cx(target, control)
+                logger.debug('Connected qubit %d to qubit %d with inverse cnot gate', control, target)
+            else:
+                circuit.cx(control, target)
+                logger.debug('Connected qubit %d to qubit %d with cnot gate', control, target)
+        for control, target in inverse:
+            circuit.u2(0, pi, control)
+            circuit.u2(0, pi, target)
+        self._inverted_cx += len(inverse)
+
+    def _place_cx(self, circuit, stop, oracle='11'):
+        # Places all needed cnot gates fro the specified oracle,
+        # scheduled in the minimum number of layers of disjoint qubits
+        if oracle != '11' and oracle != '10':
+            return
+        edges = [(qubit, parent) for qubit, parent in self._connected.items() if parent != -1]
+        if oracle == '10':
+            edges = edges[:stop]
+        for layer in schedule_layers(edges):
+            self._cx_layer(circuit, layer)
+
+    def _place_h(self, circuit, start, initial=True, x=True):
         # Places Hadamard gates in the circuit
         for qubit in self._connected:
             if qubit != start:
-                circuit.u2(0, pi, quantum_r[qubit])
+                circuit.u2(0, pi, qubit)
             else:
                 if initial is True:
                     if x is True:
-                        circuit.u3(pi, 0, pi, quantum_r[qubit])
+                        circuit.u3(pi, 0, pi, qubit)
                 else:
-                    circuit.u2(0, pi, quantum_r[qubit])
+                    circuit.u2(0, pi, qubit)
 
-    def _place_x(self, circuit, quantum_r):
+    def _place_x(self, circuit):
         # Places Pauli-x gates needed for envariance
         sorted_c = sorted(self._connected.items(), key=operator.itemgetter(0))
         s_0 = self._n_qubits // 2
@@ -220,26 +397,28 @@ class Compiler(object):
             if count <= 0:
                 break
             if i >= s_0:
-                circuit.u3(pi, 0, pi, quantum_r[qubit[0]])
+                circuit.u3(pi, 0, pi, qubit[0])
             else:
-                circuit.iden(quantum_r[qubit[0]])
+                circuit.iden(qubit[0])
             i += 1
         i = 0
         for qubit in sorted_c:
             if i >= s_0:
-                circuit.iden(quantum_r[qubit[0]])
+                circuit.iden(qubit[0])
             else:
-                circuit.u3(pi, 0, pi, quantum_r[qubit[0]])
+                circuit.u3(pi, 0, pi, qubit[0])
             i += 1
 
-    def _measure(self, circuit, quantum_r, classical_r):
+    def _measure(self, circuit):
         # Places measure gates at the edn of the circuit
         # circuit.barrier()
         for qubit in self._connected:
-            circuit.measure(quantum_r[qubit], classical_r[qubit])
+            circuit.measure(qubit, qubit)
 
-    def _create(self, circuit, quantum_r, classical_r, n_qubits, x=True, oracle='11', custom_mode=False):
-        # Creates the circuit based on input parameters
+    def _create(self, circuit, n_qubits, x=True, oracle='11', custom_mode=False, connected=None):
+        # Creates the circuit based on input parameters,
+        # circuit is a GateList so that double Hadamard gates cancel while being placed,
+        # connected is a subtree to use instead of the first n_qubits nodes of the tree, root first
         stop = 0
         if custom_mode is False and len(oracle) != 2:
             logger.critical('custom mode set to False but oracle %s is not a known alias', oracle)
@@ -259,22 +438,25 @@ class Compiler(object):
             exit(2)
 
         self._connected.clear()
+        if connected is None:
+            tree, start = self._select(self._n_qubits)
+        else:
+            tree, start = connected, next(iter(connected))
         count = self._n_qubits
-        for qubit in self._tree:
+        for qubit in tree:
             if count <= 0:
                 break
-            self._connected.update({qubit: self._tree[qubit]})
+            self._connected.update({qubit: tree[qubit]})
             count -= 1
-        self._place_h(circuit, self._most_connected[0], quantum_r, x=x)
+        self._place_h(circuit, start, x=x)
         if custom_mode is False:
-            self._place_cx(circuit, quantum_r, stop, oracle=oracle)
+            self._place_cx(circuit, stop, oracle=oracle)
         else:
-            self._place_cx(circuit, quantum_r, stop, oracle='10')
-        self._place_h(circuit, self._most_connected[0], quantum_r, initial=False)
+            self._place_cx(circuit, stop, oracle='10')
+        self._place_h(circuit, start, initial=False)
         if x is True:
-            self._place_x(circuit, quantum_r)
-        self._measure(circuit, quantum_r, classical_r)
-        circuit = self.optimize_h(circuit)
+            self._place_x(circuit)
+        self._measure(circuit)
         cobj = {
             'circuit': circuit,
             'connected': self._connected.copy(),
@@ -282,32 +464,67 @@ class Compiler(object):
         }
         return cobj
 
+    def _build_template(self, size, algo, n_qubits, oracle, custom_mode):
+        # Builds the Qasm, the connected qubits, the counters and the pass timers of a circuit,
+        # memoized by _template(), circuits are built one at a time since they share self._connected,
+        # so Compilers can be shared by threads
+        circuit = GateList(size)
+        with self._template_lock:
+            self._inverted_cx = 0
+            cobj = self._create(circuit, n_qubits, **self._algo_options(algo, oracle, custom_mode))
+            counters = {'h_removed': circuit.removed, 'inverted_cx': self._inverted_cx}
+        timers = dict()
+        for stats in circuit.optimize():
+            counters[stats['pass'] + '_removed'] = stats['removed']
+            timers['pass_' + stats['pass']] = stats['seconds']
+        counters['gates'] = len(circuit)
+        logger.debug('Built %s template with %d qubit, %d Hadamard gates cancelled', algo, n_qubits, circuit.removed)
+        return circuit.qasm(), tuple(self._sort_connected(cobj['connected'], algo=algo)), counters, timers
+
     @staticmethod
-    def optimize_h(circuit):
-        """Optimize Hadamard gates by removing doubles, which corresponds to identity
+    def _algo_options(algo, oracle, custom_mode):
+        # Arguments of _create implementing algo
+        if algo == 'ghz':
+            return {'x': False}
+        elif algo == 'envariance':
+            return {}
+        return {'x': False, 'oracle': oracle, 'custom_mode': custom_mode}
+
+    @staticmethod
+    def optimize_h(circuit, merge=False, stats=None):
+        """Optimize Hadamard gates by removing doubles, which corresponds to identity,
+        and, if merge is set, merge consecutive single qubit gates into a single u3
+
+        The circuit is optimized as a list of gates and rebuilt directly, without going through Qasm.
+        Circuits of compile() and template() already went through every pass, see passes.PASSES.
 
         Parameters:
             circuit (QuantumCircuit): circuit to be optimized
+            merge (bool): set to True to merge single qubit gates too
+            stats (list): if given, statistics of every pass are appended to it, see passes.run_passes
 
         Returns:
             optimized circuit (QuantumCircuit): the optimized circuit
         """
-        dag_circuit = DAGCircuit.fromQuantumCircuit(circuit)
-        h = dag_circuit.get_named_nodes('u2')
-        for node in h:
-            if dag_circuit.multi_graph.node[node] is not None and dag_circuit.multi_graph.node[node]['params'] == [0,
-                                                                                                                   pi]:
-                edge = dag_circuit.multi_graph.in_edges(node)
-                pred = []
-                for e in edge:
-                    pred = e[0]
-                if dag_circuit.multi_graph.node[pred]['name'] == 'u2' and dag_circuit.multi_graph.node[pred][
-                    'params'] == [0, pi]:
-                    logger.debug('Two consecutive Hadamard gates on qubit %s removed',
-                                 str(dag_circuit.multi_graph.node[pred]['qargs']))
-                    dag_circuit._remove_op_node(pred)
-                    dag_circuit._remove_op_node(node)
-        return load_qasm_string(dag_circuit.qasm())
+        gates = []
+        for instruction in circuit.data:
+            name = instruction.name
+            if getattr(instruction, 'control', None) is not None:
+                # Conditional gates are never optimized
+                name += '_if'
+            gates.append((name, tuple(instruction.param), tuple((arg[0].name, arg[1]) for arg in instruction.arg),
+                          instruction))
+        gates, pass_stats = run_passes(gates, PASSES if merge else PASSES[:1])
+        if stats is not None:
+            stats.extend(pass_stats)
+        from qiskit import QuantumCircuit
+        optimized = QuantumCircuit(*circuit.regs.values(), name=circuit.name)
+        for gate in gates:
+            if gate[3] is None:
+                optimized.u3(*gate[1], (circuit.regs[gate[2][0][0]], gate[2][0][1]))
+            else:
+                gate[3].reapply(optimized)
+        return optimized
 
     @staticmethod
     def _sort_connected(connected, algo='ghz'):
@@ -321,6 +538,9 @@ class Compiler(object):
     def set_size(self, backend, n_qubits):
         """Checks if number of qubits is consistent with backend and set register size accordingly
 
+        The register has a qubit for every qubit of the coupling map. Backends are either the one
+        the coupling map belongs to, named by backend_info['backend_name'], or one of BACKENDS.
+
         Parameters:
             backend (str): backend name
             n_qubits (int): number of qubits
@@ -328,24 +548,13 @@ class Compiler(object):
         Returns:
             size (int): register size
         """
-        size = 0
-        if backend == qx2 or backend == qx4:
-            if n_qubits <= 5:
-                size = 5
-            else:
-                logger.critical('Maximum qubits allowed for %s backend is 5 but n_qubits = %d', backend, n_qubits)
-                exit(1)
-        elif backend == qx3 or backend == qx5:
-            if n_qubits <= 16:
-                size = 16
-            else:
-                logger.critical('Maximum qubits allowed for %s backend is 16 but n_qubits = %d', backend, n_qubits)
-                exit(4)
-        elif backend == online_sim or backend == local_sim:
-            size = len(self._coupling_map)
-        else:
+        if backend not in BACKENDS and backend != self._backend_name:
             logger.critical('Backend %s not known', backend)
             exit(5)
+        size = len(self._coupling_map)
+        if n_qubits > size:
+            logger.critical('Maximum qubits allowed for %s backend is %d but n_qubits = %d', backend, size, n_qubits)
+            exit(4)
         return size
 
     @staticmethod
@@ -374,8 +583,11 @@ class Compiler(object):
                     oracle += '0'
         return oracle
 
-    def compile(self, n_qubits, backend=online_sim, algo='ghz', oracle='11', custom_mode=False, compiling=False):
-        """Compiles circuit according to input parameters
+    def template(self, n_qubits, backend=online_sim, algo='ghz', oracle='11', custom_mode=False):
+        """Creates circuit Qasm according to input parameters, without using qiskit
+
+        Circuits only depend on the spanning tree and on input parameters, so they are memoized:
+        repeated calls with the same parameters return immediately.
 
         Parameters:
             n_qubits (int): number of qubits used in circuit
@@ -383,185 +595,549 @@ class Compiler(object):
             algo (str): alias of algorithm to implement, can be either 'ghz', 'envariance' or 'parity'
             oracle (str): oracle, can be an alias or explicit oracle representation; it's '11' for ghz and envariance
             custom_mode (bool): set True fro explicit oracle representation
-            compiling (bool): set to True fi you want to let qiskit remap your circuit, which is generally not needed
 
         Returns:
-            cobj (dict): compiled object, dictionary containing results of compiling, for example:
+            cobj (dict): compiled object without qiskit objects, for example:
 
                                 cobj = {
-                                circuit: compiled circuit as QuantumCircuit,
-                                qasm: compiled circuit as Qasm,
+                                qasm: circuit as Qasm,
                                 n_qubits: number of qubits used in circuit,
                                 connected: list of connected qubits, in th order they were connected,
                                 oracle: specified oracle,
                                 algo: specified algorithm,
-                                compiled: qobj to be run on the backend }
+                                metrics: timers and counters, only if the Compiler has metrics }
         """
-        size = self.set_size(backend, n_qubits)
-
-        quantum_r = QuantumRegister(size, "qr")
-        classical_r = ClassicalRegister(size, "cr")
+        record = self._record('template')
+        cobj = self._make_template(n_qubits, backend, algo, oracle, custom_mode, record)
+        if record.enabled:
+            cobj['metrics'] = self.metrics.emit(record)
+        return cobj
 
-        circuit = QuantumCircuit(quantum_r, classical_r, name=algo)
+    def _record(self, kind):
+        # Starts a metrics record, NULL_RECORD if metrics are disabled
+        if self.metrics is None:
+            return NULL_RECORD
+        return self.metrics.record(kind)
 
-        cobj = dict()
+    def _make_template(self, n_qubits, backend, algo, oracle, custom_mode, record):
+        # Creates the cobj of template(), recording the template counters
+        size = self.set_size(backend, n_qubits)
 
         if algo == 'parity':
             if n_qubits > len(self._tree) - 1:
-                logger.critical('Too much qubits for backend %s, max qubits allowed is %d', backend, len(self._tree) - 1)
+                logger.critical('Too much qubits for backend %s, max qubits allowed is %d', backend,
+                                len(self._tree) - 1)
                 exit(6)
             n_qubits += 1
-
-        if algo == 'ghz':
-            cobj = self._create(circuit, quantum_r, classical_r, n_qubits, x=False)
-        elif algo == 'envariance':
-            cobj = self._create(circuit, quantum_r, classical_r, n_qubits)
-        elif algo == 'parity':
-            cobj = self._create(circuit, quantum_r, classical_r, n_qubits, x=False, oracle=oracle,
-                                custom_mode=custom_mode)
-        else:
+        elif algo != 'ghz' and algo != 'envariance':
             logger.critical('algorithm %s not recognized', algo)
             exit(7)
+
+        with record.timer('template'):
+            (qasm, connected, counters, timers), hit = self._template(size, algo, n_qubits, oracle, custom_mode)
+        if record.enabled:
+            record.update(counters)
+            record.count('template_cache_hits', int(hit))
+            if not hit:
+                # Passes only ran if the template was built by this call
+                for stage, seconds in timers.items():
+                    record.add_time(stage, seconds)
         logger.info('Created %s circuit for %s backend with %d qubit', algo, backend, n_qubits)
-        QASM_source = cobj['circuit'].qasm()
-        connected = self._sort_connected(cobj['connected'], algo=algo)
-        cobj['connected'] = connected
-        cobj['qasm'] = QASM_source
+        cobj = {
+            'qasm': qasm,
+            'n_qubits': n_qubits,
+            'connected': list(connected),
+            'algo': algo
+        }
         if custom_mode is False:
             cobj['oracle'] = self.set_oracle(oracle, n_qubits)
         else:
             cobj['oracle'] = oracle
-        if compiling is True:
-            cobj['compiled'] = compile(cobj['circuit'], backend)
-        else:
-            cobj['compiled'] = compile(cobj['circuit'], backend, skip_transpiler=True)
-        cobj['circuit'] = load_qasm_string(cobj['compiled']['circuits'][0]['compiled_circuit_qasm'])
-        cobj['algo'] = algo
-        logger.info('Compiled %s circuit for %s backend with %d qubit', algo, backend, n_qubits)
-        logger.debug('cobj: %s', str(cobj))
         return cobj
 
-    def run(self, cobj, backend=online_sim, shots=1024, max_credits=5):
-        """Runs circuit on backend
+    def compile(self, n_qubits, backend=online_sim, algo='ghz', oracle='11', custom_mode=False, compiling=False):
+        """Compiles circuit according to input parameters
 
         Parameters:
-            cobj (dict): compiled object
-            backend (str): backend on which circuit will run
-            shots (int): number of shots
-            max_credits (int): maximum credits to use
+            n_qubits (int): number of qubits used in circuit
+            backend (str): backend on wich circuit will be compiled
+            algo (str): alias of algorithm to implement, can be either 'ghz', 'envariance' or 'parity'
+            oracle (str): oracle, can be an alias or explicit oracle representation; it's '11' for ghz and envariance
+            custom_mode (bool): set True fro explicit oracle representation
+            compiling (bool): set to True fi you want to let qiskit remap your circuit, which is generally not needed
 
         Returns:
-            robj (dict): ran object, dictionary containing results of ran circuit, for example:
+            cobj (dict): compiled object, dictionary containing results of compiling, for example:
 
-                                robj = {
-                                circuit: ran circuit as QuantumCircuit,
-                                ran_qasm: ran circuit as Qasm,
+                                cobj = {
+                                circuit: compiled circuit as QuantumCircuit,
+                                qasm: compiled circuit as Qasm,
                                 n_qubits: number of qubits used in circuit,
                                 connected: list of connected qubits, in th order they were connected,
                                 oracle: specified oracle,
                                 algo: specified algorithm,
-                                backend: backend on which circuit was ran
-                                result: result of running the circuit
-                                counts: result counts, sorted in descending order}
+                                compiled: qobj to be run on the backend,
+                                metrics: timers and counters, only if the Compiler has metrics }
         """
-        while True:
-            try:
-                backend_status = get_backend(backend).status
-                if ('available' in backend_status and backend_status['available'] is False) \
-                        or ('busy' in backend_status and backend_status['busy'] is True):
-                    while get_backend(backend).status['available'] is False:
-                        sleep(300)
-            except (ConnectionError, ValueError, KeyError):
-                logger.error('Error getting backend status')
-                sleep(300)
-                continue
-            break
-
-        while True:
-            try:
-                api = IBMQuantumExperience(config.APItoken)
-            except (HTTPError, ApiError):
-                logger.error('Authentication error')
-                sleep(60)
-                continue
-            break
+        record = self._record('compile')
+        cobj = self._make_template(n_qubits, backend, algo, oracle, custom_mode, record)
+        self._compile_qasm(cobj, backend, compiling, record)
+        if record.enabled:
+            cobj['metrics'] = self.metrics.emit(record)
+        logger.info('Compiled %s circuit for %s backend with %d qubit', algo, backend, cobj['n_qubits'])
+        logger.debug('cobj: %s', cobj)
+        return cobj
+
+    @staticmethod
+    def _compile_qasm(cobj, backend, compiling, record=NULL_RECORD):
+        # Compiles cobj['qasm'] with qiskit, adding the qobj as compiled and the compiled circuit as circuit,
+        # qiskit is imported here so that importing this module does not load it nor its online providers
+        from qiskit import compile
+        from qiskit.wrapper import load_qasm_string
+        with record.timer('load_qasm'):
+            circuit = load_qasm_string(cobj['qasm'])
+        # qiskit does not know backends of this package, their qobj is the same of the local simulator
+        target = local_sim if backend == stabilizer_sim else backend
+        with record.timer('qiskit_compile'):
+            if compiling is True:
+                cobj['compiled'] = compile(circuit, target)
+            else:
+                cobj['compiled'] = compile(circuit, target, skip_transpiler=True)
+        with record.timer('load_compiled_qasm'):
+            cobj['circuit'] = load_qasm_string(cobj['compiled']['circuits'][0]['compiled_circuit_qasm'])
 
+    def template_packed(self, instances, backend=online_sim, custom_mode=False):
+        """Creates a single circuit running several circuits side by side, on disjoint connected qubits
 
-        min_credits = 0
-        if shots > 1024:
-            min_credits = 5
-        else:
-            min_credits = 3
+        Every circuit measures its qubits into the classical bits of the same index, so circuits never
+        share classical bits and run_packed() splits the counts back per circuit.
 
-        while api.get_my_credits()['remaining'] < min_credits:
-            logger.warning('Less than 5 credits remaining, waiting for replenishment')
-            sleep(900)
-        try:
-            base_backend = get_backend(backend)
-            cobj['compiled']['config']['backend_name'] = backend
-            cobj['compiled']['config']['shots'] = shots
-            job = base_backend.run(cobj['compiled'])
-            logger.info('Circuit running on %s backend', backend)
-            lapse = 0
-            interval = 10
-            initialized = False
-            queued = False
-            running = False
-            while not job.done:
-                if not initialized:
-                    logger.info('Status @ {} seconds: \n%s'.format(interval * lapse), job.status)
-                    if job.status['status'] != JobStatus.INITIALIZING:
-                        initialized = True
-                        if job.status['status'] == JobStatus.QUEUED:
-                            queued = True
-                        else:
-                            running = True
-                elif queued is False:
-                    if job.status['status'] == JobStatus.QUEUED:
-                        logger.info('Status @ {} seconds: \n%s'.format(interval * lapse), job.status)
-                elif running is False:
-                    if job.status['status'] == JobStatus.RUNNING:
-                        running = True
-                        queued = True
-                        logger.info('Status @ {} seconds: \n%s'.format(interval * lapse), job.status)
-                else:
-                    logger.debug('Status @ {} seconds: \n%s'.format(interval * lapse), job.status)
-                if job.status['status'] == JobStatus.ERROR or job.status['status'] == JobStatus.CANCELLED:
-                    logger.error('Job encountered an error, retrying.')
-                    logger.debug(job.exception)
-                    return self.run(cobj, backend, shots, max_credits)
-                sleep(interval)
-                lapse += 1
-            logger.info('Status @ {} seconds: \n%s'.format(interval * lapse), job.status)
-            if job.status['status'] == JobStatus.ERROR or job.status['status'] == JobStatus.CANCELLED:
-                logger.error('Job encountered an error or was cancelled.')
-                logger.debug(job.exception)
-                return self.run(cobj, backend, shots, max_credits)
-            result = job.result()
-        except (QISKitError, IBMQJobError, TimeoutError, CancelledError, LookupError, ConnectionError, NewConnectionError, MaxRetryError, HTTPError, ApiError, gaierror):
-            logger.error('Error executing job', exc_info=True)
-            sleep(900)
-            return self.run(cobj, backend, shots, max_credits)
+        Parameters:
+            instances (list): (algo, n_qubits, oracle) tuples, see template()
+            backend (str): backend on wich circuit will be compiled
+            custom_mode (bool): set True for explicit oracle representations
+
+        Returns:
+            pobj (dict): packed object, for example:
+
+                                pobj = {
+                                qasm: circuit as Qasm,
+                                instances: list of cobjs without qasm, one per circuit, see template() }
+        """
+        sizes = []
+        for algo, n_qubits, oracle in instances:
+            if algo != 'ghz' and algo != 'envariance' and algo != 'parity':
+                logger.critical('algorithm %s not recognized', algo)
+                exit(7)
+            sizes.append(n_qubits + 1 if algo == 'parity' else n_qubits)
+        size = self.set_size(backend, sum(sizes))
+        subtrees = pack_subtrees(self._coupling_map, sizes)
+        if subtrees is None:
+            logger.critical('Circuits with %s qubits do not fit on disjoint qubits of backend %s', sizes, backend)
+            exit(9)
+        circuit = GateList(size)
+        pobj = {'instances': []}
+        with self._template_lock:
+            for (algo, _, oracle), subtree in zip(instances, subtrees):
+                n_qubits = len(subtree)
+                cobj = self._create(circuit, n_qubits, connected=subtree,
+                                    **self._algo_options(algo, oracle, custom_mode))
+                pobj['instances'].append({
+                    'n_qubits': n_qubits,
+                    'connected': list(self._sort_connected(cobj['connected'], algo=algo)),
+                    'algo': algo,
+                    'oracle': oracle if custom_mode else self.set_oracle(oracle, n_qubits)
+                })
+        circuit.optimize()
+        pobj['qasm'] = circuit.qasm()
+        logger.info('Created %d packed circuits for %s backend with %d qubit', len(sizes), backend, sum(sizes))
+        return pobj
+
+    def compile_packed(self, instances, backend=online_sim, custom_mode=False, compiling=False):
+        """Compiles several circuits side by side in a single circuit, see template_packed()
+
+        Returns:
+            pobj (dict): packed object of template_packed(), with circuit and compiled as in compile()
+        """
+        pobj = self.template_packed(instances, backend=backend, custom_mode=custom_mode)
+        self._compile_qasm(pobj, backend, compiling)
+        return pobj
+
+    def compile_many(self, specs, workers=None, max_pending=None):
+        """Compiles many circuits in parallel, yielding them as soon as they are compiled
+
+        Identical specs are compiled once. Worker processes receive the spanning tree of this
+        Compiler instead of building their own, and at most max_pending circuits are in flight,
+        so memory stays bounded however long the sweep is.
+
+        Parameters:
+            specs (iterable): (algo, n_qubits, oracle, backend) tuples, consumed lazily
+            workers (int): number of worker processes, default is the number of CPUs, 1 compiles in this process
+            max_pending (int): maximum number of specs submitted but not yet yielded, default is 4 * workers
+
+        Returns:
+            results (generator): (spec, cobj) pairs in completion order, see compile() for cobj
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = 4 * workers
+        seen = set()
+        unique = (seen.add(spec) or spec for spec in map(tuple, specs) if spec not in seen)
+        if workers == 1:
+            for spec in unique:
+                yield _compile_spec(spec, self)
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=({'backend_name': self._backend_name, 'coupling_map': self._coupling_map},
+                                           self.tree_data, self._tree_mode, self._selection)) as executor:
+            pending = set()
+            for spec in unique:
+                pending.add(executor.submit(_compile_spec, spec))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in as_completed(pending):
+                yield future.result()
+
+    @property
+    def runner(self):
+        """JobRunner used to run circuits, can be replaced e.g. to run on a FakeBackend"""
+        if self._runner is None:
+            self._runner = JobRunner(get_backend, get_credits=self._remaining_credits, retry_on=retry_errors())
+        return self._runner
+
+    @runner.setter
+    def runner(self, runner):
+        self._runner = runner
+
+    def _remaining_credits(self):
+        # Returns the remaining credits of the IBM Q account
+        if self._api is None:
+            from IBMQuantumExperience import IBMQuantumExperience
+            self._api = IBMQuantumExperience(config.APItoken)
+        return self._api.get_my_credits()['remaining']
+
+    @staticmethod
+    def _qobj(cobj, backend, shots, seed=None):
+        # Returns a copy of the compiled qobj configured for backend, shots and seed if given
+        qobj = dict(cobj['compiled'])
+        qobj['config'] = dict(qobj['config'], backend_name=backend, shots=shots)
+        if seed is not None:
+            qobj['config']['seed'] = seed
+        return qobj
+
+    def _result_key(self, cobj, backend, shots, seed):
+        # Key of the run in the result cache, None if it must not be cached
+        if seed is None:
+            seed = cobj['compiled']['config'].get('seed')
+        if self.result_cache is None or backend not in SIMULATORS or seed is None:
+            return None
+        return circuit_hash(cobj['qasm'], backend, shots, seed)
 
+    def _cache_result(self, key, robj):
+        # Stores the backend output of a ran object in the result cache, ran objects are rebuilt from it on hits
+        result = robj['result']
+        name = result.get_names()[0]
+        stored = {'name': name, 'counts': dict(result.get_counts(name)), 'ran_qasm': result.get_ran_qasm(name)}
         try:
-            counts = result.get_counts()
-        except QISKitError:
-            logger.error('Error reading results')
-            return self.run(cobj['circuit']['compiled'], backend, shots, max_credits)
+            self.result_cache.put(key, stored)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            logger.warning('Result of circuit %s not cached', key, exc_info=True)
 
+    @staticmethod
+    def _make_robj(cobj, backend, result, name=None, counts=None):
+        # Builds the ran object from the result of circuit name, the first one by default,
+        # counts replace the ones of the result, e.g. when shots were split over many jobs
+        if name is None:
+            name = result.get_names()[0]
+        from qiskit.wrapper import load_qasm_string
+        if counts is None:
+            counts = result.get_counts(name)
         sorted_c = sorted(counts.items(), key=operator.itemgetter(1), reverse=True)
         robj = {
-            'circuit': load_qasm_string(result.get_ran_qasm(result.get_names()[0])),
+            'circuit': load_qasm_string(result.get_ran_qasm(name)),
             'n_qubits': cobj['n_qubits'],
             'connected': cobj['connected'],
             'oracle': cobj['oracle'],
             'result': result,
             'counts': sorted_c,
-            'ran_qasm': result.get_ran_qasm(result.get_names()[0]),
+            'ran_qasm': result.get_ran_qasm(name),
             'algo': cobj['algo'],
             'backend': backend
         }
         robj['results'] = utility._order_results(robj)
+        return robj
+
+    @staticmethod
+    def _journal_robj(stored):
+        # Rebuilds a ran object stored in the journal, the qiskit result is not available
+        from qiskit.wrapper import load_qasm_string
+        robj = dict(stored, circuit=load_qasm_string(stored['ran_qasm']), result=None)
+        robj['counts'] = [tuple(count) for count in stored['counts']]
+        return robj
+
+    async def run_async(self, cobj, backend=online_sim, shots=1024, max_credits=5, seed=None, execution=None):
+        """Runs circuit on backend without blocking the event loop
+
+        Seeded runs on simulators are cached, see result_cache, a cached run returns immediately.
+        With a journal, a circuit already run with the same backend, shots and execution is not run again,
+        and a job submitted by a process that stopped before its completion is reattached.
+        Without execution, repeated runs of the same circuit are told apart by a counter, as in run_many(),
+        so repeating a sweep in a new process skips exactly the runs that completed.
+
+        Parameters:
+            cobj (dict): compiled object
+            backend (str): backend on which circuit will run
+            shots (int): number of shots
+            max_credits (int): maximum credits to use
+            seed (int): seed of simulator backends, default is the seed of the compiled qobj
+            execution: JSON serializable value telling apart repeated runs of the same circuit in the journal,
+                       e.g. a sweep index, see journal.circuit_key(); runs are counted if None
+
+        Returns:
+            robj (dict): ran object, see run(); result is None for circuits completed in a journal
+
+        Raises:
+            RunError: if the job failed runner.max_attempts times
+        """
+        if self.journal is not None and execution is None:
+            execution = [None, self._repetition(circuit_key(cobj, backend, shots))]
+        cache_key = self._result_key(cobj, backend, shots, seed)
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info('Circuit result found in cache for %s backend', backend)
+                return self._make_robj(cobj, backend, CachedResult(cached))
+        key = job_id = listener = None
+        if self.journal is not None:
+            key = circuit_key(cobj, backend, shots, execution)
+            stored = self.journal.completed(key)
+            if stored is not None:
+                logger.info('Circuit already ran on %s backend, skipping it', backend)
+                return self._journal_robj(stored)
+            job_id = self.journal.job_id(key)
+            listener = self.journal.listener(key)
+        record = self._record('run')
+        try:
+            robj = await self.runner.run(self._qobj(cobj, backend, shots, seed), backend,
+                                         process=lambda result: self._make_robj(cobj, backend, result), record=record,
+                                         job_id=job_id, listener=listener)
+        except RunError:
+            if key is not None:
+                self.journal.failed(key)
+            raise
+        finally:
+            # Failed runs are emitted too, their counters tell how many attempts were made
+            metrics = self.metrics.emit(record) if record.enabled else None
+        if metrics is not None:
+            robj['metrics'] = metrics
+        if key is not None:
+            self.journal.complete(key, robj)
+        if cache_key is not None:
+            self._cache_result(cache_key, robj)
         logger.info('Circuit successfully ran on %s backend', backend)
-        logger.debug('robj: %s', str(robj))
+        logger.debug('robj: %s', robj)
         return robj
+
+    def _repetition(self, key):
+        # Returns how many times the circuit key was run before without execution, counting this run
+        with self._repetitions_lock:
+            repetition = self._repetitions.get(key, 0)
+            self._repetitions[key] = repetition + 1
+        return repetition
+
+    async def run_many(self, cobjs, backend=online_sim, shots=1024, max_credits=5, seed=None, execution=None):
+        """Runs many circuits on backend concurrently, polling all jobs from a single scheduler
+
+        A circuit appearing more than once in cobjs is run once per appearance: its repetitions are
+        told apart in the journal by a counter, so resuming the same sweep skips exactly the completed ones.
+
+        Parameters:
+            cobjs (iterable): compiled objects
+            backend (str): backend on which circuits will run
+            shots (int): number of shots
+            max_credits (int): maximum credits to use
+            seed (int): seed of simulator backends, see run_async()
+            execution: JSON serializable value telling apart sweeps running the same circuits, see run_async()
+
+        Returns:
+            robjs (list): ran objects in the same order of cobjs, see run(); a circuit that could not be run
+                          is replaced by the exception that stopped it, e.g. RunError
+        """
+        runs = []
+        repetitions = dict()
+        for cobj in cobjs:
+            repetition = repetitions.get(cobj['qasm'], 0)
+            repetitions[cobj['qasm']] = repetition + 1
+            runs.append(self.run_async(cobj, backend, shots, max_credits, seed, [execution, repetition]))
+        return await asyncio.gather(*runs, return_exceptions=True)
+
+    @staticmethod
+    def _batch_qobjs(cobjs, backend, shots, max_experiments, max_shots):
+        # Packs the circuits of cobjs into qobjs of at most max_experiments circuits and max_shots shots,
+        # circuits are renamed after their cobj index, larger shots are split in equal parts over many qobjs
+        parts = -(-shots // max_shots)
+        qobjs = []
+        for part in range(parts):
+            part_shots = shots // parts + (1 if part < shots % parts else 0)
+            for first in range(0, len(cobjs), max_experiments):
+                qobj = Compiler._qobj(cobjs[first], backend, part_shots)
+                qobj['id'] = '%s_%d_%d' % (qobj.get('id', 'batch'), part, first)
+                qobj['circuits'] = [dict(cobj['compiled']['circuits'][0], name='experiment%d' % index)
+                                    for index, cobj in enumerate(cobjs[first:first + max_experiments], first)]
+                qobjs.append(qobj)
+        return qobjs
+
+    def _split_packed(self, pobj, backend, result):
+        # Builds the ran object of every packed circuit, from the counts of its own classical bits
+        name = result.get_names()[0]
+        counts = result.get_counts(name)
+        return [self._make_robj(instance, backend, result, name=name,
+                                counts=utility._marginal_counts(counts, instance['connected']))
+                for instance in pobj['instances']]
+
+    async def run_packed_async(self, pobj, backend=online_sim, shots=1024, max_credits=5):
+        """Runs packed circuits on backend without blocking the event loop
+
+        Parameters:
+            pobj (dict): packed object, see compile_packed()
+            backend (str): backend on which circuits will run
+            shots (int): number of shots
+            max_credits (int): maximum credits to use
+
+        Packed jobs are not journaled.
+
+        Returns:
+            robjs (list): one ran object per packed circuit, see run(); their counts only keep the
+                          classical bits of the circuit, the others are 0
+
+        Raises:
+            RunError: if the job failed runner.max_attempts times
+        """
+        if self.journal is not None:
+            logger.warning('Packed jobs are not journaled, they run again when the sweep is resumed')
+        record = self._record('run')
+        try:
+            robjs = await self.runner.run(self._qobj(pobj, backend, shots), backend,
+                                          process=lambda result: self._split_packed(pobj, backend, result),
+                                          record=record)
+        finally:
+            metrics = self.metrics.emit(record) if record.enabled else None
+        if metrics is not None:
+            for robj in robjs:
+                robj['metrics'] = metrics
+        logger.info('%d packed circuits successfully ran on %s backend', len(robjs), backend)
+        return robjs
+
+    def run_packed(self, pobj, backend=online_sim, shots=1024, max_credits=5):
+        """Runs packed circuits on backend, see run_packed_async()
+
+        Returns:
+            robjs (list): one ran object per packed circuit
+        """
+        return _run_sync(self.run_packed_async(pobj, backend, shots, max_credits))
+
+    async def run_batch_async(self, cobjs, backend=online_sim, shots=1024, max_credits=5, max_experiments=None,
+                              max_shots=None):
+        """Runs many circuits in as few jobs as possible, so that they wait in the backend queue once
+
+        Circuits are packed into jobs of at most max_experiments circuits, shots above max_shots are split
+        over several jobs and their counts summed. The results of each job are split back per circuit.
+        Batch jobs are not journaled.
+
+        Parameters:
+            cobjs (iterable): compiled objects
+            backend (str): backend on which circuits will run
+            shots (int): number of shots of every circuit
+            max_credits (int): maximum credits to use
+            max_experiments (int): maximum circuits per job, default is the backend max_experiments or MAX_EXPERIMENTS
+            max_shots (int): maximum shots per job, default is the backend max_shots or MAX_SHOTS
+
+        Returns:
+            robjs (list): ran objects in the same order of cobjs, see run(); circuits of a job that could not
+                          be run are replaced by the exception that stopped it, e.g. RunError
+        """
+        cobjs = list(cobjs)
+        if not cobjs:
+            return []
+        if self.journal is not None:
+            logger.warning('Batch jobs are not journaled, they run again when the sweep is resumed')
+        if max_experiments is None or max_shots is None:
+            configuration = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.runner.get_backend(backend).configuration)
+            max_experiments = max_experiments or configuration.get('max_experiments', MAX_EXPERIMENTS)
+            max_shots = max_shots or configuration.get('max_shots', MAX_SHOTS)
+        qobjs = self._batch_qobjs(cobjs, backend, shots, max_experiments, max_shots)
+        records = [self._record('run') for _ in qobjs]
+        for qobj, record in zip(qobjs, records):
+            record.count('experiments', len(qobj['circuits']))
+        results = await asyncio.gather(*(self.runner.run(qobj, backend, record=record)
+                                         for qobj, record in zip(qobjs, records)), return_exceptions=True)
+        metrics = [self.metrics.emit(record) if record.enabled else None for record in records]
+        logger.info('%d circuits ran on %s backend in %d jobs', len(cobjs), backend, len(qobjs))
+        # Demultiplexes the results, summing the counts of split shots
+        parts = dict()
+        for qobj, result, job_metrics in zip(qobjs, results, metrics):
+            for circuit in qobj['circuits']:
+                index = int(circuit['name'][len('experiment'):])
+                parts.setdefault(index, []).append((circuit['name'], result, job_metrics))
+        robjs = []
+        for index, cobj in enumerate(cobjs):
+            failed = [result for _, result, _ in parts[index] if isinstance(result, BaseException)]
+            if failed:
+                robjs.append(failed[0])
+                continue
+            counts = dict()
+            for name, result, _ in parts[index]:
+                for outcome, count in result.get_counts(name).items():
+                    counts[outcome] = counts.get(outcome, 0) + count
+            name, result, job_metrics = parts[index][0]
+            robj = self._make_robj(cobj, backend, result, name=name, counts=counts)
+            if job_metrics is not None:
+                robj['metrics'] = job_metrics
+            robjs.append(robj)
+        return robjs
+
+    def run_batch(self, cobjs, backend=online_sim, shots=1024, max_credits=5, max_experiments=None, max_shots=None):
+        """Runs many circuits in as few jobs as possible, see run_batch_async()
+
+        Returns:
+            robjs (list): ran objects in the same order of cobjs, see run_batch_async()
+        """
+        return _run_sync(self.run_batch_async(cobjs, backend, shots, max_credits, max_experiments, max_shots))
+
+    def run(self, cobj, backend=online_sim, shots=1024, max_credits=5, seed=None, execution=None):
+        """Runs circuit on backend
+
+        It can be called while an event loop is running, e.g. in Jupyter, the circuit then runs on a worker thread;
+        coroutines should await run_async() instead.
+
+        Parameters:
+            cobj (dict): compiled object
+            backend (str): backend on which circuit will run
+            shots (int): number of shots
+            max_credits (int): maximum credits to use
+            seed (int): seed of simulator backends, seeded simulator runs are cached, see run_async()
+            execution: value telling apart repeated runs of the same circuit in the journal, see run_async()
+
+        Returns:
+            robj (dict): ran object, dictionary containing results of ran circuit, for example:
+
+                                robj = {
+                                circuit: ran circuit as QuantumCircuit,
+                                ran_qasm: ran circuit as Qasm,
+                                n_qubits: number of qubits used in circuit,
+                                connected: list of connected qubits, in th order they were connected,
+                                oracle: specified oracle,
+                                algo: specified algorithm,
+                                backend: backend on which circuit was ran
+                                result: result of running the circuit
+                                counts: result counts, sorted in descending order,
+                                metrics: timers and counters, only if the Compiler has metrics}
+
+        Raises:
+            RunError: if the job failed runner.max_attempts times
+        """
+        return _run_sync(self.run_async(cobj, backend, shots, max_credits, seed, execution))
@@ -16,5 +16,5 @@ APItoken = None
 
 URL = 'https://quantumexperience.ng.bluemix.net/api'
 
-if 'APItoken' not in locals():
-    raise Exception("Please set up your api access token. See config.py.")
+# Directory for cached spanning trees, None uses the user cache directory
+CACHE_DIR = None
@@ -0,0 +1,161 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import tempfile
+import threading
+from os import path
+from timeit import default_timer
+import logging
+
+from compiler import configure_logging
+from compiler.cache import bundled_trees, default_cache_dir
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Seconds a coupling map is served from memory before its snapshot is read again
+DEFAULT_TTL = 3600
+
+
+class CouplingProvider(object):
+    """Coupling maps of backends read from local snapshots
+
+    Coupling maps are looked up in memory, then in JSON snapshots in directory, then in the trees
+    bundled in compiler/trees. The network is only used by refresh(), or on first use of a backend
+    without any snapshot unless offline is set, and fetched maps are saved as snapshots.
+
+    Parameters:
+        directory (str): snapshot directory, default is couplings in the spanning tree cache directory
+        ttl (float): seconds a coupling map is served from memory before its snapshot is read again
+        offline (bool): set True to never use the network, backends without snapshots raise LookupError
+        remote (callable): backend name -> backend_info, default is backends.fetch_coupling
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, offline=False, remote=None):
+        self.directory = directory or path.join(default_cache_dir(), 'couplings')
+        self.ttl = ttl
+        self.offline = offline
+        self._remote = remote
+        self._memory = dict()
+        self._lock = threading.Lock()
+
+    def _path(self, backend):
+        return path.join(self.directory, backend + '.json')
+
+    def _read_snapshot(self, backend):
+        # Coupling map of the snapshot of backend, or of its bundled tree, None if there is none
+        try:
+            with open(self._path(backend)) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            return {int(node): targets for node, targets in snapshot['coupling_map']}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError):
+            logger.warning('Unreadable coupling map snapshot %s', self._path(backend))
+        tree = bundled_trees().get(backend)
+        return tree['coupling_map'] if tree is not None else None
+
+    def _write_snapshot(self, backend, coupling_map):
+        # Writes the snapshot atomically, readers see either the old or the new one
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as snapshot_file:
+                json.dump({'backend_name': backend,
+                           'coupling_map': [[node, list(targets)] for node, targets in coupling_map.items()]},
+                          snapshot_file)
+            os.replace(temporary, self._path(backend))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def get(self, backend):
+        """Returns the coupling map of a backend without using the network if a snapshot exists
+
+        Parameters:
+            backend (str): backend name
+
+        Returns:
+            backend_info (dict): backend name and coupling map
+        """
+        with self._lock:
+            entry = self._memory.get(backend)
+            if entry is not None and default_timer() - entry[0] < self.ttl:
+                return {'backend_name': backend, 'coupling_map': entry[1]}
+            coupling_map = self._read_snapshot(backend)
+            if coupling_map is not None:
+                self._memory[backend] = (default_timer(), coupling_map)
+                return {'backend_name': backend, 'coupling_map': coupling_map}
+        if self.offline:
+            raise LookupError('No coupling map snapshot of backend %s' % backend)
+        logger.warning('No coupling map snapshot of backend %s, fetching it', backend)
+        return self.refresh(backend)
+
+    def refresh(self, backend):
+        """Fetches the coupling map of a backend online and saves it as a snapshot
+
+        Parameters:
+            backend (str): backend name
+
+        Returns:
+            backend_info (dict): backend name and coupling map
+        """
+        if self._remote is None:
+            from compiler.backends import fetch_coupling
+            self._remote = fetch_coupling
+        coupling_map = self._remote(backend)['coupling_map']
+        try:
+            self._write_snapshot(backend, coupling_map)
+        except OSError:
+            logger.warning('Coupling map snapshot directory %s is not writable', self.directory, exc_info=True)
+        with self._lock:
+            self._memory[backend] = (default_timer(), coupling_map)
+        logger.info('Refreshed coupling map of backend %s', backend)
+        return {'backend_name': backend, 'coupling_map': coupling_map}
+
+    def put(self, backend, coupling_map):
+        """Saves a coupling map as the snapshot of a backend, e.g. to prepare air-gapped workers
+
+        Parameters:
+            backend (str): backend name
+            coupling_map (dict): backend coupling map
+        """
+        self._write_snapshot(backend, coupling_map)
+        with self._lock:
+            self._memory[backend] = (default_timer(), coupling_map)
+
+    def clear(self):
+        """Forgets coupling maps held in memory, the next get() reads snapshots again"""
+        with self._lock:
+            self._memory.clear()
+
+
+# Provider of backends.get_coupling, see default_provider()
+_default_provider = None
+_default_lock = threading.Lock()
+
+
+def default_provider():
+    """Returns the provider used by backends.get_coupling, created on first use
+
+    Returns:
+        provider (CouplingProvider): provider with default snapshot directory and TTL
+    """
+    global _default_provider
+    with _default_lock:
+        if _default_provider is None:
+            _default_provider = CouplingProvider()
+        return _default_provider
@@ -0,0 +1,138 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import enum
+import uuid
+
+
+class JobStatus(enum.Enum):
+    """Statuses of a FakeJob, named as the qiskit JobStatus members JobRunner compares them by"""
+    QUEUED = 'job is queued'
+    RUNNING = 'job is actively running'
+    DONE = 'job has successfully run'
+    ERROR = 'job incurred error'
+    CANCELLED = 'job has been cancelled'
+
+
+def _register_size(qasm):
+    # Size of the classical register declared in a Qasm circuit
+    return int(re.search(r'creg\s+\w+\[(\d+)\]', qasm).group(1))
+
+
+def all_zeros(circuit, shots):
+    """Default outcome of fake jobs, every shot measures all zeros
+
+    Parameters:
+        circuit (dict): qobj circuit
+        shots (int): number of shots
+
+    Returns:
+        counts (dict): bitstring: count
+    """
+    return {'0' * _register_size(circuit['compiled_circuit_qasm']): shots}
+
+
+class FakeResult(object):
+    """Result of a FakeJob, exposing the parts of the qiskit Result used by Compiler"""
+
+    def __init__(self, qobj, counts):
+        self._circuits = {circuit['name']: circuit for circuit in qobj['circuits']}
+        self._counts = counts
+
+    def get_names(self):
+        return list(self._circuits)
+
+    def get_counts(self, name=None):
+        if name is None:
+            name = self.get_names()[0]
+        return self._counts[name]
+
+    def get_ran_qasm(self, name):
+        return self._circuits[name]['compiled_circuit_qasm']
+
+
+class FakeJob(object):
+    """Job of a FakeBackend, moves through QUEUED and RUNNING once per status poll"""
+
+    def __init__(self, backend, qobj, polls, fail):
+        self.id = str(uuid.uuid4())
+        self.exception = None
+        self._backend = backend
+        self._qobj = qobj
+        self._polls = polls
+        self._fail = fail
+
+    @property
+    def status(self):
+        if self._polls > 0:
+            self._polls -= 1
+            status = JobStatus.QUEUED if self._polls > 1 else JobStatus.RUNNING
+        elif self._fail:
+            self.exception = RuntimeError('fake job failure')
+            status = JobStatus.ERROR
+        else:
+            status = JobStatus.DONE
+        return {'status': status, 'status_msg': status.value}
+
+    @property
+    def done(self):
+        return self._polls <= 0 and not self._fail
+
+    def cancel(self):
+        self._fail = True
+        self._polls = 0
+
+    def result(self):
+        shots = self._qobj['config']['shots']
+        counts = {circuit['name']: self._backend.counts(circuit, shots) for circuit in self._qobj['circuits']}
+        return FakeResult(self._qobj, counts)
+
+
+class FakeBackend(object):
+    """Local stand-in for an IBMQ backend, to exercise job handling offline
+
+    Parameters:
+        name (str): backend name
+        polls (int): status polls a job takes before completing
+        failures (int): number of jobs, among the first submitted, that end with an error
+        counts (callable): counts(circuit, shots) returns the counts of a qobj circuit, all_zeros by default
+    """
+
+    def __init__(self, name='fake_qasm_simulator', polls=2, failures=0, counts=all_zeros):
+        self.name = name
+        self.polls = polls
+        self.failures = failures
+        self.counts = counts
+        self.available = True
+        self.jobs = []
+
+    @property
+    def status(self):
+        return {'available': self.available, 'busy': False, 'pending_jobs': 0, 'name': self.name}
+
+    @property
+    def configuration(self):
+        return {'name': self.name, 'local': True, 'simulator': True}
+
+    def run(self, qobj):
+        job = FakeJob(self, qobj, self.polls, len(self.jobs) < self.failures)
+        self.jobs.append(job)
+        return job
+
+    def retrieve_job(self, job_id):
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        raise LookupError('Job %s not found' % job_id)
@@ -0,0 +1,156 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import hashlib
+from os import path
+import logging
+
+from compiler import configure_logging
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Statuses after which a job is not reattached, its circuit is submitted again
+FAILED_STATUSES = ('ERROR', 'CANCELLED', 'FAILED')
+
+# Ran object entries that are not stored, they are rebuilt or unavailable when resuming
+_UNSTORED = ('circuit', 'result')
+
+
+def circuit_key(cobj, backend, shots, execution=None):
+    """Identifies a run of a circuit, the same circuit on the same backend with the same shots and execution
+
+    Parameters:
+        cobj (dict): compiled object
+        backend (str): backend name
+        shots (int): number of shots
+        execution: JSON serializable value telling apart runs of the same circuit, e.g. a sweep index
+                   or a repetition counter
+
+    Returns:
+        key (str): hex digest
+    """
+    content = json.dumps({'qasm': cobj['qasm'], 'backend': backend, 'shots': shots, 'execution': execution},
+                         sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class Journal(object):
+    """Append-only JSON lines file of the jobs of a sweep, to resume it after a crash
+
+    Every job submission, status transition and completed ran object is appended as one line,
+    with a single write so that concurrent writers do not interleave lines. A line cut by a crash
+    is ignored when the journal is read again.
+
+    Parameters:
+        filename (str): journal file, created on first write
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._jobs = dict()
+        self._completed = dict()
+        if path.isfile(filename):
+            self._load()
+
+    def _load(self):
+        with open(self.filename, encoding='utf-8') as journal_file:
+            for number, line in enumerate(journal_file, 1):
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    logger.warning('Skipping corrupted line %d of journal %s', number, self.filename)
+        logger.info('Journal %s has %d completed and %d pending circuits', self.filename, len(self._completed),
+                    len(self.pending()))
+
+    def _apply(self, entry):
+        # Updates the state of a circuit with a journal entry
+        if entry['status'] == 'COMPLETED':
+            self._completed[entry['key']] = entry['robj']
+        else:
+            self._jobs[entry['key']] = (entry['job_id'], entry['status'])
+
+    def _append(self, entry):
+        entry['time'] = time.time()
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        os.makedirs(path.dirname(path.abspath(self.filename)), exist_ok=True)
+        descriptor = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(descriptor, line)
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+        self._apply(entry)
+
+    def listener(self, key):
+        """Returns a JobRunner listener recording the jobs of a circuit
+
+        Parameters:
+            key (str): circuit key, see circuit_key()
+
+        Returns:
+            listener (callable): listener(job_id, status), see JobRunner.run()
+        """
+        return lambda job_id, status: self._append({'key': key, 'job_id': job_id, 'status': status})
+
+    def failed(self, key):
+        """Records that every attempt to run a circuit failed, so its last job is not reattached"""
+        job_id = self._jobs.get(key, (None, None))[0]
+        self._append({'key': key, 'job_id': job_id, 'status': 'FAILED'})
+
+    def complete(self, key, robj):
+        """Records the ran object of a circuit, entries that are not JSON serializable are not stored
+
+        Parameters:
+            key (str): circuit key, see circuit_key()
+            robj (dict): ran object
+        """
+        stored = dict()
+        for name, value in robj.items():
+            if name in _UNSTORED:
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                logger.warning('Entry %s of circuit %s is not JSON serializable, it is not stored', name, key)
+                continue
+            stored[name] = value
+        self._append({'key': key, 'job_id': self._jobs.get(key, (None, None))[0], 'status': 'COMPLETED',
+                      'robj': stored})
+
+    def completed(self, key):
+        """Returns the stored ran object of a completed circuit
+
+        Returns:
+            robj (dict): ran object without circuit and result, None if the circuit did not complete
+        """
+        return self._completed.get(key)
+
+    def job_id(self, key):
+        """Returns the job to reattach to, submitted but neither completed nor failed
+
+        Returns:
+            job_id (str): job identifier, None if the circuit must be submitted
+        """
+        if key in self._completed or key not in self._jobs:
+            return None
+        job_id, status = self._jobs[key]
+        return None if status in FAILED_STATUSES else job_id
+
+    def pending(self):
+        """Returns the keys of circuits submitted but not completed, e.g. jobs in flight when a process died"""
+        return [key for key in self._jobs if self.job_id(key) is not None]
@@ -0,0 +1,166 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import cProfile
+import pstats
+from contextlib import contextmanager, nullcontext
+from timeit import default_timer
+import logging
+
+from compiler import configure_logging
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+
+class Record(object):
+    """Timers and counters of a single compile or run
+
+    Timers accumulate seconds per stage, counters accumulate any number, e.g. gates removed or retries.
+
+    Parameters:
+        kind (str): what is being measured, e.g. 'compile' or 'run'
+    """
+
+    enabled = True
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.timers = dict()
+        self.counters = dict()
+        self.profile = None
+        self._profiler = None
+
+    @contextmanager
+    def timer(self, stage):
+        """Context manager adding the seconds spent in its block to the timer of stage"""
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add_time(stage, default_timer() - start)
+
+    def add_time(self, stage, seconds):
+        self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def update(self, counters):
+        for name, value in counters.items():
+            self.count(name, value)
+
+    def start_profile(self):
+        # Profiles the current thread until stop_profile(), only one profiler can be active at a time
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            logger.warning('Another profiler is active, %s not profiled', self.kind)
+            return
+        self._profiler = profiler
+
+    def stop_profile(self, limit):
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        text = io.StringIO()
+        pstats.Stats(self._profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+        self.profile = text.getvalue()
+        self._profiler = None
+
+    def as_dict(self):
+        record = {'kind': self.kind, 'timers': dict(self.timers), 'counters': dict(self.counters)}
+        if self.profile is not None:
+            record['profile'] = self.profile
+        return record
+
+
+class _NullRecord(Record):
+    # Record of disabled metrics, every method does nothing
+
+    enabled = False
+
+    def __init__(self):
+        super(_NullRecord, self).__init__(None)
+
+    def timer(self, stage):
+        return nullcontext()
+
+    def add_time(self, stage, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def update(self, counters):
+        pass
+
+
+NULL_RECORD = _NullRecord()
+
+
+def log_sink(record):
+    """Metrics sink logging every record at INFO level on the compiler.metrics logger"""
+    logger.info('%s timers: %s counters: %s', record['kind'], record['timers'], record['counters'])
+    if 'profile' in record:
+        logger.info('%s profile:\n%s', record['kind'], record['profile'])
+
+
+class Metrics(object):
+    """Collects timers and counters of Compiler and JobRunner
+
+    Every record is stored in the cobj or robj it describes, under 'metrics', and passed to the sink.
+    Without a Metrics object nothing is measured: code paths use NULL_RECORD, whose methods do nothing.
+
+    Parameters:
+        sink (callable): called with every finished record as a dictionary, e.g. log_sink or list.append
+        profile (tuple): kinds of records captured with cProfile, e.g. ('compile',)
+        profile_limit (int): number of functions kept in profile reports, sorted by cumulative time
+    """
+
+    def __init__(self, sink=None, profile=(), profile_limit=30):
+        self.sink = sink
+        self.profile = tuple(profile)
+        self.profile_limit = profile_limit
+
+    def record(self, kind):
+        """Starts a record, profiling it if kind is in profile
+
+        Parameters:
+            kind (str): e.g. 'tree', 'compile' or 'run'
+
+        Returns:
+            record (Record): record to fill, then to pass to emit()
+        """
+        record = Record(kind)
+        if kind in self.profile:
+            record.start_profile()
+        return record
+
+    def emit(self, record):
+        """Finishes a record and passes it to the sink
+
+        Parameters:
+            record (Record): record returned by record()
+
+        Returns:
+            record (dict): kind, timers, counters and, if profiled, profile report
+        """
+        record.stop_profile(self.profile_limit)
+        data = record.as_dict()
+        if self.sink is not None:
+            self.sink(data)
+        return data
@@ -0,0 +1,174 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cmath
+import math
+from timeit import default_timer
+import logging
+from sympy import pi
+
+from compiler import configure_logging
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Tolerance used when comparing merged rotation angles
+EPSILON = 1e-9
+
+
+def _wires(gate):
+    # Wires a gate acts on, the classical bit of a measure is not a qubit
+    if gate[0] == 'measure':
+        return gate[2][:1]
+    return gate[2]
+
+
+def _is_h(gate):
+    return gate[0] == 'u2' and gate[1][0] == 0 and gate[1][1] == pi
+
+
+def _u3_matrix(theta, phi, lam):
+    # Matrix of u3(theta, phi, lam)
+    cos, sin = math.cos(theta / 2), math.sin(theta / 2)
+    return [[cos, -cmath.exp(1j * lam) * sin],
+            [cmath.exp(1j * phi) * sin, cmath.exp(1j * (phi + lam)) * cos]]
+
+
+def _angles(gate):
+    # u3 angles of a u2 or u3 gate
+    if gate[0] == 'u2':
+        return math.pi / 2, float(gate[1][0]), float(gate[1][1])
+    return tuple(float(param) for param in gate[1])
+
+
+def compose_u3(first, second):
+    """Composes two single qubit rotations into one u3, up to a global phase
+
+    Parameters:
+        first (tuple): (theta, phi, lambda) of the gate applied first
+        second (tuple): (theta, phi, lambda) of the gate applied second
+
+    Returns:
+        angles (tuple): (theta, phi, lambda) of the equivalent u3, None if it is the identity
+    """
+    a = _u3_matrix(*first)
+    b = _u3_matrix(*second)
+    m = [[b[0][0] * a[0][0] + b[0][1] * a[1][0], b[0][0] * a[0][1] + b[0][1] * a[1][1]],
+         [b[1][0] * a[0][0] + b[1][1] * a[1][0], b[1][0] * a[0][1] + b[1][1] * a[1][1]]]
+    theta = 2 * math.atan2(abs(m[1][0]), abs(m[0][0]))
+    if abs(m[1][0]) < EPSILON:
+        phi, lam = 0.0, cmath.phase(m[1][1]) - cmath.phase(m[0][0])
+    elif abs(m[0][0]) < EPSILON:
+        phase = cmath.phase(-m[0][1])
+        phi, lam = cmath.phase(m[1][0]) - phase, 0.0
+    else:
+        phase = cmath.phase(m[0][0])
+        phi, lam = cmath.phase(m[1][0]) - phase, cmath.phase(-m[0][1]) - phase
+    phi = math.remainder(phi, 2 * math.pi)
+    lam = math.remainder(lam, 2 * math.pi)
+    if abs(theta) < EPSILON and abs(math.remainder(phi + lam, 2 * math.pi)) < EPSILON:
+        return None
+    return tuple(0.0 if abs(angle) < EPSILON else angle for angle in (theta, phi, lam))
+
+
+def cancel_h(gates):
+    """Removes pairs of consecutive Hadamard gates, u2(0, pi), acting on the same qubit
+
+    Parameters:
+        gates (list): (name, params, qubits, ...) tuples in circuit order
+
+    Returns:
+        gates (list): optimized gates
+        removed (int): number of removed gates
+    """
+    gates = list(gates)
+    last_h = dict()
+    removed = 0
+    for i, gate in enumerate(gates):
+        wires = _wires(gate)
+        if _is_h(gate):
+            last = last_h.pop(wires[0], None)
+            if last is not None:
+                logger.debug('Two consecutive Hadamard gates on qubit %s removed', wires[0])
+                gates[last] = gates[i] = None
+                removed += 2
+            else:
+                last_h[wires[0]] = i
+        else:
+            for wire in wires:
+                last_h.pop(wire, None)
+    return [gate for gate in gates if gate is not None], removed
+
+
+def merge_u(gates):
+    """Merges consecutive u2 and u3 gates acting on the same qubit into a single u3
+
+    Merged gates equal to the identity are removed altogether.
+
+    Parameters:
+        gates (list): (name, params, qubits, ...) tuples in circuit order
+
+    Returns:
+        gates (list): optimized gates, merged gates are (name, params, qubits, None) tuples
+        removed (int): number of removed gates
+    """
+    gates = list(gates)
+    last_u = dict()
+    removed = 0
+    for i, gate in enumerate(gates):
+        wires = _wires(gate)
+        if gate[0] == 'u2' or gate[0] == 'u3':
+            last = last_u.pop(wires[0], None)
+            if last is None:
+                last_u[wires[0]] = i
+                continue
+            angles = compose_u3(_angles(gates[last]), _angles(gate))
+            gates[last] = None
+            if angles is None:
+                gates[i] = None
+                removed += 2
+            else:
+                gates[i] = ('u3', angles, gate[2], None)
+                last_u[wires[0]] = i
+                removed += 1
+        else:
+            for wire in wires:
+                last_u.pop(wire, None)
+    return [gate for gate in gates if gate is not None], removed
+
+
+PASSES = [('cancel_h', cancel_h), ('merge_u', merge_u)]
+
+
+def run_passes(gates, passes=None):
+    """Runs optimization passes over a gate list
+
+    Parameters:
+        gates (list): (name, params, qubits, ...) tuples in circuit order
+        passes (list): (name, function) pairs, PASSES if None
+
+    Returns:
+        gates (list): optimized gates
+        stats (list): one dictionary per pass, with pass name, removed gates and elapsed seconds
+    """
+    if passes is None:
+        passes = PASSES
+    stats = []
+    for name, optimization in passes:
+        start = default_timer()
+        gates, removed = optimization(gates)
+        elapsed = default_timer() - start
+        logger.info('Pass %s removed %d gates in %.6f seconds', name, removed, elapsed)
+        stats.append({'pass': name, 'removed': removed, 'seconds': elapsed})
+    return gates, stats
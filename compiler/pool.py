@@ -0,0 +1,163 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import logging
+
+from compiler import configure_logging
+from compiler.backends import get_coupling
+from compiler.cache import coupling_hash
+from compiler.compiler import Compiler
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+
+class CompilerPool(object):
+    """Compilers of many backends, built on first use and shared by threads
+
+    Backends are registered with their coupling map, or looked up through provider when first used.
+    Topology data (ranks, inverse map and spanning tree) is kept per coupling map hash, so backends
+    with the same coupling map, e.g. a device and a simulator mimicking it, analyse it once.
+    Once a backend is built, routing to it is a dictionary lookup.
+
+    Parameters:
+        provider (callable): backend name -> backend_info with 'coupling_map', for unregistered backends
+        cache_dir (str): spanning tree cache directory, see cache.TreeCache
+        metrics (Metrics): timers and counters of all Compilers, see metrics.Metrics
+        tree_mode (str): tree mode of all Compilers, see compiler.TREE_MODES
+    """
+
+    def __init__(self, provider=get_coupling, cache_dir=None, metrics=None, tree_mode='bfs'):
+        self._provider = provider
+        self._cache_dir = cache_dir
+        self._metrics = metrics
+        self._tree_mode = tree_mode
+        self._infos = dict()
+        self._compilers = dict()
+        self._topology = dict()
+        self._lock = threading.Lock()
+        self._backend_locks = dict()
+
+    def register(self, backend, coupling_map=None, calibration=None):
+        """Registers a backend, its Compiler is built on first use
+
+        Registering a new coupling map of a backend already built updates its Compiler incrementally,
+        see Compiler.update_coupling, and a new calibration only selects its qubits again.
+
+        Parameters:
+            backend (str): backend name
+            coupling_map (dict): backend coupling map, None asks the provider on first use
+                                 or keeps the coupling map of a backend already built
+            calibration (str): calibration JSON file of the backend, see Compiler.set_calibration
+
+        Returns:
+            update (dict): see Compiler.update_coupling, None if the Compiler was not built yet
+                           or coupling_map is None
+        """
+        with self._lock:
+            self._infos[backend] = {'coupling_map': coupling_map, 'calibration': calibration}
+            compiler = self._compilers.get(backend)
+            if compiler is None:
+                return None
+        update = None
+        if coupling_map is not None:
+            update = compiler.update_coupling(coupling_map)
+        if calibration != compiler.calibration:
+            compiler.set_calibration(calibration)
+        return update
+
+    @property
+    def backends(self):
+        """Names of registered and built backends"""
+        with self._lock:
+            return sorted(set(self._infos) | set(self._compilers))
+
+    def __contains__(self, backend):
+        return backend in self._compilers or backend in self._infos
+
+    def get(self, backend):
+        """Returns the Compiler of a backend, building it on first use
+
+        Parameters:
+            backend (str): backend name
+
+        Returns:
+            compiler (Compiler): compiler whose coupling map is the one of backend
+        """
+        compiler = self._compilers.get(backend)
+        if compiler is not None:
+            return compiler
+        with self._lock:
+            backend_lock = self._backend_locks.setdefault(backend, threading.Lock())
+        # Only one thread builds a backend, other backends are built concurrently
+        with backend_lock:
+            compiler = self._compilers.get(backend)
+            if compiler is None:
+                compiler = self._build(backend)
+                self._compilers[backend] = compiler
+        return compiler
+
+    def _build(self, backend):
+        # Builds the Compiler of backend reusing topology data of the same coupling map
+        info = self._infos.get(backend, {})
+        coupling_map = info.get('coupling_map')
+        if coupling_map is None:
+            coupling_map = self._provider(backend)['coupling_map']
+        key = coupling_hash(coupling_map, tree_mode=self._tree_mode)
+        with self._lock:
+            tree_data = self._topology.get(key)
+        compiler = Compiler({'backend_name': backend, 'coupling_map': coupling_map}, cache_dir=self._cache_dir,
+                            tree_data=tree_data, metrics=self._metrics, tree_mode=self._tree_mode,
+                            calibration=info.get('calibration'))
+        if tree_data is None:
+            with self._lock:
+                self._topology.setdefault(key, compiler.tree_data)
+        logger.info('Built compiler for %s backend with %d qubits', backend, len(coupling_map))
+        return compiler
+
+    def warm(self, backends=None):
+        """Builds the Compilers of backends, so that later requests never wait for topology analysis
+
+        Parameters:
+            backends (iterable): backend names, default is every registered backend
+        """
+        for backend in (self.backends if backends is None else backends):
+            self.get(backend)
+
+    def template(self, backend, n_qubits, **options):
+        """Routes Compiler.template() to the Compiler of backend
+
+        Parameters:
+            backend (str): backend name
+            n_qubits (int): number of qubits used in circuit
+            options: algo, oracle and custom_mode, see Compiler.template()
+
+        Returns:
+            cobj (dict): see Compiler.template()
+        """
+        return self.get(backend).template(n_qubits, backend=backend, **options)
+
+    def compile(self, backend, n_qubits, **options):
+        """Routes Compiler.compile() to the Compiler of backend
+
+        Parameters:
+            backend (str): backend name
+            n_qubits (int): number of qubits used in circuit
+            options: algo, oracle, custom_mode and compiling, see Compiler.compile()
+
+        Returns:
+            cobj (dict): see Compiler.compile()
+        """
+        return self.get(backend).compile(n_qubits, backend=backend, **options)
@@ -0,0 +1,281 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import random
+import functools
+import logging
+
+from compiler import configure_logging
+from compiler.metrics import NULL_RECORD
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Names of the qiskit JobStatus members a job ends with, compared by name so that qiskit is not imported
+FINAL_STATUSES = ('DONE', 'ERROR', 'CANCELLED')
+
+
+class RunError(Exception):
+    """Raised when a job keeps failing after all its attempts"""
+    pass
+
+
+class JobRunner(object):
+    """Runs qobjs on backends asynchronously
+
+    A single scheduler task polls every job in flight, each one with its own exponential backoff
+    and jitter, so one process can drive hundreds of experiments. Blocking backend calls run in
+    the default executor. Failed jobs are resubmitted iteratively, up to max_attempts times.
+
+    Parameters:
+        get_backend (callable): returns the backend object given its name
+        get_credits (callable): returns the remaining credits, None to skip the credits check
+        retry_on (tuple): exceptions that cause a job to be retried instead of failing
+        max_attempts (int): maximum number of submissions of the same job
+        poll_interval (float): seconds between the first status polls of a job
+        max_poll_interval (float): maximum seconds between status polls
+        backoff (float): factor applied to every wait after an unchanged poll or a failed attempt
+        jitter (float): relative random variation applied to every wait
+        status_interval (float): seconds between checks of an unavailable backend
+        credits_interval (float): seconds between checks of insufficient credits
+        retry_delay (float): seconds before resubmitting a failed job, grows with backoff
+        max_retry_delay (float): maximum seconds before resubmitting a failed job
+    """
+
+    def __init__(self, get_backend, get_credits=None, retry_on=(), max_attempts=5, poll_interval=10,
+                 max_poll_interval=300, backoff=2, jitter=0.1, status_interval=300, credits_interval=900,
+                 retry_delay=60, max_retry_delay=900):
+        self.get_backend = get_backend
+        self.get_credits = get_credits
+        self.retry_on = tuple(retry_on)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.status_interval = status_interval
+        self.credits_interval = credits_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._watched = dict()
+        self._wakeup = None
+        self._scheduler = None
+
+    def _jittered(self, delay):
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    async def _call(function, *args):
+        # Runs a blocking call without blocking the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _wait_backend(self, backend, record=NULL_RECORD):
+        # Waits until the backend is available
+        while True:
+            try:
+                status = await self._call(lambda: self.get_backend(backend).status)
+                if status.get('available') is not False:
+                    return
+                logger.info('Backend %s not available, waiting', backend)
+            except self.retry_on + (ValueError, KeyError):
+                logger.error('Error getting backend status')
+            await self._sleep(self._jittered(self.status_interval), record)
+
+    async def _wait_credits(self, backend, shots, record=NULL_RECORD):
+        # Waits until enough credits are left to run the job, local backends need none
+        if self.get_credits is None:
+            return
+        configuration = await self._call(lambda: self.get_backend(backend).configuration)
+        if configuration.get('local', False):
+            return
+        min_credits = 5 if shots > 1024 else 3
+        while True:
+            try:
+                if await self._call(self.get_credits) >= min_credits:
+                    return
+                logger.warning('Less than %d credits remaining, waiting for replenishment', min_credits)
+            except self.retry_on:
+                logger.error('Error getting credits', exc_info=True)
+            await self._sleep(self._jittered(self.credits_interval), record)
+
+    @staticmethod
+    async def _sleep(delay, record):
+        record.count('sleep_seconds', delay)
+        await asyncio.sleep(delay)
+
+    async def _watch(self, job, record=NULL_RECORD, notify=None):
+        # Hands the job to the scheduler, returns its final status,
+        # notify is called with every new status
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._watched[job] = {'due': loop.time(), 'since': loop.time(), 'record': record, 'notify': notify,
+                              'interval': self.poll_interval, 'status': None, 'future': future}
+        if self._scheduler is None or self._scheduler.done():
+            self._wakeup = asyncio.Event()
+            self._scheduler = loop.create_task(self._schedule())
+        else:
+            self._wakeup.set()
+        try:
+            return await future
+        finally:
+            self._watched.pop(job, None)
+
+    async def _schedule(self):
+        # Polls every watched job when it is due, until no job is left
+        loop = asyncio.get_running_loop()
+        while self._watched:
+            now = loop.time()
+            due = [job for job, watch in self._watched.items() if watch['due'] <= now]
+            if not due:
+                self._wakeup.clear()
+                timeout = min(watch['due'] for watch in self._watched.values()) - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            statuses = await asyncio.gather(*(self._call(lambda j=job: j.status['status']) for job in due),
+                                            return_exceptions=True)
+            now = loop.time()
+            for job, status in zip(due, statuses):
+                watch = self._watched.get(job)
+                if watch is None or watch['future'].done():
+                    continue
+                record = watch['record']
+                record.count('polls')
+                if isinstance(status, Exception):
+                    logger.warning('Error polling job status: %s', status)
+                elif status.name in FINAL_STATUSES:
+                    logger.info('Job finished with status: %s', status)
+                    self._status_time(watch, now)
+                    self._notify(watch['notify'], status.name)
+                    watch['future'].set_result(status)
+                    continue
+                elif status != watch['status']:
+                    logger.info('Job status: %s', status)
+                    self._status_time(watch, now)
+                    self._notify(watch['notify'], status.name)
+                    watch['status'] = status
+                    watch['interval'] = self.poll_interval
+                    watch['due'] = now + self._jittered(watch['interval'])
+                    continue
+                watch['interval'] = min(self.max_poll_interval, watch['interval'] * self.backoff)
+                watch['due'] = now + self._jittered(watch['interval'])
+
+    @staticmethod
+    def _notify(notify, status):
+        # Calls notify with a status name, its errors never stop the job
+        if notify is None:
+            return
+        try:
+            notify(status)
+        except Exception:
+            logger.error('Error notifying job status %s', status, exc_info=True)
+
+    async def _reattach(self, backend, job_id):
+        # Retrieves a job submitted before, None if the backend does not know it
+        try:
+            return await self._call(self.get_backend(backend).retrieve_job, job_id)
+        except self.retry_on + (AttributeError, LookupError, ValueError):
+            logger.warning('Job %s cannot be retrieved from %s backend, resubmitting it', job_id, backend)
+            return None
+
+    @staticmethod
+    def _status_time(watch, now):
+        # Records the seconds the job spent in its last status, e.g. queued or running
+        if watch['record'].enabled:
+            status = 'submitted' if watch['status'] is None else watch['status'].name.lower()
+            watch['record'].add_time(status, now - watch['since'])
+        watch['since'] = now
+
+    async def run(self, qobj, backend, process=None, record=NULL_RECORD, job_id=None, listener=None):
+        """Runs a qobj, resubmitting it when the job fails
+
+        Parameters:
+            qobj (dict): qobj to run, its config must already hold backend_name and shots
+            backend (str): backend name
+            process (callable): applied to the result in the executor, exceptions in retry_on cause a retry
+            record (metrics.Record): filled with the seconds spent waiting, in every job status and
+                                     processing the result, and with attempts, polls and sleep seconds
+            job_id (str): job submitted before, e.g. by a crashed process, watched instead of submitting qobj
+            listener (callable): listener(job_id, status) is called with status 'SUBMITTED' when a job is
+                                 submitted or reattached, then with the name of every new status
+
+        Returns:
+            result: job result, or what process returned
+
+        Raises:
+            RunError: if every attempt failed
+        """
+        attempt = 0
+        job = None
+        if job_id is not None:
+            job = await self._reattach(backend, job_id)
+            if job is not None:
+                record.count('reattached')
+                logger.info('Reattached to job %s on %s backend', job_id, backend)
+        while True:
+            attempt += 1
+            record.count('attempts')
+            try:
+                if job is None:
+                    with record.timer('wait_backend'):
+                        await self._wait_backend(backend, record)
+                    with record.timer('wait_credits'):
+                        await self._wait_credits(backend, qobj['config']['shots'], record)
+                    with record.timer('submit'):
+                        job = await self._call(self.get_backend(backend).run, qobj)
+                    logger.info('Circuit running on %s backend', backend)
+                notify = None
+                if listener is not None:
+                    job_id = await self._call(lambda: job.id)
+                    notify = functools.partial(listener, job_id)
+                    self._notify(notify, 'SUBMITTED')
+                status = await self._watch(job, record, notify)
+                if status.name == 'DONE':
+                    with record.timer('result'):
+                        result = await self._call(job.result)
+                    if process is not None:
+                        with record.timer('process'):
+                            result = await self._call(process, result)
+                    return result
+                logger.error('Job encountered an error or was cancelled.')
+                logger.debug(job.exception)
+            except self.retry_on:
+                logger.error('Error executing job', exc_info=True)
+            job = None
+            if attempt >= self.max_attempts:
+                raise RunError('Job failed on %s backend after %d attempts' % (backend, attempt))
+            record.count('retries')
+            delay = self._jittered(min(self.max_retry_delay, self.retry_delay * self.backoff ** (attempt - 1)))
+            await self._sleep(delay, record)
+
+    async def run_many(self, qobjs, backend, process=None):
+        """Runs many qobjs concurrently
+
+        Parameters:
+            qobjs (iterable): qobjs to run, see run()
+            backend (str): backend name
+            process (callable): process(index, result) is applied to each result, see run()
+
+        Returns:
+            results (list): results in the same order of qobjs, the exception that stopped it for a failed qobj,
+                            e.g. RunError if it failed every attempt
+        """
+        tasks = []
+        for index, qobj in enumerate(qobjs):
+            processing = None if process is None else (lambda result, i=index: process(i, result))
+            tasks.append(self.run(qobj, backend, processing))
+        return await asyncio.gather(*tasks, return_exceptions=True)
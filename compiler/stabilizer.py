@@ -0,0 +1,373 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+import math
+import operator
+import re
+import uuid
+import logging
+
+import numpy as np
+
+from compiler import configure_logging
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Tolerance used to recognize Clifford rotation angles
+EPSILON = 1e-6
+
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+              ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+_STATEMENT = re.compile(r'^\s*(\w+)\s*(?:\(([^)]*)\))?\s*([^;]*);')
+
+
+def _angle(expression):
+    # Evaluates a Qasm parameter, only numbers, pi and arithmetic operators are allowed
+    def evaluate(node):
+        if isinstance(node, ast.Expression):
+            return evaluate(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name) and node.id == 'pi':
+            return math.pi
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](evaluate(node.left), evaluate(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](evaluate(node.operand))
+        raise ValueError('Unsupported Qasm parameter %s' % expression)
+    return evaluate(ast.parse(expression.strip(), mode='eval'))
+
+
+def _quarter_turns(angle):
+    # Number of pi/2 rotations equal to angle, raises if angle is not a multiple of pi/2
+    turns = angle / (math.pi / 2)
+    rounded = round(turns)
+    if abs(turns - rounded) > EPSILON:
+        raise ValueError('Angle %f is not a multiple of pi/2, the circuit is not Clifford' % angle)
+    return rounded % 4
+
+
+class Tableau(object):
+    """Stabilizer tableau of an n qubit state, initialized to |0...0>
+
+    Only stabilizer generators are stored: row i is the Pauli product with X part x[i], Z part z[i]
+    and sign (-1)^r[i]. Every gate updates all generators at once.
+    """
+
+    def __init__(self, n_qubits):
+        self.n_qubits = n_qubits
+        self.x = np.zeros((n_qubits, n_qubits), dtype=np.uint8)
+        self.z = np.eye(n_qubits, dtype=np.uint8)
+        self.r = np.zeros(n_qubits, dtype=np.uint8)
+
+    def h(self, qubit):
+        self.r ^= self.x[:, qubit] & self.z[:, qubit]
+        self.x[:, qubit], self.z[:, qubit] = self.z[:, qubit].copy(), self.x[:, qubit].copy()
+
+    def s(self, qubit):
+        self.r ^= self.x[:, qubit] & self.z[:, qubit]
+        self.z[:, qubit] ^= self.x[:, qubit]
+
+    def x_gate(self, qubit):
+        self.r ^= self.z[:, qubit]
+
+    def z_gate(self, qubit):
+        self.r ^= self.x[:, qubit]
+
+    def y_gate(self, qubit):
+        self.r ^= self.x[:, qubit] ^ self.z[:, qubit]
+
+    def cx(self, control, target):
+        self.r ^= self.x[:, control] & self.z[:, target] & (self.x[:, target] ^ self.z[:, control] ^ 1)
+        self.x[:, target] ^= self.x[:, control]
+        self.z[:, control] ^= self.z[:, target]
+
+    def rz(self, turns):
+        # Returns a function applying turns quarter rotations around Z, up to a global phase
+        def apply(qubit):
+            for _ in range(turns):
+                self.s(qubit)
+        return apply
+
+    def u3(self, theta, phi, lam, qubit):
+        """Applies u3(theta, phi, lam) = Rz(phi) Ry(theta) Rz(lam), angles must be multiples of pi/2"""
+        turns = [_quarter_turns(lam), _quarter_turns(theta), _quarter_turns(phi)]
+        self.rz(turns[0])(qubit)
+        for _ in range(turns[1]):
+            # Ry(pi/2) equals H Z up to a global phase
+            self.z_gate(qubit)
+            self.h(qubit)
+        self.rz(turns[2])(qubit)
+
+    def _multiply(self, targets, pivot):
+        # Multiplies the target rows by the pivot row, keeping track of signs
+        x1, z1 = self.x[pivot].astype(np.int8), self.z[pivot].astype(np.int8)
+        x2, z2 = self.x[targets].astype(np.int8), self.z[targets].astype(np.int8)
+        g = np.where(x1 & z1, z2 - x2,
+                     np.where(x1 & (1 - z1), z2 * (2 * x2 - 1),
+                              np.where((1 - x1) & z1, x2 * (1 - 2 * z2), 0)))
+        phase = (2 * self.r[targets].astype(np.int64) + 2 * int(self.r[pivot]) + g.sum(axis=1)) % 4
+        self.r[targets] = (phase // 2).astype(np.uint8)
+        self.x[targets] ^= self.x[pivot]
+        self.z[targets] ^= self.z[pivot]
+
+    def support(self):
+        """Returns the computational basis support of the state, which is an affine subspace
+
+        Returns:
+            offset (numpy.ndarray): one basis state of the support, as a bit vector
+            basis (numpy.ndarray): k x n matrix whose rows span the support directions
+        """
+        rank = 0
+        for column in range(self.n_qubits):
+            rows = np.nonzero(self.x[rank:, column])[0]
+            if rows.size == 0:
+                continue
+            pivot = rank + rows[0]
+            if pivot != rank:
+                for table in (self.x, self.z, self.r):
+                    table[[rank, pivot]] = table[[pivot, rank]]
+            targets = np.nonzero(self.x[:, column])[0]
+            targets = targets[targets != rank]
+            if targets.size:
+                self._multiply(targets, rank)
+            rank += 1
+            if rank == self.n_qubits:
+                break
+        basis = self.x[:rank].copy()
+        # Remaining generators are Z products, each fixes the parity z . x = r of basis states
+        z = self.z[rank:].copy()
+        r = self.r[rank:].copy()
+        offset = np.zeros(self.n_qubits, dtype=np.uint8)
+        pivots = []
+        row = 0
+        for column in range(self.n_qubits):
+            rows = np.nonzero(z[row:, column])[0]
+            if rows.size == 0:
+                continue
+            pivot = row + rows[0]
+            z[[row, pivot]] = z[[pivot, row]]
+            r[[row, pivot]] = r[[pivot, row]]
+            others = np.nonzero(z[:, column])[0]
+            others = others[others != row]
+            z[others] ^= z[row]
+            r[others] ^= r[row]
+            pivots.append(column)
+            row += 1
+            if row == z.shape[0]:
+                break
+        for i, column in enumerate(pivots):
+            offset[column] = r[i]
+        return offset, basis
+
+
+def parse(qasm):
+    """Parses the Qasm of a Clifford circuit made of standard single qubit gates, cx and measure
+
+    Parameters:
+        qasm (str): circuit as Qasm
+
+    Returns:
+        qregs (dict): register name: (offset, size) of quantum registers
+        cregs (dict): register name: (offset, size) of classical registers, in declaration order
+        operations (list): (name, params, arguments) tuples, arguments are global bit indexes
+    """
+    qregs = dict()
+    cregs = dict()
+    operations = []
+    for statement in qasm.split(';'):
+        statement = statement.strip()
+        if not statement or statement.startswith('OPENQASM') or statement.startswith('include') \
+                or statement.startswith('//'):
+            continue
+        match = _STATEMENT.match(statement + ';')
+        if match is None:
+            raise ValueError('Unsupported Qasm statement %s' % statement)
+        name, params, arguments = match.groups()
+        if name == 'qreg' or name == 'creg':
+            register, size = re.match(r'(\w+)\s*\[(\d+)\]', arguments).groups()
+            registers = qregs if name == 'qreg' else cregs
+            registers[register] = (sum(s for _, s in registers.values()), int(size))
+            continue
+        bits = []
+        for argument in re.split(r',|->', arguments):
+            register, index = re.match(r'\s*(\w+)\s*\[(\d+)\]', argument).groups()
+            registers = qregs if register in qregs else cregs
+            bits.append(registers[register][0] + int(index))
+        params = [_angle(param) for param in params.split(',')] if params else []
+        operations.append((name.lower(), params, bits))
+    return qregs, cregs, operations
+
+
+def simulate(qasm, shots=1024, seed=None):
+    """Samples a Clifford circuit with a stabilizer tableau
+
+    Circuits must measure qubits only at the end, as every circuit built by Compiler does.
+    Sampling is vectorized over shots, so thousands of shots of 100+ qubit circuits are cheap.
+
+    Parameters:
+        qasm (str): circuit as Qasm
+        shots (int): number of shots
+        seed (int): seed of the random generator
+
+    Returns:
+        counts (dict): bitstring: count, in the same format of qiskit results
+
+    Raises:
+        ValueError: if the circuit is not Clifford, uses unsupported statements or has gates after measurements
+    """
+    qregs, cregs, operations = parse(qasm)
+    n_qubits = sum(size for _, size in qregs.values())
+    n_clbits = sum(size for _, size in cregs.values())
+    tableau = Tableau(n_qubits)
+    measured = dict()
+    single = {'h': tableau.h, 's': tableau.s, 'sdg': tableau.rz(3), 'x': tableau.x_gate, 'y': tableau.y_gate,
+              'z': tableau.z_gate}
+    for name, params, bits in operations:
+        if name == 'measure':
+            measured[bits[1]] = bits[0]
+            continue
+        if name == 'barrier':
+            continue
+        if any(bit in measured.values() for bit in bits):
+            raise ValueError('Gates after measurements are not supported')
+        if name == 'id':
+            continue
+        if name == 'cx':
+            tableau.cx(bits[0], bits[1])
+        elif name in single:
+            single[name](bits[0])
+        elif name == 'u3' or name == 'u':
+            tableau.u3(params[0], params[1], params[2], bits[0])
+        elif name == 'u2':
+            tableau.u3(math.pi / 2, params[0], params[1], bits[0])
+        elif name == 'u1':
+            tableau.u3(0, 0, params[0], bits[0])
+        else:
+            raise ValueError('Gate %s is not supported by the stabilizer simulator' % name)
+    offset, basis = tableau.support()
+    logger.debug('Support of dimension %d over %d qubits', basis.shape[0], n_qubits)
+    generator = np.random.default_rng(seed)
+    coefficients = generator.integers(0, 2, size=(shots, basis.shape[0]), dtype=np.uint8)
+    states = (coefficients.astype(np.int32) @ basis.astype(np.int32)) & 1
+    states ^= offset
+    clbits = np.zeros((shots, n_clbits), dtype=np.uint8)
+    for clbit, qubit in measured.items():
+        clbits[:, clbit] = states[:, qubit]
+    outcomes, occurrences = np.unique(clbits, axis=0, return_counts=True)
+    counts = dict()
+    for outcome, occurrence in zip(outcomes, occurrences):
+        registers = [''.join('1' if bit else '0' for bit in outcome[start:start + size][::-1])
+                     for start, size in cregs.values()]
+        counts[' '.join(reversed(registers))] = int(occurrence)
+    return counts
+
+
+class StabilizerResult(object):
+    """Result of a StabilizerJob, exposing the parts of the qiskit Result used by Compiler"""
+
+    def __init__(self, ran_qasm, counts):
+        self._ran_qasm = ran_qasm
+        self._counts = counts
+
+    def get_names(self):
+        return list(self._ran_qasm)
+
+    def get_counts(self, name=None):
+        if name is None:
+            name = self.get_names()[0]
+        return self._counts[name]
+
+    def get_ran_qasm(self, name):
+        return self._ran_qasm[name]
+
+
+class StabilizerJob(object):
+    """Job of a StabilizerBackend, done as soon as it is submitted
+
+    Circuits are simulated by the first call of result(), which keeps their counts and releases the qobj.
+
+    Parameters:
+        qobj (dict): qobj to run
+        seed (int): seed used by circuits when neither their config nor the qobj config has one
+    """
+
+    def __init__(self, qobj, seed=None):
+        self.id = str(uuid.uuid4())
+        self.exception = None
+        self._qobj = qobj
+        self._seed = seed
+        self._result = None
+
+    @property
+    def status(self):
+        from qiskit.backends import JobStatus
+        return {'status': JobStatus.DONE, 'status_msg': JobStatus.DONE.value}
+
+    @property
+    def done(self):
+        return True
+
+    def cancel(self):
+        pass
+
+    def result(self):
+        if self._result is None:
+            shots = self._qobj['config']['shots']
+            ran_qasm = dict()
+            counts = dict()
+            for circuit in self._qobj['circuits']:
+                # Seeds can be set per circuit or for the whole qobj, qiskit sets the ones of circuits to None
+                seed = circuit.get('config', {}).get('seed')
+                if seed is None:
+                    seed = self._qobj['config'].get('seed')
+                if seed is None:
+                    seed = self._seed
+                ran_qasm[circuit['name']] = circuit['compiled_circuit_qasm']
+                counts[circuit['name']] = simulate(circuit['compiled_circuit_qasm'], shots, seed=seed)
+            self._result = StabilizerResult(ran_qasm, counts)
+            self._qobj = None
+        return self._result
+
+
+class StabilizerBackend(object):
+    """Local backend sampling Clifford circuits with a stabilizer tableau, jobs complete immediately
+
+    Jobs are not kept by the backend, so retrieve_job() never finds them and reattached jobs are resubmitted.
+
+    Parameters:
+        name (str): backend name
+        seed (int): seed used when neither the circuit nor the qobj config has one
+    """
+
+    def __init__(self, name, seed=None):
+        self.name = name
+        self.seed = seed
+
+    @property
+    def status(self):
+        return {'available': True, 'busy': False, 'pending_jobs': 0, 'name': self.name}
+
+    @property
+    def configuration(self):
+        return {'name': self.name, 'local': True, 'simulator': True}
+
+    def run(self, qobj):
+        return StabilizerJob(qobj, self.seed)
+
+    def retrieve_job(self, job_id):
+        raise LookupError('Job %s not found, %s backend does not keep jobs' % (job_id, self.name))
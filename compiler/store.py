@@ -0,0 +1,258 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import mmap
+import struct
+import time
+from os import path
+import logging
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from compiler import configure_logging
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# File layout, all sections are aligned to 8 bytes so that arrays can be read in place:
+#   file header:  MAGIC, uint32 version, uint32 reserved
+#   run header:   RUN_MAGIC, uint32 metadata length, uint32 number of outcomes, uint32 words per outcome
+#   metadata:     JSON, padded
+#   values:       outcomes x words uint64, little endian, word 0 holds the least significant bits
+#   counts:       outcomes uint32, padded
+MAGIC = b'GHZRSTOR'
+VERSION = 1
+RUN_MAGIC = b'RUN\x00'
+_FILE_HEADER = struct.Struct('<8sII')
+_RUN_HEADER = struct.Struct('<4sIII')
+
+
+def _padding(size):
+    return -size % 8
+
+
+def _pack(values, width):
+    # Packs binary strings or integers of width bits into a (len(values), words) uint64 array
+    words = max(1, -(-width // 64))
+    if words == 1:
+        packed = [int(value, 2) if isinstance(value, str) else value for value in values]
+        return np.array(packed, dtype='<u8').reshape(len(packed), 1)
+    data = b''.join((int(value, 2) if isinstance(value, str) else value).to_bytes(8 * words, 'little')
+                    for value in values)
+    return np.frombuffer(data, dtype='<u8').reshape(len(values), words)
+
+
+def unpack(values, width):
+    """Converts packed values back to binary strings
+
+    Parameters:
+        values (numpy.ndarray): outcomes x words uint64 array, as stored in a run
+        width (int): number of bits of each value
+
+    Returns:
+        values (list): binary strings of width characters
+    """
+    if values.shape[1] == 1:
+        return [format(value, '0%db' % width) for value in values[:, 0].tolist()]
+    return [format(int.from_bytes(row.tobytes(), 'little'), '0%db' % width) for row in values]
+
+
+def parse_text(lines):
+    """Parses results written by utility.save_results
+
+    Parameters:
+        lines (iterable): lines of the text file, as str
+
+    Returns:
+        results (dict): binary string: count
+    """
+    results = dict()
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 2 or fields[0] == 'VALUES':
+            continue
+        results[fields[0]] = results.get(fields[0], 0) + int(fields[1])
+    return results
+
+
+class ResultsStore(object):
+    """Append-only binary file of execution results
+
+    Each run stores its values packed as integers, its counts as uint32 and a metadata dictionary.
+    Many runs are appended to the same file, and reading memory-maps the file once and iterates
+    over runs without copying their arrays.
+
+    Parameters:
+        filename (str): store file, created on first append
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+        self._map = None
+
+    def append(self, results, width=None, **metadata):
+        """Appends a run to the store
+
+        Parameters:
+            results (dict): value: count, values are binary strings or integers
+            width (int): number of bits of values, needed only if values are integers
+            metadata: JSON serializable metadata of the run
+
+        Returns:
+            offset (int): offset of the run in the file
+        """
+        values = list(results.keys())
+        if width is None:
+            width = len(values[0]) if values and isinstance(values[0], str) else 0
+        metadata = dict(metadata, width=width, stored=metadata.get('stored', time.time()))
+        meta = json.dumps(metadata).encode('utf-8')
+        packed = _pack(values, width)
+        counts = np.array(list(results.values()), dtype='<u4')
+        record = [_RUN_HEADER.pack(RUN_MAGIC, len(meta), len(values), packed.shape[1]),
+                  meta, b'\x00' * _padding(len(meta)),
+                  packed.tobytes(),
+                  counts.tobytes(), b'\x00' * _padding(counts.nbytes)]
+        os.makedirs(path.dirname(path.abspath(self.filename)), exist_ok=True)
+        # A single write on a file opened in append mode, so concurrent writers do not interleave runs,
+        # the file is locked until the write so that only the first writer of an empty file writes the header
+        descriptor = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_EX)
+            offset = os.fstat(descriptor).st_size
+            if offset == 0:
+                record.insert(0, _FILE_HEADER.pack(MAGIC, VERSION, 0))
+                offset = _FILE_HEADER.size
+            os.write(descriptor, b''.join(record))
+        finally:
+            # Closing the file releases the lock
+            os.close(descriptor)
+        self._close_map()
+        logger.debug('Stored run with %d outcomes at offset %d of %s', len(values), offset, self.filename)
+        return offset
+
+    def append_robj(self, robj, **metadata):
+        """Appends the results of a ran object, with its backend, algo, oracle, connected qubits and shots
+
+        Parameters:
+            robj (dict): object returned by compiler.run()
+            metadata: additional metadata, e.g. submission and completion timestamps
+
+        Returns:
+            offset (int): offset of the run in the file
+        """
+        results = robj['results']
+        return self.append(results, backend=robj['backend'], algo=robj['algo'], oracle=robj['oracle'],
+                           connected=list(robj['connected']), n_qubits=robj['n_qubits'],
+                           shots=int(sum(results.values())), **metadata)
+
+    def append_text(self, filename, **metadata):
+        """Appends the results of a text file written by utility.save_results, to migrate old data
+
+        Parameters:
+            filename (str): text file
+            metadata: metadata of the run, the source file name is added as source
+
+        Returns:
+            offset (int): offset of the run in the file
+        """
+        with open(filename) as text:
+            results = parse_text(text)
+        return self.append(results, source=path.basename(filename), **metadata)
+
+    def _open_map(self):
+        if self._map is None:
+            self._file = open(self.filename, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _ = _FILE_HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version > VERSION:
+                self._close_map()
+                raise ValueError('%s is not a results store of version %d' % (self.filename, VERSION))
+        return self._map
+
+    def _close_map(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Arrays of yielded runs still reference the map, it is released with them
+                pass
+            self._file.close()
+            self._map = None
+            self._file = None
+
+    def close(self):
+        """Releases the memory map, runs yielded before must not be used afterwards"""
+        self._close_map()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        """Iterates over runs in the order they were appended
+
+        Returns:
+            runs (generator): dictionaries with metadata, values (outcomes x words uint64 array),
+                              counts (uint32 array) and offset, arrays are views on the memory map
+        """
+        if not path.isfile(self.filename) or path.getsize(self.filename) == 0:
+            return
+        data = self._open_map()
+        offset = _FILE_HEADER.size
+        while offset + _RUN_HEADER.size <= len(data):
+            magic, meta_size, outcomes, words = _RUN_HEADER.unpack_from(data, offset)
+            if magic != RUN_MAGIC:
+                raise ValueError('Corrupted results store %s at offset %d' % (self.filename, offset))
+            start = offset + _RUN_HEADER.size
+            metadata = json.loads(data[start:start + meta_size].decode('utf-8'))
+            start += meta_size + _padding(meta_size)
+            values = np.frombuffer(data, dtype='<u8', count=outcomes * words,
+                                   offset=start).reshape(outcomes, words)
+            start += values.nbytes
+            counts = np.frombuffer(data, dtype='<u4', count=outcomes, offset=start)
+            yield {'offset': offset, 'metadata': metadata, 'values': values, 'counts': counts}
+            offset = start + counts.nbytes + _padding(counts.nbytes)
+
+    def runs(self, **criteria):
+        """Iterates over runs whose metadata match all criteria, e.g. runs(backend='ibmqx5', n_qubits=16)
+
+        Returns:
+            runs (generator): see __iter__()
+        """
+        for run in self:
+            if all(run['metadata'].get(key) == value for key, value in criteria.items()):
+                yield run
+
+    @staticmethod
+    def to_results(run):
+        """Converts a run back to the value: count dictionary it was stored from
+
+        Parameters:
+            run (dict): run yielded by the store
+
+        Returns:
+            results (dict): binary string: count
+        """
+        return dict(zip(unpack(run['values'], run['metadata']['width']), run['counts'].tolist()))
@@ -0,0 +1,115 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from sympy import pi
+
+from compiler import configure_logging
+from compiler.passes import run_passes
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Number of circuit templates memoized by each Compiler
+TEMPLATE_CACHE_SIZE = 256
+
+
+class GateList(object):
+    """Compact circuit representation used to build circuit templates
+
+    Gates are stored as (name, params, qubits) tuples, with qubits given as register indexes.
+    A Hadamard gate, u2(0, pi), placed right after another one on the same qubit cancels it,
+    so the list never contains the pairs Compiler.optimize_h would remove.
+    """
+
+    def __init__(self, size, qreg='qr', creg='cr'):
+        self.size = size
+        self.qreg = qreg
+        self.creg = creg
+        self.removed = 0
+        self._cancelled = 0
+        self._gates = []
+        self._last_h = dict()
+
+    def _append(self, name, params, qubits):
+        for qubit in qubits:
+            self._last_h.pop(qubit, None)
+        self._gates.append((name, params, qubits))
+
+    def u2(self, phi, lam, qubit):
+        if phi == 0 and lam == pi:
+            last = self._last_h.pop(qubit, None)
+            if last is not None:
+                logger.debug('Two consecutive Hadamard gates on qubit %d removed', qubit)
+                self._gates[last] = None
+                self.removed += 2
+                self._cancelled += 1
+            else:
+                self._gates.append(('u2', (phi, lam), (qubit,)))
+                self._last_h[qubit] = len(self._gates) - 1
+        else:
+            self._append('u2', (phi, lam), (qubit,))
+
+    def u3(self, theta, phi, lam, qubit):
+        self._append('u3', (theta, phi, lam), (qubit,))
+
+    def cx(self, control, target):
+        self._append('cx', (), (control, target))
+
+    def iden(self, qubit):
+        self._append('id', (), (qubit,))
+
+    def measure(self, qubit, cbit):
+        self._append('measure', (), (qubit, cbit))
+
+    @property
+    def gates(self):
+        """List of gates, as (name, params, qubits) tuples"""
+        return [gate for gate in self._gates if gate is not None]
+
+    def __len__(self):
+        # Each cancelled pair leaves one None entry, the second gate of the pair is never stored
+        return len(self._gates) - self._cancelled
+
+    def optimize(self, passes=None):
+        """Runs optimization passes over the gates placed so far, see passes.run_passes
+
+        Parameters:
+            passes (list): (name, function) pairs, passes.PASSES if None
+
+        Returns:
+            stats (list): one dictionary per pass, with pass name, removed gates and elapsed seconds
+        """
+        gates, stats = run_passes(self.gates, passes)
+        self._gates = [gate[:3] for gate in gates]
+        self._cancelled = 0
+        self._last_h.clear()
+        return stats
+
+    def qasm(self):
+        """Returns the circuit as Qasm
+
+        Returns:
+            qasm (str): the circuit as Qasm, in the same format QuantumCircuit.qasm() uses
+        """
+        lines = ['OPENQASM 2.0;', 'include "qelib1.inc";',
+                 'qreg %s[%d];' % (self.qreg, self.size), 'creg %s[%d];' % (self.creg, self.size)]
+        for name, params, qubits in self.gates:
+            if name == 'measure':
+                lines.append('measure %s[%d] -> %s[%d];' % (self.qreg, qubits[0], self.creg, qubits[1]))
+                continue
+            if params:
+                name += '(%s)' % ','.join(str(param) for param in params)
+            lines.append('%s %s;' % (name, ','.join('%s[%d]' % (self.qreg, qubit) for qubit in qubits)))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,503 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import logging
+
+from compiler import configure_logging
+
+logger = logging.getLogger(__name__)
+configure_logging()
+
+# Version of the ranking and spanning tree algorithms, bump it whenever the resulting tree
+# changes so that cached trees are rebuilt
+VERSION = 1
+
+
+def _strongly_connected(graph):
+    # Iterative Tarjan, returns strongly connected components in reverse topological order
+    index = dict()
+    low = dict()
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, successors = work[-1]
+            descended = False
+            for succ in successors:
+                if succ not in index:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph[succ])))
+                    descended = True
+                    break
+                elif succ in on_stack and index[succ] < low[node]:
+                    low[node] = index[succ]
+            if descended:
+                continue
+            work.pop()
+            if work and low[node] < low[work[-1][0]]:
+                low[work[-1][0]] = low[node]
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def reachability_ranks(graph):
+    """Ranks every node by how many nodes can reach it through at least one edge
+
+    The graph is condensed into its strongly connected components, then the set of
+    ancestors of each component is propagated in topological order as an integer bitset,
+    so the cost is roughly O(V + E) big-integer operations and no recursion is involved.
+
+    Parameters:
+        graph (dict): coupling map, node: list of nodes it can reach with one edge
+
+    Returns:
+        ranks (dict): node: number of nodes from which it is reachable
+    """
+    bit = {node: 1 << i for i, node in enumerate(graph)}
+    components = _strongly_connected(graph)
+    component_of = dict()
+    for c, component in enumerate(components):
+        for node in component:
+            component_of[node] = c
+    ancestors = [0] * len(components)
+    ranks = {node: 0 for node in range(len(graph))}
+    # Tarjan emits sinks first, so walking backwards visits every component before its successors
+    for c in range(len(components) - 1, -1, -1):
+        component = components[c]
+        mask = 0
+        cyclic = len(component) > 1
+        for node in component:
+            mask |= bit[node]
+            if node in graph[node]:
+                cyclic = True
+        reached_by = ancestors[c] | mask if cyclic else ancestors[c]
+        rank = bin(reached_by).count('1')
+        for node in component:
+            ranks[node] = rank
+        inherited = ancestors[c] | mask
+        for node in component:
+            for succ in graph[node]:
+                s = component_of[succ]
+                if s != c:
+                    ancestors[s] |= inherited
+        ancestors[c] = 0
+    logger.debug('ranks: %s', ranks)
+    return ranks
+
+
+def spanning_tree(start, coupling_map, inverse_map, ranks):
+    """Builds the spanning tree followed when placing cnot gates
+
+    The tree is grown breadth first from start along forward edges, i.e. edges whose
+    control is the new node and whose target is already in the tree. When no forward edge
+    is left, the highest ranked node reachable with an inverse cnot from the tree is added
+    and the breadth first search resumes from it. Pending inverse candidates are kept in a
+    heap ordered by rank, so the whole construction is O((V + E) log V).
+
+    Parameters:
+        start (int): root of the tree
+        coupling_map (dict): backend coupling map
+        inverse_map (dict): inverted coupling map, as built by Compiler._invert_graph
+        ranks (list): (node, rank) pairs sorted by decreasing rank
+
+    Returns:
+        tree (dict): node: parent, in the order nodes were connected, the root has parent -1
+    """
+    order = {node: position for position, (node, _) in enumerate(ranks)}
+    tree = dict()
+    to_connect = []
+    candidates = []
+
+    def connect(node, parent):
+        tree[node] = parent
+        to_connect.append(node)
+        for target in coupling_map[node]:
+            if target not in tree:
+                heapq.heappush(candidates, (order[target], target))
+
+    connect(start, -1)
+    count = len(coupling_map) - 1
+    visiting = 0
+    while count > 0:
+        if visiting == len(to_connect):
+            logger.debug('No more direct paths to explore, searching an inverse one')
+            while candidates and candidates[0][1] in tree:
+                heapq.heappop(candidates)
+            if not candidates:
+                logger.error('Coupling map is not connected, %d nodes left out of the tree', count)
+                break
+            inv = heapq.heappop(candidates)[1]
+            for node in inverse_map[inv]:
+                if node in tree:
+                    logger.debug('Found inverse path to node %d', inv)
+                    connect(inv, node)
+                    count -= 1
+                    break
+            continue
+        for node in inverse_map[to_connect[visiting]]:
+            if node not in tree:
+                connect(node, to_connect[visiting])
+                count -= 1
+                if count <= 0:
+                    break
+        visiting += 1
+    logger.debug('path: %s', tree)
+    return tree
+
+
+def adjacency(coupling_map):
+    """Undirected adjacency of a coupling map, qubits are adjacent if a cnot can connect them in either direction
+
+    Parameters:
+        coupling_map (dict): backend coupling map
+
+    Returns:
+        neighbours (dict): node: set of coupled nodes, every node of the map has an entry
+    """
+    neighbours = {node: set() for node in coupling_map}
+    for control in coupling_map:
+        for target in coupling_map[control]:
+            neighbours[control].add(target)
+            neighbours.setdefault(target, set()).add(control)
+    return neighbours
+
+
+def _center(neighbours):
+    # Approximate center of the map, middle of a long shortest path found with a double breadth first sweep
+    def sweep(source):
+        parents = {source: None}
+        queue = [source]
+        for node in queue:
+            for neighbour in sorted(neighbours[node]):
+                if neighbour not in parents:
+                    parents[neighbour] = node
+                    queue.append(neighbour)
+        return queue[-1], parents
+
+    far, _ = sweep(next(iter(neighbours)))
+    other, parents = sweep(far)
+    path = [other]
+    while parents[path[-1]] is not None:
+        path.append(parents[path[-1]])
+    return path[len(path) // 2]
+
+
+def _broadcast(start, coupling_map, neighbours, reverse_cost):
+    # Greedy broadcast schedule from start, returns node: (round, parent) and the total number of rounds
+    informed = {start: (0, -1)}
+    left = {node: len(targets) for node, targets in neighbours.items()}
+    for neighbour in neighbours[start]:
+        left[neighbour] -= 1
+    heap = [(0, 0, start)]
+    pushed = 1
+    rounds = 0
+    while heap:
+        time, _, node = heapq.heappop(heap)
+        choices = [neighbour for neighbour in neighbours[node] if neighbour not in informed]
+        if not choices:
+            continue
+
+        def duration(child):
+            # The new node is the control of the cnot, inverse cnots are wrapped in Hadamard gates
+            return 1 if node in coupling_map[child] else 1 + reverse_cost
+
+        # Direct cnots first, then the node with most neighbours left to connect
+        child = min(choices, key=lambda neighbour: (duration(neighbour), -left[neighbour], neighbour))
+        done = time + duration(child)
+        informed[child] = (done, node)
+        rounds = max(rounds, done)
+        for neighbour in neighbours[child]:
+            left[neighbour] -= 1
+        heapq.heappush(heap, (done, pushed, node))
+        heapq.heappush(heap, (done, pushed + 1, child))
+        pushed += 2
+    return informed, rounds
+
+
+def broadcast_tree(coupling_map, ranks, reverse_cost=2, candidates=8):
+    """Builds a spanning tree minimizing the cnot rounds needed to entangle all qubits
+
+    Every qubit already entangled can connect a new neighbour in each round, so the state fans
+    out in parallel and well connected maps need a logarithmic number of rounds instead of one
+    round per child of each node. A cnot along a coupling takes one round, an inverse cnot takes
+    1 + reverse_cost rounds because of the Hadamard gates around it. The schedule is built greedily
+    from the highest ranked nodes and from the center of the map, and the root needing the fewest
+    rounds is kept.
+
+    Parameters:
+        coupling_map (dict): backend coupling map
+        ranks (list): (node, rank) pairs sorted by decreasing rank
+        reverse_cost (int): extra rounds of an inverse cnot
+        candidates (int): number of highest ranked nodes tried as root
+
+    Returns:
+        start (int): root of the tree
+        tree (dict): node: parent, in the order nodes are connected by the schedule, the root has parent -1
+    """
+    neighbours = adjacency(coupling_map)
+    roots = [node for node, _ in ranks[:candidates]]
+    center = _center(neighbours)
+    if center not in roots:
+        roots.append(center)
+    best = None
+    for root in roots:
+        informed, rounds = _broadcast(root, coupling_map, neighbours, reverse_cost)
+        score = (-len(informed), rounds, sum(time for time, _ in informed.values()))
+        logger.debug('Broadcast from %d takes %d rounds', root, rounds)
+        if best is None or score < best[0]:
+            best = (score, root, informed)
+    _, start, informed = best
+    if len(informed) < len(coupling_map):
+        logger.error('Coupling map is not connected, %d nodes left out of the tree', len(coupling_map) - len(informed))
+    order = sorted(informed, key=lambda node: informed[node][0])
+    tree = {node: informed[node][1] for node in order}
+    logger.debug('path: %s', tree)
+    return start, tree
+
+
+def schedule_layers(edges):
+    """Groups the cnots along a tree into the minimum number of layers of disjoint qubits
+
+    A cnot can only run after the one connecting its parent, so each node connects its children
+    one per layer, starting from the child whose subtree needs the most layers.
+
+    Parameters:
+        edges (list): (child, parent) pairs in tree order, the parent of the first pair is the root
+
+    Returns:
+        layers (list): lists of (child, parent) pairs, in tree order within a layer
+    """
+    if not edges:
+        return []
+    children = dict()
+    for child, parent in edges:
+        children.setdefault(parent, []).append(child)
+    nodes = [edges[0][1]] + [child for child, _ in edges]
+    # Layers needed below every node, computed from the leaves up
+    needed = dict()
+    for node in reversed(nodes):
+        ordered = sorted(children.get(node, []), key=lambda child: -needed[child])
+        children[node] = ordered
+        needed[node] = max((i + 1 + needed[child] for i, child in enumerate(ordered)), default=0)
+    layer_of = {nodes[0]: 0}
+    for node in nodes:
+        for i, child in enumerate(children[node]):
+            layer_of[child] = layer_of[node] + i + 1
+    layers = [[] for _ in range(needed[nodes[0]])]
+    for child, parent in edges:
+        layers[layer_of[child] - 1].append((child, parent))
+    return layers
+
+
+def diff_couplings(old_map, new_map):
+    """Compares two coupling maps of the same backend
+
+    Parameters:
+        old_map (dict): previous coupling map
+        new_map (dict): current coupling map
+
+    Returns:
+        removed (set): (control, target) couplings only in old_map
+        added (set): (control, target) couplings only in new_map
+    """
+    old_edges = {(control, target) for control in old_map for target in old_map[control]}
+    new_edges = {(control, target) for control in new_map for target in new_map[control]}
+    return old_edges - new_edges, new_edges - old_edges
+
+
+def _coupled(coupling_map, child, parent):
+    # Direction of the cnot connecting child to parent: 1 along a coupling, -1 inverse, 0 if they are not coupled
+    if parent in coupling_map.get(child, ()):
+        return 1
+    if child in coupling_map.get(parent, ()):
+        return -1
+    return 0
+
+
+def repair_tree(tree, coupling_map):
+    """Repairs a spanning tree after the coupling map changed, keeping every branch still coupled
+
+    Nodes whose path to the root is still coupled keep their parent and position. Detached nodes
+    and new nodes are connected, as soon as possible in the original order, to the first connected
+    neighbour they have along a coupling, or else with an inverse cnot. Couplings added to the map
+    are only used to connect detached nodes, so unchanged parts of the tree give the same circuits.
+
+    Parameters:
+        tree (dict): node: parent, in the order nodes were connected, the root has parent -1
+        coupling_map (dict): new backend coupling map
+
+    Returns:
+        tree (dict): repaired tree, None if the root is no longer coupled to any node
+    """
+    neighbours = adjacency(coupling_map)
+    start = next(iter(tree))
+    if not neighbours.get(start):
+        return None
+    intact = {start}
+    for node, parent in tree.items():
+        if parent in intact and node in coupling_map and _coupled(coupling_map, node, parent):
+            intact.add(node)
+    repaired = dict()
+    position = dict()
+    pending = [node for node in tree if node in coupling_map and node not in intact]
+    pending += [node for node in coupling_map if node not in tree]
+
+    def attach():
+        # Connects pending nodes to the repaired tree until none of them has a connected neighbour
+        progress = True
+        while progress and pending:
+            progress = False
+            for node in list(pending):
+                connected = [neighbour for neighbour in neighbours.get(node, ()) if neighbour in repaired]
+                if not connected:
+                    continue
+                parent = min(connected, key=lambda neighbour: (-_coupled(coupling_map, node, neighbour),
+                                                               position[neighbour]))
+                position[node] = len(repaired)
+                repaired[node] = parent
+                pending.remove(node)
+                progress = True
+
+    for node, parent in tree.items():
+        if node in intact:
+            position[node] = len(repaired)
+            repaired[node] = parent
+            attach()
+    if pending:
+        logger.error('Coupling map is not connected, %d nodes left out of the tree', len(pending))
+    logger.debug('repaired path: %s', repaired)
+    return repaired
+
+
+def changed_prefix(old_tree, old_map, new_tree, new_map):
+    """Returns the length of the longest tree prefix giving the same circuits before and after a change
+
+    Circuits of n qubits follow the first n nodes of the tree, so they are still valid if
+    those nodes have the same parents and their cnots the same direction.
+
+    Parameters:
+        old_tree (dict): tree before the change
+        old_map (dict): coupling map before the change
+        new_tree (dict): tree after the change
+        new_map (dict): coupling map after the change
+
+    Returns:
+        length (int): number of leading nodes unchanged
+    """
+    length = 0
+    for (old_node, old_parent), (new_node, new_parent) in zip(old_tree.items(), new_tree.items()):
+        if old_node != new_node or old_parent != new_parent:
+            break
+        if new_parent != -1 and _coupled(old_map, old_node, old_parent) != _coupled(new_map, new_node, new_parent):
+            break
+        length += 1
+    return length
+
+
+def _components(nodes, neighbours):
+    # Sizes of the connected components of the subgraph induced by nodes
+    sizes = []
+    seen = set()
+    for node in nodes:
+        if node in seen:
+            continue
+        seen.add(node)
+        queue = [node]
+        for current in queue:
+            for neighbour in neighbours[current]:
+                if neighbour in nodes and neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        sizes.append(len(queue))
+    return sizes
+
+
+def _fits(sizes, components):
+    # First fit decreasing of sizes into components, a sufficient check that the remaining circuits can be placed
+    free = sorted(components, reverse=True)
+    for size in sorted(sizes, reverse=True):
+        for i, room in enumerate(free):
+            if room >= size:
+                free[i] -= size
+                break
+        else:
+            return False
+    return True
+
+
+def pack_subtrees(coupling_map, sizes):
+    """Partitions the coupling map into disjoint connected subtrees of the given sizes
+
+    Subtrees are carved largest first, each grown breadth first from the least connected free node
+    whose subtree leaves room for the others, so that the remaining qubits stay connected.
+    The check is a first fit of the remaining sizes into the free components, so packings that
+    need a more careful placement may be missed.
+
+    Parameters:
+        coupling_map (dict): backend coupling map
+        sizes (list): number of qubits of each subtree
+
+    Returns:
+        subtrees (list): one tree per size, in the same order, as node: parent with the root first and parent -1;
+                         None if the sizes do not fit
+    """
+    neighbours = adjacency(coupling_map)
+    free = set(coupling_map)
+    subtrees = [None] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i])
+    for position, index in enumerate(order):
+        size = sizes[index]
+        rest = [sizes[i] for i in order[position + 1:]]
+        roots = sorted(free, key=lambda node: (len(neighbours[node] & free), node))
+        for root in roots:
+            tree = {root: -1}
+            queue = [root]
+            for node in queue:
+                if len(tree) == size:
+                    break
+                for neighbour in sorted(neighbours[node] & free, key=lambda n: (len(neighbours[n] & free), n)):
+                    if neighbour not in tree:
+                        tree[neighbour] = node
+                        queue.append(neighbour)
+                        if len(tree) == size:
+                            break
+            if len(tree) == size and _fits(rest, _components(free - set(tree), neighbours)):
+                break
+        else:
+            return None
+        subtrees[index] = tree
+        free -= set(tree)
+    logger.debug('packed subtrees: %s', subtrees)
+    return subtrees
@@ -14,17 +14,14 @@
 
 import os
 import subprocess
-from os import path
 import logging
-from logging.config import fileConfig
 
-from qiskit import load_qasm_string
-from qiskit.dagcircuit import DAGCircuit
-from qiskit.qasm import Qasm
-from qiskit.tools.visualization import generate_latex_source
+import numpy as np
+
+from compiler import configure_logging
 
 logger = logging.getLogger(__name__)
-fileConfig(path.join(path.dirname(path.abspath(__file__)), 'logging.ini'))
+configure_logging()
 
 
 def circuit_drawer(circuit, filename, directory=None):
@@ -35,6 +32,10 @@ def circuit_drawer(circuit, filename, directory=None):
         filename (str): filename to write pdf, file extension not needed
         directory (str): directory where the circuit will be saved
     """
+    from qiskit import load_qasm_string
+    from qiskit.dagcircuit import DAGCircuit
+    from qiskit.qasm import Qasm
+    from qiskit.tools.visualization import generate_latex_source
     if isinstance(circuit, DAGCircuit):
         circuit = load_qasm_string(circuit.qasm())
     elif isinstance(circuit, str):
@@ -63,40 +64,88 @@ def circuit_drawer(circuit, filename, directory=None):
     os.unlink('%s.aux' % (directory+filename))
 
 
-def _order_results(robj):
+def _result_permutation(robj):
+    """Computes which classical bit ends up in each position of the ordered results
+
+    Parameters:
+        robj (dict): object returned by compiler.run(), only n_qubits, connected, oracle and algo are needed
+
+    Returns:
+        permutation (list): classical bit index of each character of the ordered values
+    """
+    stop = robj['n_qubits'] // 2
+    connected = robj['connected']
+    if robj['algo'] != 'parity':
+        permutation = [connected[n + stop] for n in range(robj['n_qubits'] - stop)]
+        permutation += [connected[n] for n in range(stop)]
+    else:
+        permutation = [connected[0]]
+        one = 1
+        zero = robj['n_qubits'] - 1
+        for q in robj['oracle']:
+            if q == '1':
+                permutation.append(connected[one])
+                one += 1
+            else:
+                permutation.append(connected[zero])
+                zero -= 1
+    return permutation
+
+
+def _marginal_counts(counts, qubits):
+    """Keeps only the classical bits of qubits in counts, the other bits are set to 0
+
+    Parameters:
+        counts (dict): bit string: count, as returned by qiskit
+        qubits (list): indexes of the classical bits to keep
+
+    Returns:
+        counts (dict): bit string: count, outcomes only differing in other bits are summed
+    """
+    marginal = dict()
+    if not counts:
+        return marginal
+    width = len(next(iter(counts)))
+    mask = sum(1 << qubit for qubit in qubits)
+    for outcome, count in counts.items():
+        key = format(int(outcome, 2) & mask, '0%db' % width)
+        marginal[key] = marginal.get(key, 0) + count
+    return marginal
+
+
+def _order_results(robj, packed=False):
     """Converts execution results to correct format, based on oracle
 
+    The bit permutation is computed once, then applied to all outcomes at once as a matrix of characters.
+    Outcomes that only differ in unused classical bits are summed.
+
     Parameters:
         robj (dict): object returned by compiler.run()
+        packed (bool): set True to key results by integers, whose binary representation is the value
 
     Returns:
-        results (dict): dictionary of value:counts
+        results (dict): dictionary of value:counts, in the order of robj['counts']
     """
-    stop = robj['n_qubits'] // 2
-    results = dict()
     counts = robj['counts']
-    connected = robj['connected']
-    for count in counts:
-        reverse = count[0][::-1]
-        if robj['algo'] != 'parity':
-            sorted_v = []
-            for n in range(robj['n_qubits'] - stop):
-                sorted_v.append(reverse[connected[n + stop]])
-            for n in range(stop):
-                sorted_v.append(reverse[connected[n]])
-        else:
-            sorted_v = [reverse[connected[0]]]
-            one = 1
-            zero = robj['n_qubits'] - 1
-            for q in robj['oracle']:
-                if q == '1':
-                    sorted_v.append(reverse[connected[one]])
-                    one += 1
-                else:
-                    sorted_v.append(reverse[connected[zero]])
-                    zero -= 1
-        value = ''.join(str(v) for v in sorted_v)
-        results.update({value: count[1]})
+    results = dict()
+    if not counts:
+        return results
+    permutation = _result_permutation(robj)
+    width = len(counts[0][0])
+    n_bits = len(permutation)
+    # Character i of the reversed bitstring is column width - 1 - i of the outcome matrix
+    outcomes = np.frombuffer(''.join(count[0] for count in counts).encode('ascii'), dtype=np.uint8)
+    values = outcomes.reshape(len(counts), width)[:, width - 1 - np.array(permutation, dtype=np.intp)]
+    if packed and n_bits < 63:
+        weights = np.left_shift(1, np.arange(n_bits - 1, -1, -1, dtype=np.int64))
+        keys = ((values - ord('0')).astype(np.int64) @ weights).tolist()
+    else:
+        text = np.ascontiguousarray(values).tobytes().decode('ascii')
+        keys = [text[i:i + n_bits] for i in range(0, len(text), n_bits)]
+        if packed:
+            keys = [int(key, 2) for key in keys]
+    for key, count in zip(keys, counts):
+        results[key] = results.get(key, 0) + count[1]
     return results
 
 
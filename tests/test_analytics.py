@@ -0,0 +1,47 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from compiler.analytics import Batch, parity_mask, tally  # noqa: E402
+from compiler.archive import Archive  # noqa: E402
+
+
+def test_archived_fidelity_is_reproduced(tmpdir):
+    archive = Archive(cache_dir=str(tmpdir))
+    fidelities = archive.executions['fidelity']
+    batch = Batch.from_archive(archive, processes=1)
+    assert len(batch) == len(fidelities)
+    archived = ~np.isnan(fidelities)
+    assert archived.any()
+    assert batch.fidelity()[archived] == pytest.approx(fidelities[archived])
+    # Parsing in worker processes gives the same tallies, in the same order
+    parallel = Batch.from_archive(archive, processes=2)
+    assert np.array_equal(parallel.tallies, batch.tallies)
+
+
+def test_tally_and_metrics():
+    results = {'000': 40, '111': 50, '011': 6, '001': 4}
+    counts = tally(results, parity_mask('ghz', 3))
+    assert counts.tolist() == [40, 50, 46, 100]
+    batch = Batch([counts])
+    assert batch.success_rate().tolist() == [0.9]
+    assert batch.parity().tolist() == [pytest.approx(-0.08)]
+    assert batch.fidelity()[0] == pytest.approx(np.sqrt(0.2) + np.sqrt(0.25))
+    # The parity ancilla is first, qubits whose oracle bit is 0 are not entangled
+    assert parity_mask('parity', 3, '10') == '110'
+    low, high = batch.bootstrap('fidelity', resamples=200, seed=1)
+    assert low[0] <= batch.fidelity()[0] <= high[0]
@@ -0,0 +1,45 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from compiler.archive import Archive  # noqa: E402
+
+
+def test_index_is_built_once(tmpdir):
+    archive = Archive(cache_dir=str(tmpdir))
+    executions = archive.executions
+    assert len(executions['member']) > 0
+    assert set(executions['method']) == {'qiskit-compiler', 'spanning-tree'}
+    assert tmpdir.listdir(lambda entry: entry.ext == '.npz') != []
+    # A second archive reads the stored index, every column comes back as built
+    reloaded = Archive(cache_dir=str(tmpdir)).executions
+    assert set(reloaded) == set(executions)
+    for column in executions:
+        assert np.array_equal(reloaded[column], executions[column], equal_nan=column == 'fidelity')
+
+
+def test_query_and_members(tmpdir):
+    with Archive(cache_dir=str(tmpdir)) as archive:
+        rows = archive.query(method='spanning-tree', n_qubits=[5, 16])
+        assert len(rows['member']) > 0
+        assert set(rows['method']) == {'spanning-tree'}
+        assert set(rows['n_qubits'].tolist()) <= {5, 16}
+        row, results = next(archive.iter_counts(method='spanning-tree', n_qubits=5))
+        assert sum(results.values()) == row['shots']
+        assert all(len(value) == 5 for value in results)
+        assert archive.qasm('spanning-tree', 'ibmqx5', 5).startswith('OPENQASM')
+        assert archive.qasm('spanning-tree', 'ibmqx5', 99) is None
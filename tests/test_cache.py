@@ -0,0 +1,163 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import glob
+import pickle
+
+import pytest
+
+from benchmarks.coupling_maps import bundled, line
+from compiler.cache import CachedResult, TreeCache, coupling_hash
+
+
+def test_bundled_trees_are_a_seed_tier(tmpdir):
+    cache = TreeCache(str(tmpdir))
+    coupling_map = bundled('ibmqx4')
+    data = cache.get(coupling_hash(coupling_map))
+    assert data['coupling_map'] == coupling_map
+    assert cache.get(coupling_hash(coupling_map), seeds=False) is None
+    # Trees built with parameters never come from the seed tier
+    built = cache.get_or_create(coupling_map, lambda: {'path': 'built'}, tree_mode='depth')
+    assert built == {'path': 'built'}
+    assert tmpdir.listdir(lambda entry: entry.ext == '.p') != []
+
+
+def test_failed_write_keeps_previous_entry(tmpdir):
+    cache = TreeCache(str(tmpdir))
+    key = coupling_hash(line(3))
+    cache.put(key, {'path': 1})
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        cache.put(key, {'path': lambda: None})
+    assert cache.get(key, seeds=False) == {'path': 1}
+    assert glob.glob(str(tmpdir.join('*.tmp'))) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir):
+    cache = TreeCache(str(tmpdir), max_entries=3)
+    keys = [coupling_hash(line(n_qubits)) for n_qubits in range(2, 6)]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, {'path': key})
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0], seeds=False) == {'path': keys[0]}
+    cache.put(keys[3], {'path': keys[3]})
+    assert [cache.get(key, seeds=False) is not None for key in keys] == [True, False, True, True]
+
+
+def test_unwritable_directory_builds_uncached(tmpdir):
+    # A directory below a regular file can never be created, whatever the user permissions are
+    blocker = tmpdir.join('blocker')
+    blocker.write('')
+    cache = TreeCache(str(blocker.join('cache')))
+    built = []
+
+    def create():
+        built.append(1)
+        return {'path': len(built)}
+
+    assert cache.get_or_create(line(4), create) == {'path': 1}
+    assert cache.get_or_create(line(4), create) == {'path': 2}
+    with pytest.raises(OSError):
+        cache.put(coupling_hash(line(4)), {'path': 0})
+
+
+def _cobj(qasm, seed=None):
+    # Compiled object with the parts used by the result cache
+    config = {} if seed is None else {'seed': seed}
+    return {'qasm': qasm, 'compiled': {'config': config}}
+
+
+def test_only_seeded_simulator_runs_are_cached(tmpdir):
+    pytest.importorskip('sympy')
+    from compiler.compiler import Compiler
+    compiler = Compiler({'backend_name': 'ibmqx4', 'coupling_map': bundled('ibmqx4')}, cache_dir=str(tmpdir))
+    qasm = compiler.template(3, 'local_stabilizer_simulator')['qasm']
+    assert compiler._result_key(_cobj(qasm), 'local_stabilizer_simulator', 1024, None) is None
+    assert compiler._result_key(_cobj(qasm), 'ibmqx4', 1024, 7) is None
+    key = compiler._result_key(_cobj(qasm), 'local_stabilizer_simulator', 1024, 7)
+    # The seed of the compiled qobj is used when none is given
+    assert compiler._result_key(_cobj(qasm, seed=7), 'local_stabilizer_simulator', 1024, None) == key
+    assert compiler._result_key(_cobj(qasm), 'local_stabilizer_simulator', 2048, 7) != key
+    # Only the backend output is stored, the ran object is rebuilt from the cobj of every run
+    entry = {'name': 'ghz', 'counts': {'000': 1024}, 'ran_qasm': qasm}
+    compiler._cache_result(key, {'result': CachedResult(entry), 'algo': 'ghz', 'connected': [0, 1, 2],
+                                 'circuit': object(), 'metrics': {}})
+    assert compiler.result_cache.get(key) == entry
+
+
+def test_result_cache_evicts_least_recently_used(tmpdir):
+    from compiler.cache import ResultCache, circuit_hash
+    cache = ResultCache(str(tmpdir), max_entries=2)
+    keys = [circuit_hash('qreg q[%d];' % size, 'local_qasm_simulator', 1024, 1) for size in range(3)]
+    for age, key in enumerate(keys):
+        cache.put(key, {'key': key})
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    assert [cache.get(key) for key in keys] == [None, {'key': keys[1]}, {'key': keys[2]}]
+    # Spanning trees bundled with the package never satisfy result lookups
+    assert cache.get(coupling_hash(bundled('ibmqx4'))) is None
+
+
+def test_seeded_stabilizer_runs_hit_the_cache(tmpdir):
+    pytest.importorskip('qiskit')
+    from compiler.backends import get_backend
+    from compiler.compiler import Compiler
+    from compiler.runner import JobRunner
+    submitted = []
+
+    def counting_backend(name):
+        backend = get_backend(name)
+        submitted.append(name)
+        return backend
+
+    compiler = Compiler({'backend_name': 'ibmqx4', 'coupling_map': bundled('ibmqx4')}, cache_dir=str(tmpdir))
+    compiler.runner = JobRunner(counting_backend, poll_interval=0.001)
+    cobj = compiler.compile(4, 'local_stabilizer_simulator')
+    first = compiler.run(cobj, 'local_stabilizer_simulator', shots=500, seed=3)
+    runs = len(submitted)
+    cached = compiler.run(cobj, 'local_stabilizer_simulator', shots=500, seed=3)
+    assert len(submitted) == runs
+    assert cached['counts'] == first['counts']
+    compiler.run(cobj, 'local_stabilizer_simulator', shots=500)
+    assert len(submitted) > runs
+
+
+def test_bundled_trees_are_read_once(tmpdir):
+    from compiler.cache import bundled_trees
+    from compiler.couplings import CouplingProvider
+    tree = bundled_trees()['ibmqx4']
+    assert bundled_trees()['ibmqx4'] is tree
+    assert TreeCache(str(tmpdir)).get(coupling_hash(tree['coupling_map'])) is tree
+    provider = CouplingProvider(directory=str(tmpdir.join('couplings')), offline=True)
+    assert provider.get('ibmqx4')['coupling_map'] is tree['coupling_map']
+
+
+def test_cached_runs_are_rebuilt_from_their_cobj(tmpdir):
+    pytest.importorskip('qiskit')
+    from compiler.compiler import Compiler
+    backend_info = {'backend_name': 'ibmqx5', 'coupling_map': bundled('ibmqx5')}
+    compiler = Compiler(backend_info, cache_dir=str(tmpdir))
+    ghz = compiler.compile(4, 'local_stabilizer_simulator')
+    parity = compiler.compile(3, 'local_stabilizer_simulator', algo='parity', oracle='11')
+    # Both circuits have the same Qasm but connect their qubits in a different order
+    assert ghz['qasm'] == parity['qasm']
+    assert ghz['connected'] != parity['connected']
+    compiler.run(ghz, 'local_stabilizer_simulator', shots=500, seed=3)
+    cached = compiler.run(parity, 'local_stabilizer_simulator', shots=500, seed=3)
+    uncached = Compiler(backend_info, cache_dir=str(tmpdir.join('uncached')))
+    uncached.result_cache = None
+    fresh = uncached.run(parity, 'local_stabilizer_simulator', shots=500, seed=3)
+    assert cached['algo'] == 'parity'
+    assert cached['connected'] == parity['connected']
+    assert cached['results'] == fresh['results']
@@ -0,0 +1,66 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+from benchmarks.coupling_maps import bundled
+from compiler import calibration as noise
+
+
+def _calibration(coupling_map):
+    # Synthetic calibration with a different error on every qubit and coupling
+    calibration = {'gate': dict(), 'readout': dict(), 'cx': dict(), 'digest': 'synthetic'}
+    for node in coupling_map:
+        calibration['gate'][node] = 0.001 * (node + 1)
+        calibration['readout'][node] = 0.02 + 0.005 * node
+        for target in coupling_map[node]:
+            calibration['cx'][(node, target)] = 0.02 + 0.003 * (node + target)
+    return calibration
+
+
+def test_grown_tree_takes_direct_cnots():
+    coupling_map = bundled('ibmqx4')
+    node_cost, edges = noise._weights(coupling_map, _calibration(coupling_map))
+    # On ibmqx4 every qubit can reach qubit 0 through direct cnots, the new qubit being the control
+    tree = noise._grow(0, node_cost, edges)
+    assert len(tree) == len(coupling_map)
+    for node, parent in tree.items():
+        if parent != -1:
+            assert parent in coupling_map[node], (node, parent)
+
+
+def test_grown_prefixes_are_minimal():
+    coupling_map = bundled('ibmqx4')
+    node_cost, edges = noise._weights(coupling_map, _calibration(coupling_map))
+    for root in coupling_map:
+        tree = noise._grow(root, node_cost, edges)
+        costs = noise._costs(tree, node_cost, edges)
+        assert costs[0] == node_cost[root]
+        # Every prefix is the cheapest extension of the previous one by a qubit coupled to it
+        for size in range(2, len(tree) + 1):
+            prefix = list(tree)[:size - 1]
+            cheapest = min(node_cost[child] + edges[child][parent] for parent in prefix for child in edges[parent]
+                           if child not in prefix)
+            assert abs(costs[size - 1] - costs[size - 2] - cheapest) < 1e-12, (root, size)
+
+
+def test_selected_fidelity_matches_tree():
+    coupling_map = bundled('ibmqx4')
+    calibration = _calibration(coupling_map)
+    node_cost, edges = noise._weights(coupling_map, calibration)
+    selection = noise.noise_aware_trees(coupling_map, calibration, candidates=None)
+    for n_qubits, index in selection['best'].items():
+        root, tree = selection['trees'][index]
+        grown = noise._costs(noise._grow(root, node_cost, edges), node_cost, edges)
+        assert abs(selection['fidelity'][n_qubits] - math.exp(-grown[n_qubits - 1])) < 1e-12
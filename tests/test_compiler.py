@@ -0,0 +1,214 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from benchmarks.coupling_maps import bundled, random_digraph
+
+pytest.importorskip('numpy')
+pytest.importorskip('sympy')
+
+from compiler.compiler import Compiler  # noqa: E402
+
+
+def test_update_coupling_keeps_valid_templates(tmpdir):
+    coupling_map = bundled('ibmqx5')
+    compiler = Compiler({'backend_name': 'ibmqx5', 'coupling_map': coupling_map}, cache_dir=str(tmpdir))
+    before = {n_qubits: compiler.template(n_qubits, 'ibmqx5')['qasm'] for n_qubits in range(2, 17)}
+    # Decouples the last qubit of the tree from its parent, it stays coupled to other qubits
+    node, parent = list(compiler.tree_data['path'].items())[-1]
+    new_map = {control: [target for target in targets if {control, target} != {node, parent}]
+               for control, targets in coupling_map.items()}
+    update = compiler.update_coupling(new_map)
+    assert 2 <= update['valid'] < 16
+    assert {key[2] for key in compiler._templates} == set(range(2, update['valid'] + 1))
+    for n_qubits in range(2, update['valid'] + 1):
+        cobj = compiler.template(n_qubits, 'ibmqx5')
+        assert cobj['qasm'] == before[n_qubits]
+    # The repaired tree is cached under the new coupling map
+    cached = Compiler({'backend_name': 'ibmqx5', 'coupling_map': new_map}, cache_dir=str(tmpdir))
+    assert list(cached.tree_data['path'].items()) == list(compiler.tree_data['path'].items())
+
+
+def test_compile_many_on_custom_backend(tmpdir):
+    pytest.importorskip('qiskit')
+    # Worker processes must know the backend the coupling map belongs to, it is not one of BACKENDS
+    compiler = Compiler({'backend_name': 'custom_device', 'coupling_map': random_digraph(8, seed=1)},
+                        cache_dir=str(tmpdir), tree_mode='depth')
+    specs = [('ghz', n_qubits, '11', 'custom_device') for n_qubits in range(2, 7)]
+    results = dict(compiler.compile_many(specs, workers=2))
+    assert set(results) == set(specs)
+    for (algo, n_qubits, oracle, backend), cobj in results.items():
+        assert cobj['n_qubits'] == n_qubits
+        assert cobj['qasm'] == compiler.template(n_qubits, backend, algo=algo, oracle=oracle)['qasm']
+
+
+def _measured_ones(circuit, shots):
+    # Fake counts telling circuits apart: the classical bits of measured qubits are 1
+    qasm = circuit['compiled_circuit_qasm']
+    size = int(qasm.split('creg cr[')[1].split(']')[0])
+    bits = ['0'] * size
+    for line in qasm.splitlines():
+        if line.startswith('measure'):
+            bits[size - 1 - int(line.split('cr[')[1].split(']')[0])] = '1'
+    return {''.join(bits): shots}
+
+
+def test_run_batch_splits_counts_per_circuit(tmpdir):
+    pytest.importorskip('qiskit')
+    from compiler.fake import FakeBackend
+    from compiler.runner import JobRunner
+    backend = FakeBackend(polls=0, counts=_measured_ones)
+    compiler = Compiler({'backend_name': 'fake', 'coupling_map': random_digraph(8, seed=2)}, cache_dir=str(tmpdir))
+    compiler.runner = JobRunner(lambda name: backend, poll_interval=0.001)
+    cobjs = [compiler.compile(n_qubits, 'fake') for n_qubits in (2, 3, 2, 5, 3)]
+    robjs = compiler.run_batch(cobjs, 'fake', shots=1000, max_experiments=2, max_shots=300)
+    # 3 jobs of at most 2 circuits, for each of the 4 parts of the shots
+    assert len(backend.jobs) == 12
+    assert len(robjs) == len(cobjs)
+    for cobj, robj in zip(cobjs, robjs):
+        assert robj['n_qubits'] == cobj['n_qubits']
+        assert robj['connected'] == cobj['connected']
+        assert robj['counts'] == list(_measured_ones(cobj['compiled']['circuits'][0], 1000).items())
+    assert robjs[0]['counts'] == robjs[2]['counts']
+    assert robjs[1]['counts'] == robjs[4]['counts']
+
+
+def test_batch_qobjs_rename_and_split_shots(tmpdir):
+    pytest.importorskip('qiskit')
+    compiler = Compiler({'backend_name': 'fake', 'coupling_map': random_digraph(8, seed=2)}, cache_dir=str(tmpdir))
+    cobj = compiler.compile(3, 'fake')
+    qobjs = Compiler._batch_qobjs([cobj] * 5, 'fake', 1001, 2, 500)
+    assert len(qobjs) == 3 * 3
+    assert [qobj['config']['shots'] for qobj in qobjs] == [334] * 3 + [334] * 3 + [333] * 3
+    names = [circuit['name'] for qobj in qobjs[:3] for circuit in qobj['circuits']]
+    assert names == ['experiment%d' % index for index in range(5)]
+    assert len({qobj['id'] for qobj in qobjs}) == len(qobjs)
+
+
+def test_calibrated_selection_depends_on_tree_mode(tmpdir, monkeypatch):
+    import json
+    from compiler import calibration as noise
+    coupling_map = bundled('ibmqx5')
+    filename = str(tmpdir.join('calibration.json'))
+    with open(filename, 'w') as calibration_file:
+        json.dump({'qubits': [{'name': 'Q%d' % node, 'gateError': {'value': 0.001 * (node + 1)},
+                               'readoutError': {'value': 0.02 + 0.005 * node}} for node in coupling_map],
+                   'multiQubitGates': [{'qubits': [node, target], 'gateError': {'value': 0.02 + 0.003 * target}}
+                                       for node in coupling_map for target in coupling_map[node]]},
+                  calibration_file)
+    compared = []
+    noise_aware_trees = noise.noise_aware_trees
+
+    def record_trees(coupling_map, calibration, trees=()):
+        compared.append(trees)
+        return noise_aware_trees(coupling_map, calibration, trees=trees)
+
+    monkeypatch.setattr(noise, 'noise_aware_trees', record_trees)
+    backend_info = {'backend_name': 'ibmqx5', 'coupling_map': coupling_map}
+    Compiler(backend_info, cache_dir=str(tmpdir), calibration=filename)
+    # The selection cached by the bfs Compiler compares the bfs tree, the depth one must not be served it
+    compiler = Compiler(backend_info, cache_dir=str(tmpdir), tree_mode='depth', calibration=filename)
+    assert len(compared) == 2
+    assert compared[1] == [compiler._tree]
+
+
+def test_journaled_repeated_runs_resume(tmpdir):
+    pytest.importorskip('qiskit')
+    from compiler.fake import FakeBackend
+    from compiler.journal import Journal
+    from compiler.runner import JobRunner
+    backend = FakeBackend(polls=0)
+    filename = str(tmpdir.join('journal.jsonl'))
+
+    def make_compiler():
+        compiler = Compiler({'backend_name': 'fake', 'coupling_map': random_digraph(8, seed=2)},
+                            cache_dir=str(tmpdir), journal=Journal(filename))
+        compiler.runner = JobRunner(lambda name: backend, poll_interval=0.001)
+        return compiler
+
+    compiler = make_compiler()
+    cobj = compiler.compile(3, 'fake')
+    for _ in range(3):
+        compiler.run(cobj, 'fake')
+    assert len(backend.jobs) == 3
+    # A resumed sweep skips the three completed repetitions and runs the fourth
+    compiler = make_compiler()
+    for _ in range(4):
+        compiler.run(cobj, 'fake')
+    assert len(backend.jobs) == 4
+
+
+def test_blocking_runs_inside_running_event_loop():
+    import asyncio
+    import threading
+    from compiler.compiler import _run_sync
+
+    async def thread_name():
+        await asyncio.sleep(0)
+        return threading.current_thread().name
+
+    assert _run_sync(thread_name()) == threading.current_thread().name
+
+    async def notebook_cell():
+        # As in Jupyter, where the cell already runs inside an event loop
+        return _run_sync(thread_name())
+
+    assert asyncio.run(notebook_cell()) != threading.current_thread().name
+
+
+PACKED = [('ghz', 4, '11'), ('envariance', 3, '11'), ('parity', 3, '10')]
+
+
+def _alone_qasm(compiler, instance, subtree):
+    # Qasm of a packed instance built on its own, on the same qubits
+    from compiler.templates import GateList
+    algo, _, oracle = instance
+    circuit = GateList(len(compiler.tree_data['coupling_map']))
+    with compiler._template_lock:
+        compiler._create(circuit, len(subtree), connected=subtree, **Compiler._algo_options(algo, oracle, False))
+    circuit.optimize()
+    return circuit.qasm()
+
+
+def test_packed_counts_split_as_instances_alone(tmpdir):
+    from compiler.stabilizer import simulate
+    from compiler.topology import pack_subtrees
+    from compiler.utility import _marginal_counts
+    coupling_map = bundled('ibmqx5')
+    compiler = Compiler({'backend_name': 'ibmqx5', 'coupling_map': coupling_map}, cache_dir=str(tmpdir))
+    pobj = compiler.template_packed(PACKED, 'ibmqx5')
+    counts = simulate(pobj['qasm'], shots=4000, seed=5)
+    subtrees = pack_subtrees(coupling_map, [4, 3, 4])
+    for instance, subtree, cobj in zip(PACKED, subtrees, pobj['instances']):
+        assert set(cobj['connected']) == set(subtree)
+        marginal = _marginal_counts(counts, cobj['connected'])
+        alone = simulate(_alone_qasm(compiler, instance, subtree), shots=4000, seed=5)
+        # Stabilizer states measure uniformly over their support, so equal supports are equal distributions
+        assert set(marginal) == set(alone), instance
+        assert sum(marginal.values()) == 4000
+
+
+def test_split_packed_counts(tmpdir):
+    pytest.importorskip('qiskit')
+    from compiler.stabilizer import StabilizerResult, simulate
+    from compiler.utility import _marginal_counts
+    compiler = Compiler({'backend_name': 'ibmqx5', 'coupling_map': bundled('ibmqx5')}, cache_dir=str(tmpdir))
+    pobj = compiler.template_packed(PACKED, 'ibmqx5')
+    counts = simulate(pobj['qasm'], shots=1000, seed=2)
+    robjs = compiler._split_packed(pobj, 'ibmqx5', StabilizerResult({'packed': pobj['qasm']}, {'packed': counts}))
+    assert len(robjs) == len(PACKED)
+    for robj, cobj in zip(robjs, pobj['instances']):
+        assert robj['connected'] == cobj['connected']
+        assert dict(robj['counts']) == _marginal_counts(counts, cobj['connected'])
@@ -0,0 +1,36 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('sympy')
+
+from benchmarks.harness import run, stage_calls  # noqa: E402
+from benchmarks.coupling_maps import line  # noqa: E402
+
+
+def test_only_selected_stages_are_built(tmpdir):
+    stages = ['ranks', 'spanning_tree', 'template', 'order_results']
+    calls = stage_calls(line(8), str(tmpdir), stages)
+    assert sorted(calls) == sorted(stages)
+    assert stage_calls(line(8), str(tmpdir), ['ranks']).keys() == {'ranks'}
+
+
+def test_qiskit_stages_are_skipped_without_qiskit(monkeypatch):
+    import importlib.util
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None if name == 'qiskit' else find_spec(name))
+    results = run(['line'], [8], ['ranks', 'compile', 'optimize_h'], repeat=1)
+    assert [result['stage'] for result in results] == ['ranks']
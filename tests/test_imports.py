@@ -0,0 +1,54 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from benchmarks.import_time import ONLINE, ROOT, import_time
+
+# Third party modules imported by compiler.compiler, their own import time is not the package's
+DEPENDENCIES = 'numpy, sympy, pkg_resources'
+
+# Seconds compiler.compiler may add on top of its dependencies
+IMPORT_BUDGET = 0.5
+
+# Lists the modules of qiskit and of the online clients loaded by importing a module
+_PROBE = '''
+import sys, json
+import {module}
+print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in {roots} or m.startswith({online}))))
+'''
+
+
+@pytest.mark.parametrize('module', ['compiler.compiler', 'compiler.pool', 'compiler.runner'])
+def test_import_loads_no_online_modules(module):
+    pytest.importorskip('numpy')
+    pytest.importorskip('sympy')
+    code = _PROBE.format(module=module, roots=('qiskit',), online=ONLINE)
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=dict(os.environ), check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
+
+
+def test_import_time_is_bounded():
+    pytest.importorskip('numpy')
+    pytest.importorskip('sympy')
+    dependencies, _ = import_time(DEPENDENCIES)
+    elapsed, online = import_time('compiler.compiler')
+    assert online == []
+    assert elapsed < dependencies + IMPORT_BUDGET
@@ -0,0 +1,34 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from compiler.journal import Journal, circuit_key
+
+
+def test_repeated_runs_have_distinct_keys():
+    cobj = {'qasm': 'OPENQASM 2.0;'}
+    keys = {circuit_key(cobj, 'ibmqx4', 1024, [None, repetition]) for repetition in range(3)}
+    assert len(keys) == 3
+    assert circuit_key(cobj, 'ibmqx4', 1024, 'sweep') != circuit_key(cobj, 'ibmqx4', 1024, 'other')
+    assert circuit_key(cobj, 'ibmqx4', 1024) == circuit_key(dict(cobj), 'ibmqx4', 1024)
+
+
+def test_complete_skips_unserializable_entries(tmpdir):
+    filename = str(tmpdir.join('journal.jsonl'))
+    journal = Journal(filename)
+    journal.listener('key')('job', 'RUNNING')
+    assert journal.pending() == ['key']
+    journal.complete('key', {'counts': [['00', 3]], 'result': object(), 'backend': object()})
+    resumed = Journal(filename)
+    assert resumed.completed('key') == {'counts': [['00', 3]]}
+    assert resumed.pending() == []
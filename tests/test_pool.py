@@ -0,0 +1,40 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from benchmarks.coupling_maps import bundled
+
+pytest.importorskip('numpy')
+pytest.importorskip('sympy')
+
+from compiler.pool import CompilerPool  # noqa: E402
+
+
+def test_new_calibration_keeps_built_compiler(tmpdir):
+    coupling_map = bundled('ibmqx4')
+    filename = str(tmpdir.join('calibration.json'))
+    with open(filename, 'w') as calibration_file:
+        json.dump({'qubits': [{'name': 'Q%d' % node, 'gateError': {'value': 0.001 * (node + 1)},
+                               'readoutError': {'value': 0.02}} for node in coupling_map]}, calibration_file)
+    pool = CompilerPool(provider=lambda backend: {'coupling_map': coupling_map}, cache_dir=str(tmpdir))
+    compiler = pool.get('ibmqx4')
+    assert pool.register('ibmqx4', calibration=filename) is None
+    assert pool.get('ibmqx4') is compiler
+    assert compiler.calibration == filename
+    update = pool.register('ibmqx4', coupling_map=coupling_map, calibration=filename)
+    assert update['removed'] == update['added'] == set()
+    assert pool.get('ibmqx4') is compiler
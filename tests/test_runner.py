@@ -0,0 +1,92 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+
+from compiler.fake import FakeBackend
+from compiler.metrics import Metrics
+from compiler.runner import JobRunner, RunError
+
+QOBJ = {'id': 'qobj', 'config': {'shots': 16},
+        'circuits': [{'name': 'ghz', 'compiled_circuit_qasm': 'qreg q[2];\ncreg c[2];\n'}]}
+
+
+def _runner(backend, **kwargs):
+    # Runner without jitter and with short waits, so that waits can be checked exactly
+    options = dict(poll_interval=0.001, max_poll_interval=0.004, retry_delay=0.001, backoff=2, jitter=0)
+    options.update(kwargs)
+    return JobRunner(lambda name: backend, **options)
+
+
+def test_transient_failures_are_retried_with_backoff():
+    backend = FakeBackend(polls=2, failures=2)
+    record = Metrics().record('run')
+    result = asyncio.run(_runner(backend).run(QOBJ, backend.name, record=record))
+    assert result.get_counts('ghz') == {'00': 16}
+    assert len(backend.jobs) == 3
+    assert record.counters['attempts'] == 3
+    assert record.counters['retries'] == 2
+    # The delay before the second retry is backoff times the first one
+    assert record.counters['sleep_seconds'] == pytest.approx(0.001 + 0.002)
+
+
+def test_polls_back_off_while_status_is_unchanged():
+    backend = FakeBackend(polls=8)
+    record = Metrics().record('run')
+    asyncio.run(_runner(backend, max_poll_interval=1).run(QOBJ, backend.name, record=record))
+    # Status is polled until done, QUEUED is seen six times in a row before RUNNING
+    assert record.counters['polls'] == 9
+    assert record.timers['queued'] >= 0.001 + 0.002 + 0.004 + 0.008
+
+
+def test_retry_on_errors_are_retried():
+    backend = FakeBackend(polls=0)
+    submissions = []
+
+    def run(qobj):
+        submissions.append(qobj)
+        if len(submissions) == 1:
+            raise ConnectionError('transient')
+        return FakeBackend.run(backend, qobj)
+
+    backend.run = run
+    result = asyncio.run(_runner(backend, retry_on=(ConnectionError,)).run(QOBJ, backend.name))
+    assert result.get_counts() == {'00': 16}
+    assert len(submissions) == 2
+
+
+def test_run_error_after_max_attempts():
+    backend = FakeBackend(polls=1, failures=10)
+    record = Metrics().record('run')
+    with pytest.raises(RunError):
+        asyncio.run(_runner(backend, max_attempts=3).run(QOBJ, backend.name, record=record))
+    assert len(backend.jobs) == 3
+    assert record.counters['attempts'] == 3
+    assert record.counters['retries'] == 2
+
+
+def test_listener_and_reattach():
+    backend = FakeBackend(polls=3)
+    statuses = []
+    asyncio.run(_runner(backend).run(QOBJ, backend.name, listener=lambda job_id, status: statuses.append(status)))
+    assert statuses == ['SUBMITTED', 'QUEUED', 'RUNNING', 'DONE']
+    # A job submitted before is watched instead of submitting the qobj again
+    job = backend.run(QOBJ)
+    record = Metrics().record('run')
+    result = asyncio.run(_runner(backend).run(QOBJ, backend.name, record=record, job_id=job.id))
+    assert result.get_counts('ghz') == {'00': 16}
+    assert len(backend.jobs) == 2
+    assert record.counters['reattached'] == 1
@@ -0,0 +1,73 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from compiler.stabilizer import StabilizerBackend, simulate  # noqa: E402
+
+GHZ = '''OPENQASM 2.0;
+include "qelib1.inc";
+qreg q[3];
+creg c[3];
+h q[0];
+cx q[0],q[1];
+cx q[1],q[2];
+measure q[0] -> c[0];
+measure q[1] -> c[1];
+measure q[2] -> c[2];
+'''
+
+
+def test_simulate_ghz():
+    counts = simulate(GHZ, shots=1000, seed=1)
+    assert set(counts) == {'000', '111'}
+    assert sum(counts.values()) == 1000
+
+
+def test_backend_keeps_no_jobs_and_simulates_once():
+    backend = StabilizerBackend('local_stabilizer_simulator', seed=3)
+    qobj = {'config': {'shots': 100}, 'circuits': [{'name': 'ghz', 'compiled_circuit_qasm': GHZ}]}
+    job = backend.run(qobj)
+    result = job.result()
+    assert job.result() is result
+    assert result.get_counts('ghz') == simulate(GHZ, shots=100, seed=3)
+    assert result.get_ran_qasm('ghz') == GHZ
+    assert not hasattr(backend, 'jobs')
+    with pytest.raises(LookupError):
+        backend.retrieve_job(job.id)
+
+
+@pytest.mark.parametrize('qasm', [
+    GHZ + 'h q[0];\n',
+    GHZ.replace('h q[0];', 'u1(0.3) q[0];'),
+    GHZ.replace('h q[0];', 'ccx q[0],q[1],q[2];'),
+])
+def test_unsupported_circuits_raise_value_error(qasm):
+    with pytest.raises(ValueError):
+        simulate(qasm, shots=10)
+
+
+def test_qobj_seed_is_used_when_circuit_seed_is_none():
+    backend = StabilizerBackend('local_stabilizer_simulator', seed=3)
+    # qiskit compile writes seed None in the config of every circuit
+    circuit = {'name': 'ghz', 'compiled_circuit_qasm': GHZ, 'config': {'seed': None}}
+    qobj = {'config': {'shots': 100, 'seed': 11}, 'circuits': [circuit]}
+    assert backend.run(qobj).result().get_counts('ghz') == simulate(GHZ, shots=100, seed=11)
+    qobj = {'config': {'shots': 100, 'seed': None}, 'circuits': [circuit]}
+    assert backend.run(qobj).result().get_counts('ghz') == simulate(GHZ, shots=100, seed=3)
+    circuit = dict(circuit, config={'seed': 5})
+    qobj = {'config': {'shots': 100, 'seed': 11}, 'circuits': [circuit]}
+    assert backend.run(qobj).result().get_counts('ghz') == simulate(GHZ, shots=100, seed=5)
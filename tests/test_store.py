@@ -0,0 +1,47 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from compiler.store import ResultsStore  # noqa: E402
+
+WRITERS = 4
+RUNS = 10
+
+
+def _append_runs(filename, writer, barrier):
+    # Writers start together, so that they race to create the file
+    barrier.wait()
+    store = ResultsStore(filename)
+    for run in range(RUNS):
+        store.append({'01': writer, '10': run}, writer=writer, run=run)
+
+
+def test_concurrent_writers_share_one_header(tmpdir):
+    filename = str(tmpdir.join('results.bin'))
+    barrier = multiprocessing.Barrier(WRITERS)
+    writers = [multiprocessing.Process(target=_append_runs, args=(filename, writer, barrier))
+               for writer in range(WRITERS)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join()
+    with ResultsStore(filename) as store:
+        runs = [(run['metadata']['writer'], run['metadata']['run'], ResultsStore.to_results(run)) for run in store]
+    assert sorted(runs) == [(writer, run, {'01': writer, '10': run}) for writer in range(WRITERS)
+                            for run in range(RUNS)]
@@ -0,0 +1,38 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+sympy = pytest.importorskip('sympy')
+
+from compiler.templates import GateList  # noqa: E402
+
+
+def test_optimize_merges_single_qubit_gates():
+    circuit = GateList(2)
+    circuit.u2(0, sympy.pi, 0)
+    circuit.u2(0, sympy.pi, 0)
+    circuit.u2(0, sympy.pi, 1)
+    circuit.cx(1, 0)
+    circuit.u2(0, sympy.pi, 1)
+    circuit.u3(sympy.pi, 0, sympy.pi, 1)
+    circuit.measure(1, 1)
+    assert circuit.removed == 2
+    assert len(circuit) == 5
+    stats = circuit.optimize()
+    assert [stat['pass'] for stat in stats] == ['cancel_h', 'merge_u']
+    assert stats[1]['removed'] == 1
+    assert len(circuit) == 4
+    assert [gate[0] for gate in circuit.gates] == ['u2', 'cx', 'u3', 'measure']
+    assert 'u3(' in circuit.qasm().splitlines()[-2]
@@ -0,0 +1,184 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import random
+
+import pytest
+
+from benchmarks.coupling_maps import bundled, grid, heavy_hex, line, ring
+from benchmarks.ranking import legacy_ranks
+from benchmarks.spanning_tree import legacy_spanning_tree, prepare, random_map, weakly_connected
+from compiler.topology import _broadcast, adjacency, broadcast_tree, pack_subtrees, reachability_ranks, \
+    schedule_layers, spanning_tree
+
+
+def _random_digraph(seed, n_nodes):
+    # Random directed graph with self-loops, bidirectional edges and cycles, so with multi-node SCCs
+    generator = random.Random(seed)
+    graph = {node: [] for node in range(n_nodes)}
+    for _ in range(generator.randint(0, 3 * n_nodes)):
+        a, b = generator.randrange(n_nodes), generator.randrange(n_nodes)
+        if b not in graph[a]:
+            graph[a].append(b)
+    return graph
+
+
+@pytest.mark.parametrize('graph', [bundled('ibmqx4'), bundled('ibmqx5'), ring(9), {0: [0], 1: [0, 1]}])
+def test_ranks_match_legacy(graph):
+    assert reachability_ranks(graph) == legacy_ranks(graph)
+
+
+def test_ranks_match_legacy_on_random_graphs():
+    for seed in range(300):
+        graph = _random_digraph(seed, 1 + seed % 30)
+        assert reachability_ranks(graph) == legacy_ranks(graph), seed
+
+
+@pytest.mark.parametrize('backend_name', ['ibmqx4', 'ibmqx5'])
+def test_spanning_tree_matches_legacy_on_backends(backend_name):
+    args = prepare(bundled(backend_name))
+    assert list(spanning_tree(*args).items()) == list(legacy_spanning_tree(*args).items())
+
+
+def test_spanning_tree_matches_legacy_on_random_maps():
+    checked = 0
+    for seed in range(300):
+        graph = random_map(seed, 2 + seed % 40)
+        # The legacy builder never terminates on disconnected maps
+        if not weakly_connected(graph):
+            continue
+        args = prepare(graph)
+        assert list(spanning_tree(*args).items()) == list(legacy_spanning_tree(*args).items()), seed
+        checked += 1
+    assert checked > 100
+
+
+def _random_tree_edges(seed, n_nodes):
+    # (child, parent) pairs of a random tree, in the order nodes are connected
+    generator = random.Random(seed)
+    return [(node, generator.randrange(node)) for node in range(1, n_nodes)]
+
+
+def _optimal_layers(edges):
+    # Fewest layers broadcasting along the tree, trying every order of the children of every node
+    children = dict()
+    for child, parent in edges:
+        children.setdefault(parent, []).append(child)
+
+    def layers(node):
+        below = [layers(child) for child in children.get(node, [])]
+        return min((max((i + 1 + needed for i, needed in enumerate(order)), default=0)
+                    for order in itertools.permutations(below)), default=0)
+
+    return layers(edges[0][1])
+
+
+def _check_layers(edges, layers):
+    # Every cnot is scheduled once, on disjoint qubits, after the cnot connecting its parent
+    assert sorted(pair for layer in layers for pair in layer) == sorted(edges)
+    layer_of = dict()
+    for index, layer in enumerate(layers):
+        qubits = [qubit for pair in layer for qubit in pair]
+        assert len(qubits) == len(set(qubits)), layer
+        for child, _ in layer:
+            layer_of[child] = index
+    for child, parent in edges:
+        if parent in layer_of:
+            assert layer_of[parent] < layer_of[child], (child, parent)
+
+
+def test_layers_of_random_trees_are_optimal():
+    for seed in range(200):
+        edges = _random_tree_edges(seed, 2 + seed % 12)
+        layers = schedule_layers(edges)
+        _check_layers(edges, layers)
+        assert len(layers) == _optimal_layers(edges), seed
+
+
+@pytest.mark.parametrize('coupling_map', [bundled('ibmqx4'), bundled('ibmqx5'), grid(4, 4), heavy_hex(3, 9)])
+def test_layers_of_depth_tree_match_broadcast(coupling_map):
+    # Without Hadamard gates around inverse cnots every cnot takes one round, as a layer
+    _, graph, _, ranks = prepare(coupling_map)
+    start, tree = broadcast_tree(graph, ranks, reverse_cost=0)
+    edges = [(node, parent) for node, parent in tree.items() if parent != -1]
+    layers = schedule_layers(edges)
+    _check_layers(edges, layers)
+    assert len(layers) == _optimal_layers(edges)
+    _, rounds = _broadcast(start, graph, adjacency(graph), 0)
+    assert len(layers) <= rounds
+
+
+def test_no_layers_without_edges():
+    assert schedule_layers([]) == []
+
+
+class _Circuit(object):
+    # Records the gates placed by Compiler._place_cx
+    def __init__(self):
+        self.cx_gates = []
+
+    def u2(self, *args):
+        pass
+
+    def cx(self, control, target):
+        self.cx_gates.append((control, target))
+
+
+@pytest.mark.parametrize('oracle', ['11', '10'])
+def test_place_cx_follows_schedule(tmpdir, oracle):
+    pytest.importorskip('sympy')
+    from compiler.compiler import Compiler
+    coupling_map = bundled('ibmqx5')
+    compiler = Compiler({'backend_name': 'ibmqx5', 'coupling_map': coupling_map}, cache_dir=str(tmpdir),
+                        tree_mode='depth')
+    compiler._connected.update(list(compiler.tree_data['path'].items())[:12])
+    edges = [(qubit, parent) for qubit, parent in compiler._connected.items() if parent != -1]
+    stop = 5
+    circuit = _Circuit()
+    compiler._place_cx(circuit, stop, oracle=oracle)
+    kept = edges[:stop] if oracle == '10' else edges
+    # Inverse cnots swap control and target
+    assert [set(pair) for pair in circuit.cx_gates] == [set(pair) for layer in schedule_layers(kept) for pair in layer]
+
+
+@pytest.mark.parametrize('coupling_map, sizes', [
+    (bundled('ibmqx5'), [4, 3, 4]),
+    (bundled('ibmqx5'), [8, 8]),
+    (grid(4, 4), [5, 1, 4, 6]),
+    (heavy_hex(3, 9), [2] * 10),
+])
+def test_packed_subtrees_are_disjoint_connected_trees(coupling_map, sizes):
+    subtrees = pack_subtrees(coupling_map, sizes)
+    assert [len(subtree) for subtree in subtrees] == sizes
+    used = [node for subtree in subtrees for node in subtree]
+    assert len(used) == len(set(used))
+    for subtree in subtrees:
+        nodes = list(subtree)
+        assert subtree[nodes[0]] == -1
+        for node in nodes[1:]:
+            parent = subtree[node]
+            # Parents are connected before their children, through a coupling in either direction
+            assert nodes.index(parent) < nodes.index(node)
+            assert parent in coupling_map[node] or node in coupling_map[parent]
+
+
+@pytest.mark.parametrize('coupling_map, sizes', [
+    (line(5), [3, 3]),
+    # Every coupling of a star has the center, so there are no two disjoint pairs
+    ({0: [1, 2, 3], 1: [], 2: [], 3: []}, [2, 2]),
+    ({0: [1], 1: [], 2: [3], 3: []}, [3]),
+])
+def test_pack_subtrees_returns_none_when_sizes_do_not_fit(coupling_map, sizes):
+    assert pack_subtrees(coupling_map, sizes) is None
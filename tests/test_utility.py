@@ -0,0 +1,38 @@
+# Copyright 2018, Davide Ferrari and Michele Amoretti
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from benchmarks.order_results import legacy_order_results, synthetic_robj  # noqa: E402
+from compiler.utility import _order_results  # noqa: E402
+
+
+@pytest.mark.parametrize('algo', ['ghz', 'envariance', 'parity'])
+@pytest.mark.parametrize('n_qubits, size, outcomes', [(2, 2, 4), (5, 5, 32), (5, 16, 20), (16, 16, 500),
+                                                      (70, 128, 200)])
+def test_order_results_matches_legacy(algo, n_qubits, size, outcomes):
+    for seed in range(3):
+        robj = synthetic_robj(algo, n_qubits, size, outcomes, seed=seed)
+        legacy = legacy_order_results(robj)
+        assert list(_order_results(robj).items()) == list(legacy.items())
+        # Packed keys are the integers of the values, beyond 63 bits too
+        packed = [(int(value, 2), count) for value, count in legacy.items()]
+        assert list(_order_results(robj, packed=True).items()) == packed
+
+
+def test_order_results_of_empty_counts():
+    robj = synthetic_robj('ghz', 3, 3, 4)
+    assert _order_results(dict(robj, counts=[])) == {}